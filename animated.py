@@ -0,0 +1,194 @@
+# 动图(GIF/WebP)播放：后台线程逐帧解码并缩放到幻灯片纹理尺寸，主线程只把少量即将显示的帧上传到循环复用的纹理
+# 源帧、纹理环、已解码帧队列和解码线程手上的一帧合计不超过ANIMATION_MEMORY_MB，播放很长的动图内存也不会增长；
+# 海报帧很大、预算放不下时按比例缩小解码尺寸，显示时放大到原尺寸；源帧本身超过一半预算时只显示海报帧
+# GIF/WebP不支持降分辨率解码，源帧先缩放再转换为RGBA，每帧解码通过decode_gate准入
+# 动图帧与海报帧一样做对比度增强，但不做USM锐化（逐帧锐化跟不上播放速度），播放时画面会比静止的海报帧略柔和
+import math
+import queue
+import threading
+from collections import deque
+import pyglet
+from PIL import Image, ImageEnhance
+from config import *
+from decode import decode_gate, as_rgba, RESIZE_MODES
+
+ANIMATED_EXTENSIONS = ('.gif', '.webp')
+
+def may_be_animated(path):
+    """按扩展名判断是否可能是动图，是否真的有多帧由解码线程读取文件后确定"""
+    return path.lower().endswith(ANIMATED_EXTENSIONS)
+
+def source_frame_bytes(width, height, mode):
+    """解码线程读取一帧源图的估算字节数：解码结果（Pillow按4字节存储RGB/RGBA），调色板等模式再加上缩放前的RGBA转换"""
+    frame = width * height * 4
+    return frame if mode in RESIZE_MODES else frame * 2
+
+def ring_layout(width, height, budget=ANIMATION_MEMORY_MB * 1024 * 1024, max_slots=ANIMATION_RING_FRAMES):
+    """返回 (环形纹理数, 帧宽, 帧高)：纹理环和已解码队列各slots帧，加上解码线程手上的一帧，总共不超过budget
+
+    至少双缓冲；原尺寸放不下两组双缓冲时按面积比例缩小帧尺寸。
+    """
+    frame_bytes = width * height * 4
+    slots = max(2, min(max_slots, (budget // frame_bytes - 1) // 2))
+    frames = 2 * slots + 1
+    if frames * frame_bytes > budget:
+        scale = math.sqrt(budget / (frames * frame_bytes))
+        width = max(1, int(width * scale))
+        height = max(1, int(height * scale))
+    return slots, width, height
+
+class AnimationPlayer:
+    """在sprite上循环播放动图，停止时恢复原来的海报帧纹理"""
+
+    def __init__(self, path, sprite, on_frame=None):
+        self.path = path
+        self.sprite = sprite
+        self.poster = sprite.image
+        self.on_frame = on_frame  # 每次切换帧后调用（用于请求重绘）
+        self.slots, self.width, self.height = ring_layout(self.poster.width, self.poster.height)
+        self.decoded = queue.Queue(maxsize=self.slots)  # (RGBA数据, 帧时长)
+        self.decoding = False  # 解码线程持有一帧尚未放入队列
+        self.source_bytes = 0  # 解码线程读取源帧的估算字节数
+        self.textures = []  # 已创建的环形纹理，按需创建
+        self.free = []  # 空闲的环形纹理
+        self.ready = deque()  # 已上传等待显示的 (纹理, 帧时长)
+        self.showing = None
+        self.finished = False  # 解码线程已结束（非动图、出错或已停止）
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._decode, name="animation-decoder", daemon=True)
+        self._thread.start()
+        pyglet.clock.schedule_once(self._advance, 0)
+
+    def _decode(self):
+        """后台逐帧解码，队列满时等待；播放到最后一帧后从头重新解码，不保留全部帧"""
+        try:
+            with Image.open(self.path) as img:
+                if not getattr(img, 'is_animated', False):
+                    return
+                budget = ANIMATION_MEMORY_MB * 1024 * 1024
+                source_bytes = source_frame_bytes(img.width, img.height, img.mode)
+                if source_bytes * 2 > budget:
+                    print(f"动图单帧过大，只显示海报帧: {self.path} {img.width}x{img.height}")
+                    return
+                # 第一帧放入队列之前确定帧尺寸，主线程取到帧后才按此尺寸创建纹理
+                self.slots, self.width, self.height = ring_layout(
+                    self.poster.width, self.poster.height, budget - source_bytes, self.slots)
+                self.source_bytes = source_bytes
+                self.decoded = queue.Queue(maxsize=self.slots)
+                while not self._stop.is_set():
+                    for index in range(img.n_frames):
+                        if self._stop.is_set():
+                            return
+                        self.decoding = True
+                        decode_gate.acquire(source_bytes)
+                        try:
+                            img.seek(index)
+                            duration = max(img.info.get('duration') or 100, 20) / 1000
+                            data = self._scale_frame(img)
+                        finally:
+                            decode_gate.release(source_bytes)
+                        self._put((data, duration))
+                        self.decoding = False
+        except Exception as e:
+            print(f"动图解码失败: {self.path} - {e}")
+        finally:
+            self.finished = True
+
+    def _scale_frame(self, img):
+        """缩放当前帧并增强对比度，返回已翻转的RGBA数据；RGB/RGBA帧先缩放再转换，只有小图做RGBA转换"""
+        size = (self.width, self.height)
+        if img.mode in RESIZE_MODES:
+            frame = img.resize(size, Image.Resampling.BILINEAR)
+        else:
+            # 调色板帧不能直接双线性缩放，先展开
+            with img.convert('RGBA') as rgba:
+                frame = rgba.resize(size, Image.Resampling.BILINEAR)
+        try:
+            enhanced = ImageEnhance.Contrast(frame).enhance(IMAGE_ENHANCE)
+        finally:
+            frame.close()
+        with as_rgba(enhanced) as rgba:
+            return rgba.tobytes('raw', 'RGBA', 0, -1)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self.decoded.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _upload_ready(self, limit=2):
+        """把已解码的帧上传到空闲的环形纹理，每次最多limit帧，避免单帧耗时过长"""
+        for _ in range(limit):
+            if not self.free and len(self.textures) >= self.slots:
+                return
+            try:
+                data, duration = self.decoded.get_nowait()
+            except queue.Empty:
+                return
+            # 取到第一帧后帧尺寸才确定，此时再创建纹理
+            if not self.free:
+                texture = pyglet.image.Texture.create(self.width, self.height, blank_data=False)
+                self.textures.append(texture)
+                self.free.append(texture)
+            texture = self.free.pop()
+            texture.blit_into(pyglet.image.ImageData(self.width, self.height, 'RGBA', data), 0, 0, 0)
+            self.ready.append((texture, duration))
+
+    def _advance(self, dt):
+        if self._stop.is_set():
+            return
+        self._upload_ready()
+        if not self.ready:
+            if self.finished and self.decoded.empty():
+                # 不是动图或解码出错，保持海报帧
+                self.stop()
+                return
+            # 解码跟不上时稍后重试，不阻塞主线程
+            pyglet.clock.schedule_once(self._advance, 0.01)
+            return
+        texture, duration = self.ready.popleft()
+        if self.showing is not None:
+            self.free.append(self.showing)
+        self.showing = texture
+        self._show(texture)
+        if self.on_frame:
+            self.on_frame()
+        pyglet.clock.schedule_once(self._advance, duration)
+
+    def _show(self, texture):
+        """切换精灵纹理，纹理尺寸不同（缩小解码的帧与海报帧之间）时调整缩放，保持显示大小不变"""
+        current = self.sprite.image
+        if current.width != texture.width:
+            self.sprite.scale = self.sprite.scale * current.width / texture.width
+        self.sprite.image = texture
+
+    def memory_bytes(self):
+        """环形纹理、已解码帧队列和解码线程手上的一帧（及其源帧）占用的字节数"""
+        frames = len(self.textures) + self.decoded.qsize() + (1 if self.decoding else 0)
+        return frames * self.width * self.height * 4 + (self.source_bytes if self.decoding else 0)
+
+    def stop(self):
+        """停止播放并恢复海报帧，释放环形纹理"""
+        if self._stop.is_set() and not self.textures:
+            return
+        self._stop.set()
+        pyglet.clock.unschedule(self._advance)
+        if self.showing is not None:
+            try:
+                self._show(self.poster)
+            except Exception as e:
+                print(f"恢复动图海报帧出错: {e}")
+        for texture in self.textures:
+            texture.delete()
+        self.textures.clear()
+        self.free.clear()
+        self.ready.clear()
+        self.showing = None
+        # 解除队列中的数据引用，解码线程随后退出
+        while True:
+            try:
+                self.decoded.get_nowait()
+            except queue.Empty:
+                break
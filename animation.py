@@ -0,0 +1,81 @@
+# 统一动画时间线：滑动、淡出、进度条等补间动画都由同一个时钟回调按同一时刻推进
+# 配合 pyglet.app.run(interval=None) 使用：只有动画进行中或画面被标记失效时才重绘，静止画面不占用CPU
+import time
+import pyglet
+
+class Tween:
+    """一段补间：每帧以0-1的进度（经过缓动）调用update，结束后调用on_done"""
+    __slots__ = ('duration', 'update', 'ease', 'on_done', 'start')
+
+    def __init__(self, duration, update, ease, on_done, start):
+        self.duration = duration
+        self.update = update
+        self.ease = ease
+        self.on_done = on_done
+        self.start = start
+
+class Timeline:
+    """按名称管理补间动画，有动画时以fps驱动并重绘，没有动画时停止时钟回调"""
+
+    def __init__(self, window, fps=60):
+        self.window = window
+        self.interval = 1 / fps
+        self.tweens = {}  # 名称 -> Tween
+        self._ticking = False
+        self._redraw_pending = False
+
+    def animate(self, name, duration, update, ease=None, on_done=None):
+        """开始补间，同名的补间会被替换（不调用其on_done）"""
+        self.tweens[name] = Tween(duration, update, ease, on_done, time.perf_counter())
+        if not self._ticking:
+            self._ticking = True
+            pyglet.clock.schedule_interval(self._tick, self.interval)
+
+    def cancel(self, name):
+        """停止补间，不调用on_done"""
+        self.tweens.pop(name, None)
+
+    def is_running(self, name):
+        return name in self.tweens
+
+    def _tick(self, dt):
+        # 同一帧的所有补间使用同一时刻，滑动和淡出保持同步
+        now = time.perf_counter()
+        for name, tween in list(self.tweens.items()):
+            if tween.duration > 0:
+                progress = min((now - tween.start) / tween.duration, 1.0)
+            else:
+                progress = 1.0
+            tween.update(tween.ease(progress) if tween.ease else progress)
+            if progress >= 1.0:
+                if self.tweens.get(name) is tween:
+                    del self.tweens[name]
+                if tween.on_done:
+                    tween.on_done()
+        self._draw(dt)
+        if not self.tweens:
+            pyglet.clock.unschedule(self._tick)
+            self._ticking = False
+
+    def invalidate(self):
+        """画面内容变化，在下一次事件循环中重绘一帧；动画进行中时由_tick负责重绘"""
+        if self._ticking or self._redraw_pending:
+            return
+        self._redraw_pending = True
+        pyglet.clock.schedule_once(self._redraw, 0)
+
+    def _redraw(self, dt):
+        self._redraw_pending = False
+        self._draw(dt)
+
+    def _draw(self, dt):
+        if not self.window.has_exit:
+            self.window.draw(dt)
+
+    def stop(self):
+        """退出前停止所有动画和待执行的重绘"""
+        self.tweens.clear()
+        pyglet.clock.unschedule(self._tick)
+        pyglet.clock.unschedule(self._redraw)
+        self._ticking = False
+        self._redraw_pending = False
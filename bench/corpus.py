@@ -0,0 +1,35 @@
+# 生成基准测试用的合成图片库：混合尺寸、PNG/JPEG/WebP、多层目录
+import os
+import random
+from PIL import Image
+
+# (宽, 高) 覆盖常见手机/相机/全景尺寸
+SIZES = [(1280, 720), (1920, 1080), (3024, 4032), (6000, 4000), (8000, 2000)]
+FORMATS = [('JPEG', '.jpg'), ('PNG', '.png'), ('WEBP', '.webp')]
+
+def synthetic_image(size, seed):
+    """带渐变和噪点的图片，压缩率接近真实照片"""
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient('L').rotate(rng.randrange(360)).resize(size)
+    noise = Image.effect_noise(size, rng.randrange(16, 96))
+    return Image.merge('RGB', (gradient, noise, gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+
+def build_corpus(folder, count=60, depth=4, seed=1234, sizes=SIZES, formats=FORMATS):
+    """在folder下生成count张图片，分布在最深depth层的目录中，已存在的文件直接复用"""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        parts = [f"d{rng.randrange(3)}" for _ in range(rng.randrange(depth + 1))]
+        directory = os.path.join(folder, *parts)
+        os.makedirs(directory, exist_ok=True)
+        fmt, ext = formats[i % len(formats)]
+        size = sizes[rng.randrange(len(sizes))]
+        path = os.path.join(directory, f"img{i:05d}_{size[0]}x{size[1]}{ext}")
+        if not os.path.exists(path):
+            with synthetic_image(size, seed + i) as img:
+                img.save(path, fmt, quality=90)
+        paths.append(path)
+    # 混入非图片文件，扫描时需要跳过
+    with open(os.path.join(folder, 'notes.txt'), 'w') as f:
+        f.write('not an image\n')
+    return paths
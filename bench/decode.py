@@ -0,0 +1,90 @@
+# 对比全分辨率解码与降分辨率解码的耗时和峰值内存
+# 用法: python -m bench.decode [--size 6000x4000] [--target 1920x1080] [--repeat 3] [--oversample 2.0]
+import os
+import sys
+import time
+import argparse
+import tempfile
+import resource
+import multiprocessing
+from PIL import Image
+from decode import open_reduced, fit_size, output_size, as_rgba
+from config import DECODE_OVERSAMPLE
+
+FORMATS = {'JPEG': '.jpg', 'WEBP': '.webp', 'PNG': '.png'}
+
+def _maxrss_bytes():
+    """进程的峰值常驻内存：Linux读取VmHWM（exec后重新计数），其他系统用ru_maxrss"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为KB；Linux的ru_maxrss在exec后保留父进程的峰值，子进程测得的增量偏小
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def make_sample(folder, fmt, size):
+    """生成带渐变和噪点的测试图片，避免压缩率过高失真"""
+    path = os.path.join(folder, f"sample{FORMATS[fmt]}")
+    if not os.path.exists(path):
+        gradient = Image.linear_gradient('L').resize(size)
+        noise = Image.effect_noise(size, 64)
+        Image.merge('RGB', (gradient, noise, gradient.transpose(Image.FLIP_LEFT_RIGHT))).save(path, fmt, quality=90)
+    return path
+
+def _full_decode(path, target, oversample):
+    # 原实现：先全尺寸转RGBA再缩放
+    with Image.open(path).convert('RGBA') as img:
+        img.resize(fit_size(img.width, img.height, *target), Image.Resampling.LANCZOS).close()
+
+def _reduced_decode(path, target, oversample):
+    # 与render_sharpened相同：降分辨率解码，缩放后再转换为RGBA
+    with open_reduced(path, *target, oversample=oversample) as img:
+        resized = img.resize(output_size(img, *target), Image.Resampling.LANCZOS)
+    as_rgba(resized).close()
+
+def _measure(strategy, path, target, repeat, oversample, queue):
+    """在独立进程中测量，峰值内存互不干扰"""
+    func = _full_decode if strategy == 'full' else _reduced_decode
+    before = _maxrss_bytes()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(path, target, oversample)
+    elapsed = (time.perf_counter() - start) / repeat
+    queue.put((elapsed, _maxrss_bytes() - before))
+
+def run_case(strategy, path, target, repeat, oversample):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(strategy, path, target, repeat, oversample, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="降分辨率解码基准测试")
+    parser.add_argument('--size', default='6000x4000', help="测试图片尺寸")
+    parser.add_argument('--target', default='1920x1080', help="目标窗口尺寸")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--formats', default=','.join(FORMATS))
+    parser.add_argument('--oversample', type=float, default=DECODE_OVERSAMPLE, help="降分辨率解码的质量参数")
+    args = parser.parse_args()
+    size = tuple(int(v) for v in args.size.split('x'))
+    target = tuple(int(v) for v in args.target.split('x'))
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"源图 {size[0]}x{size[1]} -> 目标 {target[0]}x{target[1]} | oversample {args.oversample}")
+        print(f"{'格式':<6}{'全解码(ms)':>12}{'降解码(ms)':>12}{'加速':>8}{'全解码峰值(MB)':>16}{'降解码峰值(MB)':>16}")
+        for fmt in args.formats.split(','):
+            path = make_sample(folder, fmt, size)
+            full_t, full_mem = run_case('full', path, target, args.repeat, args.oversample)
+            red_t, red_mem = run_case('reduced', path, target, args.repeat, args.oversample)
+            print(f"{fmt:<6}{full_t * 1000:>12.1f}{red_t * 1000:>12.1f}{full_t / red_t:>7.1f}x"
+                  f"{full_mem / 2**20:>16.1f}{red_mem / 2**20:>16.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# 对比PIL和NumPy增强引擎：耗时和输出差异，差异超过 ENGINE_TOLERANCE 时返回非0
+# 用法: python -m bench.engines [--corpus DIR] [--count 15] [--target 1920x1080]
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image, ImageFilter, ImageEnhance
+from decode import open_reduced, output_size, as_rgba
+from enhance_numpy import enhance, ENGINE_TOLERANCE
+from render_core import UNSHARP
+from config import IMAGE_ENHANCE
+from utils import find_images
+from bench.corpus import build_corpus
+
+def pil_engine(resized):
+    # 与render_sharpened相同：在解码模式下增强，最后转换为RGBA
+    contrasted = ImageEnhance.Contrast(resized).enhance(IMAGE_ENHANCE)
+    sharpened = as_rgba(contrasted.filter(ImageFilter.UnsharpMask(*UNSHARP)))
+    return np.asarray(sharpened.transpose(Image.FLIP_TOP_BOTTOM))
+
+def numpy_engine(resized):
+    width, height, data = enhance(resized, IMAGE_ENHANCE, *UNSHARP)
+    return np.frombuffer(data, np.uint8).reshape(height, width, 4)
+
+def main():
+    parser = argparse.ArgumentParser(description="增强引擎对比")
+    parser.add_argument('--corpus', help="测试图片目录，不指定时在临时目录生成")
+    parser.add_argument('--count', type=int, default=15)
+    parser.add_argument('--target', default='1920x1080')
+    args = parser.parse_args()
+    target = tuple(int(v) for v in args.target.split('x'))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = args.corpus or tmp
+        if not args.corpus:
+            build_corpus(folder, args.count)
+        worst_max, worst_mean = 0, 0.0
+        pil_time = numpy_time = 0.0
+        for path in find_images(folder):
+            with open_reduced(path, *target) as img:
+                resized = img.resize(output_size(img, *target), Image.Resampling.LANCZOS)
+            start = time.perf_counter()
+            expected = pil_engine(resized)
+            pil_time += time.perf_counter() - start
+            start = time.perf_counter()
+            actual = numpy_engine(resized)
+            numpy_time += time.perf_counter() - start
+            diff = np.abs(expected.astype(np.int16) - actual.astype(np.int16))
+            worst_max = max(worst_max, int(diff.max()))
+            worst_mean = max(worst_mean, float(diff.mean()))
+
+    print(f"PIL: {pil_time * 1000:.1f} ms | NumPy: {numpy_time * 1000:.1f} ms | 加速 {pil_time / numpy_time:.2f}x")
+    print(f"最大差值: {worst_max} (允许 {ENGINE_TOLERANCE['max_abs']}) | "
+          f"平均差值: {worst_mean:.3f} (允许 {ENGINE_TOLERANCE['mean_abs']})")
+    if worst_max > ENGINE_TOLERANCE['max_abs'] or worst_mean > ENGINE_TOLERANCE['mean_abs']:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
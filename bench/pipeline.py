@@ -0,0 +1,238 @@
+# 无窗口的图片流水线基准测试：目录扫描、缩略图生成、缩略图页面、锐化渲染
+# 用法: python -m bench.pipeline [--count 60] [--corpus DIR] [--save-baseline] [--tolerance 0.15]
+# 结果与 bench/baseline.json 对比，吞吐下降或p95变慢超过容差时返回非0，便于在发布前拦截回归
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import threading
+from concurrent.futures import wait
+
+import pyglet
+# 必须在创建任何窗口之前设置
+pyglet.options['headless'] = True
+
+import image_processor
+import render_core
+from image_processor import (
+    apply_sharpening, render_sharpened, generate_thumbnail_data, cancel_thumbnail_tasks,
+    generate_thumbnail_page, store_thumbnail_data, pending_thumbnail_tasks, cleanup_thumbnails
+)
+from profiler import percentile
+from config import THUMBNAIL_COLUMNS, THUMBNAIL_ROWS
+from utils import find_images, current_process
+from bench.corpus import build_corpus
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为KB
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 1024
+
+class StagePeak:
+    """在后台线程定期采样常驻内存，记录一个阶段内的峰值(MB)
+
+    需要psutil；未安装时退回进程启动以来的峰值（只增不减，后面的阶段会继承前面的峰值）。
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.process = current_process()
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while True:
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        if self.process is not None:
+            self.peak = self.process.memory_info().rss
+            self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+        return False
+
+    @property
+    def mb(self):
+        return self.peak / 2**20 if self.process is not None else peak_rss_mb()
+
+def timed(func, items):
+    """逐项计时，返回每项耗时(ms)列表、总耗时(s)、失败数和阶段内峰值内存(MB)
+
+    func返回该项的失败数（True/False或整数），抛出异常计为一次失败，不中断测试。
+    """
+    latencies = []
+    failed = 0
+    with StagePeak() as peak:
+        start = time.perf_counter()
+        for item in items:
+            t0 = time.perf_counter()
+            try:
+                failed += int(func(item) or 0)
+            except Exception as e:
+                print(f"失败: {item} - {e}")
+                failed += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed, failed, peak.mb
+
+def stage_result(latencies, elapsed, failed, peak_mb, items):
+    values = sorted(latencies)
+    return {
+        'items': items,
+        'failed': failed,
+        'images_per_s': items / elapsed if elapsed else 0.0,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'peak_rss_mb': peak_mb,
+    }
+
+def fill_thumbnail_page(images, start):
+    """生成一页缩略图：提交本页任务，等待完成后上传到图集，返回生成失败的数量
+
+    只处理一轮，解码失败的图片不会被反复重试。
+    """
+    generate_thumbnail_page(images, start)
+    futures = list(pending_thumbnail_tasks().values())
+    wait(futures)
+    for future in futures:
+        if not future.cancelled() and future.result() is not None:
+            store_thumbnail_data(future.result())
+    sprites = generate_thumbnail_page(images, start)
+    # 失败的图片在第二次请求时会被重新提交，取消这些任务
+    cancel_thumbnail_tasks()
+    return sum(1 for sprite in sprites if sprite is None)
+
+def _scan(folder):
+    find_images(folder)
+
+def _render(path, target):
+    render_sharpened(path, *target).release()
+
+def _apply(path, target):
+    apply_sharpening(path, *target).delete()
+
+def run(folder, target, repeat):
+    # 测量冷启动成本：不读写磁盘缩略图缓存和帧缓存，解码失败也不写入用户的图片目录
+    image_processor.thumbnail_store = None
+    image_processor.image_catalog = None
+    render_core.frame_store = None
+    # 无窗口模式下的OpenGL上下文，用于纹理上传
+    window = pyglet.window.Window(width=target[0], height=target[1], visible=False)
+    results = {}
+
+    latencies, elapsed, failed, peak = timed(lambda _: _scan(folder), range(repeat))
+    images = find_images(folder)
+    results['scan'] = stage_result(latencies, elapsed, failed, peak, len(images) * repeat)
+
+    latencies, elapsed, failed, peak = timed(lambda path: generate_thumbnail_data(path) is None, images)
+    results['thumbnail_data'] = stage_result(latencies, elapsed, failed, peak, len(images))
+
+    pages = list(range(0, len(images), THUMBNAIL_COLUMNS * THUMBNAIL_ROWS))
+    latencies, elapsed, failed, peak = timed(lambda start: fill_thumbnail_page(images, start), pages)
+    results['thumbnail_page'] = stage_result(latencies, elapsed, failed, peak, len(images))
+    cleanup_thumbnails()()
+
+    latencies, elapsed, failed, peak = timed(lambda path: _render(path, target), images)
+    results['render_sharpened'] = stage_result(latencies, elapsed, failed, peak, len(images))
+
+    latencies, elapsed, failed, peak = timed(lambda path: _apply(path, target), images)
+    results['apply_sharpening'] = stage_result(latencies, elapsed, failed, peak, len(images))
+
+    results['peak_rss_mb'] = peak_rss_mb()
+    window.close()
+    return results
+
+def mismatched_params(params, baseline):
+    """返回与基准运行参数不一致的项，基准缺少参数时视为全部不一致"""
+    base = baseline.get('params', {})
+    return [f"{key}={value} (基准 {base.get(key, '未记录')})"
+            for key, value in params.items() if base.get(key) != value]
+
+def compare(results, baseline, tolerance):
+    """打印结果并与基准对比，返回回归的阶段列表"""
+    regressions = []
+    if baseline:
+        mismatched = mismatched_params(results['params'], baseline)
+        if mismatched:
+            # 图片数量、重复次数、尺寸或图片集不同时结果不可比，只打印本次结果
+            print(f"运行参数与基准不一致，跳过对比: {', '.join(mismatched)}")
+            baseline = {}
+    print(f"{'阶段':<18}{'图片/秒':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+          f"{'峰值(MB)':>10}{'失败':>6}{'对比基准':>14}")
+    for name, stage in results.items():
+        if name == 'params' or not isinstance(stage, dict):
+            continue
+        delta = ''
+        base = baseline.get(name)
+        if base:
+            ratio = stage['images_per_s'] / base['images_per_s'] if base['images_per_s'] else 1.0
+            delta = f"{(ratio - 1) * 100:+.1f}%"
+            if (ratio < 1 - tolerance or stage['p95'] > base['p95'] * (1 + tolerance)
+                    or stage['peak_rss_mb'] > base.get('peak_rss_mb', float('inf')) * (1 + tolerance)):
+                regressions.append(name)
+                delta += ' 回归'
+        print(f"{name:<18}{stage['images_per_s']:>10.1f}{stage['p50']:>10.1f}"
+              f"{stage['p95']:>10.1f}{stage['p99']:>10.1f}{stage['peak_rss_mb']:>10.1f}"
+              f"{stage['failed']:>6}{delta:>14}")
+    print(f"峰值内存: {results['peak_rss_mb']:.1f} MB"
+          + (f" (基准 {baseline['peak_rss_mb']:.1f} MB)" if 'peak_rss_mb' in baseline else ''))
+    if 'peak_rss_mb' in baseline and results['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + tolerance):
+        regressions.append('peak_rss_mb')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="图片流水线基准测试")
+    parser.add_argument('--corpus', help="测试图片目录（只读取，不写入）；不指定时在临时目录生成合成图片")
+    parser.add_argument('--count', type=int, default=60, help="生成的图片数量（未指定--corpus时）")
+    parser.add_argument('--target', default='1920x1080', help="渲染目标尺寸")
+    parser.add_argument('--repeat', type=int, default=5, help="目录扫描重复次数")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="把本次结果保存为基准")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="允许的性能波动比例")
+    args = parser.parse_args()
+    target = tuple(int(v) for v in args.target.split('x'))
+
+    if args.corpus:
+        results = run(args.corpus, target, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            build_corpus(tmp, args.count)
+            results = run(tmp, target, args.repeat)
+    results['params'] = {
+        'corpus': os.path.abspath(args.corpus) if args.corpus else 'synthetic',
+        'count': None if args.corpus else args.count,
+        'repeat': args.repeat,
+        'target': args.target,
+    }
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"已保存基准: {args.baseline}")
+    elif regressions:
+        print(f"性能回归: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+class ByteLRU(OrderedDict):
+    """按实际字节数限制容量的LRU缓存，淘汰时调用on_evict释放资源
+
+    写入和删除请使用 put / discard，以保证字节统计准确。
+    """
+
+    def __init__(self, budget_bytes, on_evict=None):
+        super().__init__()
+        self.budget_bytes = budget_bytes
+        self.on_evict = on_evict
+        self.sizes = {}
+        self.total_bytes = 0
+
+    def put(self, key, value, nbytes):
+        """写入一项并移到最新位置，已存在时先释放旧值"""
+        if key in self:
+            self.discard(key)
+        self[key] = value
+        self.sizes[key] = nbytes
+        self.total_bytes += nbytes
+
+    def touch(self, key):
+        """标记为最近使用"""
+        self.move_to_end(key)
+
+    def discard(self, key):
+        """删除一项并释放资源"""
+        value = self.pop(key)
+        self.total_bytes -= self.sizes.pop(key)
+        if self.on_evict:
+            try:
+                self.on_evict(key, value)
+            except Exception as e:
+                print(f"释放缓存项出错: {e}")
+        return value
+
+    def trim(self, protected=()):
+        """从最久未使用的一项开始淘汰，直到不超过预算，protected中的键不会被淘汰"""
+        if self.total_bytes <= self.budget_bytes:
+            return 0
+        evicted = 0
+        for key in list(self):
+            if self.total_bytes <= self.budget_bytes:
+                break
+            if key in protected:
+                continue
+            self.discard(key)
+            evicted += 1
+        return evicted
+
+    def clear(self):
+        for key in list(self):
+            self.discard(key)
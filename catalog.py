@@ -0,0 +1,212 @@
+# 持久化图片目录：记录路径、修改时间、文件大小、像素尺寸和解码失败标记
+# 启动时增量扫描：目录修改时间未变化时直接使用记录的子项，不再列出目录内容
+# 注意：原地覆盖文件不会改变目录的修改时间，这类变化要等目录本身变化后才会被发现
+import os
+import sqlite3
+import threading
+from urllib.parse import quote
+from PIL import Image
+from config import *
+from utils import IMAGE_EXTENSIONS
+from decode import DECODE_ERRORS
+
+class ImageCatalog:
+    """SQLite图片目录：扫描和写入共用一个连接，通过锁串行访问
+
+    尺寸查询(dimensions)在主线程等处频繁调用，每个线程使用各自的只读连接，
+    WAL模式下读取不会等待扫描线程的锁和写事务。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = None
+        self._local = threading.local()
+        self._readers = []  # 所有线程的只读连接，关闭时统一关闭
+        self._readers_lock = threading.Lock()
+
+    def _connect(self):
+        """懒加载数据库连接，首次使用时才打开文件"""
+        if self.conn is not None:
+            return self.conn
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS dirs (
+            path TEXT PRIMARY KEY,
+            parent TEXT,
+            mtime_ns INTEGER)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS images (
+            path TEXT PRIMARY KEY,
+            dir TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            failed INTEGER NOT NULL DEFAULT 0)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent)")
+        conn.execute("CREATE INDEX IF NOT EXISTS images_dir ON images(dir)")
+        self.conn = conn
+        return conn
+
+    def scan(self, root, stop=None):
+        """增量扫描root，按目录产出未标记失败的图片路径；stop为threading.Event时可中途停止"""
+        root = os.path.abspath(root)
+        stack = [root]
+        while stack:
+            if stop is not None and stop.is_set():
+                return
+            directory = stack.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError as e:
+                print(f"目录扫描错误: {directory} - {e}")
+                continue
+            with self.lock:
+                conn = self._connect()
+                row = conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (directory,)).fetchone()
+                if row is not None and row[0] == mtime_ns:
+                    # 目录未变化，直接使用记录
+                    images = [r[0] for r in conn.execute(
+                        "SELECT path FROM images WHERE dir = ? AND failed = 0 ORDER BY path", (directory,))]
+                    subdirs = [r[0] for r in conn.execute(
+                        "SELECT path FROM dirs WHERE parent = ? ORDER BY path", (directory,))]
+                else:
+                    images = None
+            if images is None:
+                # 列目录和stat放在锁外，避免阻塞主线程查询
+                listing = self._list_dir(directory)
+                if listing is None:
+                    continue
+                with self.lock:
+                    images, subdirs = self._update_dir(self._connect(), directory, mtime_ns, *listing)
+                    self.conn.commit()
+            yield from images
+            stack.extend(reversed(subdirs))
+
+    def _list_dir(self, directory):
+        """列出目录中的图片(含修改时间和大小)和子目录，失败时返回None"""
+        files = {}
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                            st = entry.stat()
+                            files[entry.path] = (st.st_mtime_ns, st.st_size)
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"目录扫描错误: {directory} - {e}")
+            return None
+        subdirs.sort()
+        return files, subdirs
+
+    def _update_dir(self, conn, directory, mtime_ns, files, subdirs):
+        """用新的列表结果更新一个发生变化的目录的图片和子目录记录"""
+        known = {r[0]: r[1:] for r in conn.execute(
+            "SELECT path, mtime_ns, size, failed FROM images WHERE dir = ?", (directory,))}
+        images = []
+        for path, (file_mtime, size) in sorted(files.items()):
+            old = known.pop(path, None)
+            if old is not None and old[:2] == (file_mtime, size):
+                if not old[2]:
+                    images.append(path)
+                continue
+            # 新文件或已修改：重置尺寸和失败标记
+            conn.execute("INSERT OR REPLACE INTO images (path, dir, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                         (path, directory, file_mtime, size))
+            images.append(path)
+        conn.executemany("DELETE FROM images WHERE path = ?", [(path,) for path in known])
+
+        old_subdirs = {r[0] for r in conn.execute("SELECT path FROM dirs WHERE parent = ?", (directory,))}
+        for path in old_subdirs.difference(subdirs):
+            self._forget_tree(conn, path)
+        conn.executemany("INSERT OR IGNORE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, NULL)",
+                         [(path, directory) for path in subdirs])
+        conn.execute("INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                     (directory, os.path.dirname(directory), mtime_ns))
+        return images, subdirs
+
+    def _forget_tree(self, conn, path):
+        """删除已不存在的目录及其所有子目录和图片的记录"""
+        prefix = path + os.sep
+        conn.execute("DELETE FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", (path, len(prefix), prefix))
+        conn.execute("DELETE FROM images WHERE dir = ? OR substr(dir, 1, ?) = ?", (path, len(prefix), prefix))
+
+    def probe_dimensions(self, stop=None, batch=200):
+        """读取尚未记录尺寸的图片文件头（不解码像素），无法识别的文件标记为失败
+
+        其他错误（文件暂时不可读、超出像素上限等）不写入，尺寸保持为空，下次扫描后重新读取。
+        """
+        retry = set()
+        while stop is None or not stop.is_set():
+            with self.lock:
+                rows = self._connect().execute(
+                    "SELECT path FROM images WHERE width IS NULL AND failed = 0 LIMIT ?", (batch + len(retry),))
+                paths = [r[0] for r in rows if r[0] not in retry]
+            if not paths:
+                return
+            updates = []
+            for path in paths:
+                try:
+                    with Image.open(path) as img:
+                        updates.append((img.width, img.height, 0, path))
+                except DECODE_ERRORS:
+                    updates.append((None, None, 1, path))
+                except Exception:
+                    retry.add(path)
+            if not updates:
+                continue
+            with self.lock:
+                self.conn.executemany("UPDATE images SET width = ?, height = ?, failed = ? WHERE path = ?", updates)
+                self.conn.commit()
+
+    def _reader(self):
+        """当前线程的只读连接；数据库文件尚不存在时打开失败，下次调用再重试"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{quote(self.db_path)}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def dimensions(self, path):
+        """返回已记录的像素尺寸 (宽, 高)，未知时返回None"""
+        try:
+            row = self._reader().execute(
+                "SELECT width, height FROM images WHERE path = ?", (path,)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or row[0] is None:
+            return None
+        return row
+
+    def mark_failed(self, path):
+        """标记解码失败，下次扫描时跳过（文件修改后自动重试）"""
+        try:
+            with self.lock:
+                self._connect().execute("UPDATE images SET failed = 1 WHERE path = ?", (path,))
+                self.conn.commit()
+        except sqlite3.Error as e:
+            print(f"更新图片目录失败: {e}")
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+            self._local = threading.local()
+
+image_catalog = ImageCatalog(os.path.join(CACHE_DIR, 'catalog.db')) if CATALOG else None
@@ -3,12 +3,87 @@ import os
 # 全局配置
 DURATION = 5
 TRANSITION = 1
-MAX_IMAGES = 2
+# 幻灯片纹理缓存的显存预算(MB)，按纹理实际字节数计算
+TEXTURE_BUDGET_MB = 256
+# 窗口尺寸变化后等待多少秒再按新分辨率重新渲染；纹理按实际窗口尺寸渲染，缓存按此步长(像素)分档
+RESIZE_DEBOUNCE = 0.3
+RESIZE_BUCKET_STEP = 128
+# 预渲染完成的帧在后台按行分块上传为纹理，每帧最多占用的毫秒数；
+# 切换时上传尚未完成或没有预渲染结果的图片仍会同步上传，那一帧会超出预算
+STREAM_UPLOAD = True
+UPLOAD_BUDGET_MS = 4
+# 启动时的窗口尺寸，也是预热缓存(warm_cache.py)默认渲染的尺寸
+WINDOW_SIZE = (900, 600)
+# 快速启动：第一张图片没有帧缓存时先显示降分辨率解码、不做增强的预览，完整渲染在后台完成后替换
+FAST_STARTUP = True
 PROGRESS_BAR_HEIGHT = 5
 THREAD_POOL_SIZE = 4
+# 幻灯片渲染后端：'thread' 使用线程池，'process' 使用进程池+共享内存（滤镜不受GIL限制）
+RENDER_BACKEND = 'thread'
+PROCESS_POOL_SIZE = 2
+# 预渲染：提前在后台渲染接下来的几张图片
+PREFETCH_COUNT = 2
+PREFETCH_WORKERS = 2
+# 缩略图和幻灯片渲染共用的任务调度器工作线程数，按优先级（可见、下一张、预取、预热）出队
+SCHEDULER_WORKERS = THREAD_POOL_SIZE + PREFETCH_WORKERS
+# 预渲染帧占用内存上限(MB)，按图片目录中记录的尺寸估算
+PREFETCH_BUDGET_MB = 256
 THUMBNAIL_SIZE = (500, 500)
+# 缩略图网格：列数、一屏显示的行数、可见范围上下各预取的行数
+THUMBNAIL_COLUMNS = 5
+THUMBNAIL_ROWS = 2
+THUMBNAIL_PREFETCH_ROWS = 2
+# 鼠标滚轮每格滚动的行数，翻页(上下键)平滑滚动的时长(秒)
+THUMBNAIL_SCROLL_STEP = 0.5
+THUMBNAIL_SCROLL_TIME = 0.2
+# 缩略图图集纹理边长，实际值不超过显卡支持的最大纹理尺寸
+THUMBNAIL_ATLAS_SIZE = 2048
+# 缩略图内存缓存预算(MB)：图集中的纹理和解码后的像素数据分别计算
+THUMBNAIL_TEXTURE_BUDGET_MB = 128
+THUMBNAIL_DATA_BUDGET_MB = 256
 DEFAULT_FOLDER = os.path.abspath("./img")
-# 内存占用
+# 后台扫描目录时，主线程每隔多少秒把新发现的图片加入播放列表
+SCAN_INGEST_INTERVAL = 0.25
+# 持久化图片目录(SQLite)：增量扫描，记录尺寸和解码失败的文件
+CATALOG = True
+# 播放时监听目录变化，新图片插入播放列表，删除的图片移出（Linux用inotify，其他系统轮询）
+WATCH_FOLDER = True
+WATCH_POLL_INTERVAL = 2.0
+# 持久化缓存目录，也可以通过环境变量 PICVIEW_CACHE_DIR 指定（预热服务器与查看器共用缓存时）
+CACHE_DIR = os.environ.get("PICVIEW_CACHE_DIR") or os.path.expanduser("~/.cache/picview")
+# 磁盘缩略图缓存：容量上限(MB)，zlib压缩级别(0为不压缩)
+THUMBNAIL_STORE = True
+THUMBNAIL_STORE_MAX_MB = 1024
+THUMBNAIL_STORE_COMPRESS = 1
+# 渲染完成的全屏帧缓存（内存映射读取，回看时无需重新解码和滤镜）及其容量上限(MB)
+FRAME_STORE = True
+FRAME_STORE_MAX_MB = 2048
+# 内存占用：定期打印内存统计并以JSON行追加到MEMORY_LOG（None为不导出）；按M键显示/隐藏屏幕上的内存统计
+# 日志超过MEMORY_LOG_MAX_MB时改名为 .1 备份（只保留一份）后重新开始
 MEMORY_MONITORING = True 
+MEMORY_LOG = os.path.join(CACHE_DIR, "memory.jsonl")
+MEMORY_LOG_MAX_MB = 10
+MEMORY_LOG_INTERVAL = 60
+MEMORY_HUD_INTERVAL = 1.0
 # 对比度
 IMAGE_ENHANCE = 1.1
+# 动图(GIF/WebP)播放：预先上传的帧数（纹理环大小）和每个动图的内存上限(MB)
+# 内存上限包含纹理环、已解码帧和解码中的一帧，放不下时缩小帧尺寸；动图帧做对比度增强但不锐化
+ANIMATION = True
+ANIMATION_RING_FRAMES = 4
+ANIMATION_MEMORY_MB = 64
+# 降分辨率解码：解码尺寸至少为目标尺寸的多少倍，越大画质越好但越慢，0为全分辨率解码
+DECODE_OVERSAMPLE = 1.5
+# 大图保护：像素数超过MAX_IMAGE_PIXELS的2倍视为解压炸弹直接拒绝（None关闭）；
+# 单个解码任务估算峰值内存上限(MB，超过时改用大图模式)，以及同时解码的任务估算内存总预算(MB，多进程渲染后端各进程共用)
+MAX_IMAGE_PIXELS = 300_000_000
+DECODE_JOB_CAP_MB = 1024
+DECODE_MEMORY_BUDGET_MB = 1536
+# 增强引擎：'pil' 使用 ImageEnhance/ImageFilter；'numpy' 使用合并计算的NumPy实现（需要安装numpy）
+ENHANCE_ENGINE = 'pil'
+# 性能分析：记录帧耗时、渲染阶段耗时和GC暂停，导出Chrome trace(JSON)
+# 也可以通过环境变量 PICVIEW_PROFILE=1 开启
+PROFILING = os.environ.get("PICVIEW_PROFILE") == "1"
+PROFILE_OUTPUT = os.path.abspath("./picview_trace.json")
+PROFILE_EXPORT_INTERVAL = 60
+PROFILE_MAX_EVENTS = 100000
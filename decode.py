@@ -0,0 +1,234 @@
+# 降分辨率解码策略：在模式转换和高质量缩放之前，先让解码结果接近目标尺寸
+# JPEG 使用 draft 在解码阶段按 1/2、1/4、1/8 缩小；其他格式解码后先用 reduce 做整数倍缩小
+# RGB/L/RGBA 保持解码模式，由调用方缩放到目标尺寸后再用 as_rgba 转换，RGBA转换只在小图上进行
+# 大图保护：解码前根据文件头估算峰值内存，超过单任务上限时改用大图模式（不超采样，JPEG按更小比例解码），
+# 仍然超过时拒绝；并按估算字节数限制同时解码的任务
+import ctypes
+import threading
+from PIL import Image
+from config import *
+
+# 显式设置解压炸弹阈值，超过2倍时Pillow直接抛出DecompressionBombError
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# 可以直接缩放的模式，open_reduced不转换；其他模式在解码阶段转换为RGBA
+RESIZE_MODES = ('RGB', 'RGBA', 'L')
+
+class ImageTooLarge(ValueError):
+    """估算的解码峰值内存超过DECODE_JOB_CAP_MB"""
+
+# 文件本身无法解码的错误，只有这些才标记为失败并在之后的扫描中跳过；
+# 普通OSError（文件被占用、网络盘暂时不可读、截断的文件正在写入）和纹理上传错误下次仍会重试
+DECODE_ERRORS = (Image.UnidentifiedImageError, SyntaxError)
+# 超出内存上限的错误取决于配置(DECODE_JOB_CAP_MB、MAX_IMAGE_PIXELS)，只在本次运行中跳过，不写入图片目录
+OVERSIZE_ERRORS = (ImageTooLarge, Image.DecompressionBombError)
+
+# 超过单任务上限时依次尝试的大图模式 (oversample, JPEG是否按draft最小比例1/8解码)
+# 第二种模式的解码尺寸可能小于窗口，由后续缩放放大，画质下降但仍能显示
+LARGE_IMAGE_PLANS = ((1.0, False), (1.0, True))
+
+class _Counter(ctypes.Structure):
+    """已准入的估算字节数和任务数；多进程后端时放在共享内存中"""
+    _fields_ = [('value', ctypes.c_int64), ('active', ctypes.c_int64)]
+
+class MemoryGate:
+    """按估算字节数准入的信号量：正在解码的任务估算总和不超过预算，单个任务总能在空闲时进入
+
+    多进程渲染后端通过share()改用进程间共享的计数和条件变量，主进程和各子进程共用一份预算。
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._counter = _Counter()
+        self.cond = threading.Condition()
+        self.shared = False  # 是否已改用进程间共享的计数
+
+    @property
+    def in_use(self):
+        return self._counter.value
+
+    @property
+    def active(self):
+        """正在解码（已准入未释放）的任务数，包括共享预算的其他进程"""
+        return self._counter.active
+
+    def _enter(self):
+        """获取当前的条件变量；等待期间share()替换了条件变量时重新获取新的"""
+        while True:
+            cond = self.cond
+            cond.acquire()
+            if cond is self.cond:
+                return cond
+            cond.release()
+
+    def acquire(self, nbytes):
+        cond = self._enter()
+        try:
+            while self.in_use and self.in_use + nbytes > self.budget_bytes:
+                cond.wait()
+                if cond is not self.cond:
+                    cond.release()
+                    cond = self._enter()
+            self._counter.value += nbytes
+            self._counter.active += 1
+        finally:
+            cond.release()
+
+    def release(self, nbytes):
+        cond = self._enter()
+        try:
+            self._counter.value -= nbytes
+            self._counter.active -= 1
+            cond.notify_all()
+        finally:
+            cond.release()
+
+    def share(self, ctx):
+        """改用进程间共享的计数和条件变量，返回传给子进程attach()的参数"""
+        cond = self._enter()
+        try:
+            if not self.shared:
+                self.shared = True
+                counter = self._counter
+                self._counter = ctx.Value(_Counter, counter.value, counter.active, lock=False)
+                self.cond = ctx.Condition()
+                # 唤醒在旧条件变量上等待的线程，改为等待新的
+                cond.notify_all()
+            return self.cond, self._counter
+        finally:
+            cond.release()
+
+    def attach(self, cond, counter):
+        """子进程启动时接入主进程share()返回的计数和条件变量"""
+        self._counter = counter
+        self.cond = cond
+        self.shared = True
+
+decode_gate = MemoryGate(DECODE_MEMORY_BUDGET_MB * 1024 * 1024)
+
+def pixel_bytes(mode):
+    """Pillow内部每像素占用的字节数（多通道图像按4字节存储）"""
+    if mode in ('1', 'L', 'P'):
+        return 1
+    if mode.startswith('I;16'):
+        return 2
+    return 4
+
+def fit_size(width, height, target_width, target_height):
+    """保持宽高比缩放到目标区域内的尺寸"""
+    scale = min(target_width / width, target_height / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+def output_size(img, target_width, target_height):
+    """open_reduced结果最终缩放到的尺寸：按原图尺寸计算，与降分辨率解码的取整无关"""
+    return fit_size(*img.info.get('source_size', img.size), target_width, target_height)
+
+def fits_window(width, height, target_width, target_height):
+    """尺寸为width x height的渲染结果是否就是按目标区域缩放得到的（允许1像素取整误差）"""
+    fit_w, fit_h = fit_size(width, height, target_width, target_height)
+    return abs(fit_w - width) <= 1 and abs(fit_h - height) <= 1
+
+def decode_request_size(width, height, target_width, target_height, oversample=DECODE_OVERSAMPLE):
+    """计算解码阶段至少需要保留的尺寸，oversample越大最终缩放质量越好"""
+    fit_w, fit_h = fit_size(width, height, target_width, target_height)
+    return max(1, int(fit_w * oversample)), max(1, int(fit_h * oversample))
+
+def reduce_factor(width, height, request_width, request_height):
+    """不低于请求尺寸的最大整数缩小倍数"""
+    return max(1, min(width // request_width, height // request_height))
+
+def estimate_decode_bytes(width, height, mode, factor):
+    """估算解码的峰值内存：完整解码结果 + 调色板展开 + reduce结果 + 其他模式的RGBA转换"""
+    decoded = width * height * pixel_bytes(mode)
+    expanded = width * height * 4 if mode == 'P' and factor > 1 else 0
+    reduced = (width // factor) * (height // factor) * 4
+    converted = reduced if mode not in RESIZE_MODES and not expanded else 0
+    return decoded + expanded + (reduced if factor > 1 else 0) + converted
+
+def _plan(img, target_width, target_height, oversample, max_draft=False):
+    """确定解码请求尺寸（JPEG同时设置draft）并估算峰值内存，返回 (请求尺寸或None, 估算字节数)"""
+    request = None
+    factor = 1
+    if oversample > 0:
+        request = decode_request_size(img.width, img.height, target_width, target_height, oversample)
+        if img.format == 'JPEG':
+            # 只修改解码器参数，不会实际解码；之后的尺寸即解码尺寸
+            img.draft(None, (1, 1) if max_draft else request)
+        factor = reduce_factor(img.width, img.height, *request)
+    return request, estimate_decode_bytes(img.width, img.height, img.mode, factor)
+
+def _open_planned(path, target_width, target_height, oversample):
+    """打开图片并确定解码方式，返回 (图像, 请求尺寸, 估算字节数)
+
+    估算超过DECODE_JOB_CAP_MB时依次改用LARGE_IMAGE_PLANS（draft只能设置一次，每次重新打开文件头），
+    都超过时抛出ImageTooLarge。
+    """
+    for oversample, max_draft in ((oversample, False),) + LARGE_IMAGE_PLANS:
+        img = Image.open(path)
+        try:
+            size, fmt = img.size, img.format
+            request, estimate = _plan(img, target_width, target_height, oversample, max_draft)
+        except Exception:
+            img.close()
+            raise
+        if estimate <= DECODE_JOB_CAP_MB * 1024 * 1024:
+            # 解码后的图像（reduce、convert的结果）会复制info
+            img.info['source_size'] = size
+            return img, request, estimate
+        img.close()
+    raise ImageTooLarge(f"解码需要约 {estimate / 2**20:.0f}MB，超过单任务上限 {DECODE_JOB_CAP_MB}MB: "
+                        f"{size[0]}x{size[1]} {fmt}")
+
+def estimate_file_bytes(path, target_width, target_height, oversample=DECODE_OVERSAMPLE):
+    """只读文件头，估算open_reduced解码这张图片的峰值内存（包括改用大图模式的情况）"""
+    img, _, estimate = _open_planned(path, target_width, target_height, oversample)
+    img.close()
+    return estimate
+
+def open_reduced(path, target_width, target_height, oversample=DECODE_OVERSAMPLE):
+    """打开图片并以接近目标尺寸的分辨率解码，返回已加载的RGB、L或RGBA图像
+
+    oversample为0时关闭降分辨率解码，与原先的全分辨率解码一致。
+    解码前按文件头估算峰值内存：超过DECODE_JOB_CAP_MB时改用大图模式，仍超过时抛出ImageTooLarge；
+    然后等待decode_gate准入，避免多个大图同时解码。
+    """
+    img, request, estimate = _open_planned(path, target_width, target_height, oversample)
+    try:
+        decode_gate.acquire(estimate)
+        try:
+            return _decode(img, request)
+        finally:
+            decode_gate.release(estimate)
+    except Exception:
+        img.close()
+        raise
+
+def as_rgba(img):
+    """缩放后转换为RGBA（纹理格式），转换后释放原图像"""
+    if img.mode == 'RGBA':
+        return img
+    return _replace(img, img.convert('RGBA'))
+
+def _decode(img, request):
+    """解码并缩小到请求尺寸附近，RESIZE_MODES以外的模式转换为RGBA；request为None时按原尺寸解码"""
+    img.load()
+    if request is not None:
+        factor = reduce_factor(img.width, img.height, *request)
+        if factor > 1:
+            if img.mode == 'P':
+                # 调色板图像不能直接求平均，先展开
+                img = _replace(img, img.convert('RGBA'))
+            try:
+                img = _replace(img, img.reduce(factor))
+            except ValueError:
+                # 部分模式(如16位灰度)不支持reduce，保持原尺寸
+                pass
+    if img.mode not in RESIZE_MODES:
+        img = as_rgba(img)
+    return img
+
+def _replace(old, new):
+    """用新图像替换旧图像并立即释放旧图像"""
+    if new is not old:
+        old.close()
+    return new
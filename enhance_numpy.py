@@ -0,0 +1,173 @@
+# NumPy 增强引擎：对比度、USM锐化、RGBA转换和垂直翻转一次完成，结果直接写入纹理上传用的输出缓冲
+# PIL 链条每一步都会生成一张完整的新图片（Contrast -> UnsharpMask -> RGBA转换 -> tobytes），约20字节/像素；
+# 这里对比度用查找表在uint8上完成，模糊按行条、列条分块计算，32位临时数组只有一个条带大小，留在CPU缓存中；
+# 整帧只有对比度结果（每通道1字节）、每个线程复用的横向模糊缓冲（每通道1字节）和输出（4字节），
+# 翻转体现在输出的写入顺序上；NumPy运算释放GIL，线程池可以并行
+#
+# 计算方式与 Pillow 相同，结果逐像素一致（ENGINE_TOLERANCE，由 tests/test_enhance_numpy.py 校验，bench/engines.py 可测更多图片）：
+# - 对比度：均值取自L通道直方图，mean + factor * (px - mean) 按单精度计算后截断，透明通道不变
+# - 模糊：Pillow 的三次扩展盒式模糊（先横向三次再纵向三次，每次取整到8位），整数权重与 BoxBlur.c 相同
+# - USM：|差值| > 阈值时加上 差值*percent/100（向零截断），四个通道都生效
+import math
+import ctypes
+import threading
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# 允许的最大单通道差值和平均差值（0-255）；与PIL逐像素一致
+ENGINE_TOLERANCE = {'max_abs': 0, 'mean_abs': 0.0}
+
+# 条带的行数/列数：32位临时数组约为 条带 x 宽(或高) x 通道 x 4字节，1080p下约几百KB
+STRIP = 32
+
+_local = threading.local()
+
+def box_radius(radius, passes=3):
+    """与 Pillow 相同的扩展盒式模糊半径（单精度计算），passes次盒式模糊近似标准差为radius的高斯模糊"""
+    f32 = np.float32
+    sigma2 = f32(f32(radius) * f32(radius) / f32(passes))
+    length = f32(math.sqrt(12.0 * sigma2 + 1.0))
+    whole = f32(math.floor((length - 1.0) / 2.0))
+    frac = f32((2 * whole + 1) * (whole * (whole + 1) - 3 * sigma2))
+    frac = f32(frac / f32(6 * (sigma2 - (whole + 1) * (whole + 1))))
+    return f32(whole + frac)
+
+def box_weights(radius):
+    """盒式模糊的整数半径和24位定点权重 (半径, 盒内权重, 两端权重)"""
+    whole = int(radius)
+    ww = int(np.float32(1 << 24) / np.float32(radius * 2 + 1))
+    fw = ((1 << 24) - (whole * 2 + 1) * ww) // 2
+    return whole, ww, fw
+
+def _scratch(name, shape, dtype):
+    """当前线程复用的缓冲区，容量不足时才重新分配（最后一个较窄的条带直接复用前面的缓冲）"""
+    size = math.prod(shape)
+    buf = getattr(_local, name, None)
+    if buf is None or buf.size < size or buf.dtype != dtype:
+        buf = np.empty(size, dtype)
+        setattr(_local, name, buf)
+    return buf[:size].reshape(shape)
+
+def _box_blur(pad, spare, axis, whole, ww, fw, passes):
+    """沿axis做passes次盒式模糊，与 Pillow 的 ImagingLineBoxBlur32 逐像素一致，返回存放结果的缓冲
+
+    pad两端各多出whole+1个复制的边缘像素：盒内whole*2+1个像素按ww加权，两端各一个像素按fw加权（小数半径部分）；
+    每次的结果写入另一块缓冲（spare）的中间部分，两块缓冲交替使用。
+    """
+    edge = whole + 1
+    length = pad.shape[axis] - 2 * edge
+    shape = list(pad.shape)
+    shape[axis] = length
+    # 临时数组与pad的内存布局相同，逐元素运算才是连续访问
+    acc = _scratch('acc', tuple(shape), np.uint32)
+    far = _scratch('far', tuple(shape), np.uint32)
+    if axis:
+        pad, spare, acc, far = (a.swapaxes(0, axis) for a in (pad, spare, acc, far))
+    for _ in range(passes):
+        np.copyto(acc, pad[1:1 + length])
+        for start in range(2, 2 * edge):
+            acc += pad[start:start + length]
+        np.add(pad[:length], pad[2 * edge:], out=far)
+        acc *= ww
+        far *= fw
+        acc += far
+        acc += 1 << 23
+        np.right_shift(acc, 24, out=spare[edge:edge + length])
+        spare[:edge] = spare[edge]
+        spare[edge + length:] = spare[edge + length - 1]
+        pad, spare = spare, pad
+    return pad.swapaxes(0, axis) if axis else pad
+
+def _contrast_lut(img, contrast):
+    """与 ImageEnhance.Contrast 相同的对比度映射表（Image.blend的单精度计算和截断），供img.point使用"""
+    gray = img if img.mode == 'L' else img.convert('L')
+    hist = gray.histogram()
+    pixels = max(1, sum(hist))
+    mean = np.float32(int(sum(i * count for i, count in enumerate(hist)) / pixels + 0.5))
+    values = mean + np.float32(contrast) * (np.arange(256, dtype=np.float32) - mean)
+    lut = np.clip(values, 0, 255).astype(np.uint8).tolist()
+    # 对比度不改变透明通道
+    return [v for band in img.getbands() for v in (range(256) if band == 'A' else lut)]
+
+def _pack_rgba(values, channels):
+    """把 (行, 宽, 通道) 的0-255数组打包为小端RGBA像素，灰度复制到三个通道，没有透明通道时不透明"""
+    packed = _scratch('packed', values.shape[:2], np.uint32)
+    if channels == 1:
+        np.multiply(values[..., 0], 0x010101, out=packed)
+    else:
+        shifted = _scratch('shifted', values.shape[:2], np.uint32)
+        np.left_shift(values[..., 2], 16, out=packed)
+        np.left_shift(values[..., 1], 8, out=shifted)
+        packed |= shifted
+        packed |= values[..., 0]
+    if channels == 4:
+        np.left_shift(values[..., 3], 24, out=shifted)
+        packed |= shifted
+    else:
+        packed |= 0xFF000000
+    return packed
+
+def enhance(img, contrast, radius, percent, threshold):
+    """对已缩放的L/RGB/RGBA PIL图像做对比度+USM锐化，转换为RGBA并垂直翻转，返回 (宽, 高, ctypes字节数组)
+
+    返回的数组直接引用NumPy输出缓冲，可作为pyglet.image.ImageData的数据上传，无需tobytes。
+    """
+    width, height = img.size
+    channels = len(img.getbands())
+    with img.point(_contrast_lut(img, contrast)) as contrasted:
+        src = np.asarray(contrasted).reshape(height, width, channels)
+
+    whole, ww, fw = box_weights(box_radius(radius))
+    edge = whole + 1
+    out = np.empty((height, width, 4), np.uint8)
+
+    # 横向三次模糊：按行条计算，结果存入线程复用的8位缓冲
+    blur = _scratch('blur', (height, width, channels), np.uint8)
+    hpad = _scratch('hpad', (STRIP, width + 2 * edge, channels), np.uint32)
+    hspare = _scratch('hspare', hpad.shape, np.uint32)
+    for top in range(0, height, STRIP):
+        rows = min(STRIP, height - top)
+        pad = hpad[:rows]
+        pad[:, edge:edge + width] = src[top:top + rows]
+        pad[:, :edge] = src[top:top + rows, :1]
+        pad[:, edge + width:] = src[top:top + rows, -1:]
+        result = _box_blur(pad, hspare[:rows], 1, whole, ww, fw, 3)
+        blur[top:top + rows] = result[:, edge:edge + width]
+
+    # 纵向三次模糊：按列条计算，结果写回同一缓冲，之后缓冲中即完整的模糊结果
+    vpad = _scratch('vpad', (height + 2 * edge, STRIP, channels), np.uint32)
+    vspare = _scratch('vspare', vpad.shape, np.uint32)
+    for left in range(0, width, STRIP):
+        cols = min(STRIP, width - left)
+        pad = vpad[:, :cols]
+        pad[edge:edge + height] = blur[:, left:left + cols]
+        pad[:edge] = blur[:1, left:left + cols]
+        pad[edge + height:] = blur[-1:, left:left + cols]
+        result = _box_blur(pad, vspare[:, :cols], 0, whole, ww, fw, 3)
+        blur[:, left:left + cols] = result[edge:edge + height]
+
+    # USM并转换为RGBA：按行条计算，每个像素打包成一个32位整数，按翻转后的行序写入输出
+    pixels = out.view('<u4').reshape(height, width)[::-1]
+    for top in range(0, height, STRIP):
+        rows = min(STRIP, height - top)
+        orig = src[top:top + rows]
+        # 差值 = 原值 - 模糊值，|差值| > 阈值时加上 差值*percent/100（向零截断）
+        diff = _scratch('diff', orig.shape, np.int32)
+        adjust = _scratch('adjust', orig.shape, np.int32)
+        keep = _scratch('keep', orig.shape, np.bool_)
+        np.subtract(orig, blur[top:top + rows], out=diff, dtype=np.int32)
+        np.abs(diff, out=adjust)
+        np.greater(adjust, threshold, out=keep)
+        adjust *= percent
+        adjust //= 100
+        adjust *= keep
+        np.sign(diff, out=diff)
+        adjust *= diff
+        adjust += orig
+        np.clip(adjust, 0, 255, out=adjust)
+        pixels[top:top + rows] = _pack_rgba(adjust.view(np.uint32), channels)
+    return width, height, (ctypes.c_ubyte * out.nbytes).from_buffer(out)
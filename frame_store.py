@@ -0,0 +1,132 @@
+# 渲染结果的磁盘缓存：每帧一个文件，保存最终的已翻转RGBA数据，再次显示时直接内存映射后上传纹理
+# 键由路径、修改时间、文件大小、目标尺寸和增强参数计算，源文件或参数变化后自动失效
+# 多个进程（多进程渲染后端）可同时写入：先写临时文件再原子替换，淘汰时重新统计目录中的实际文件
+import os
+import mmap
+import struct
+import hashlib
+import threading
+from config import *
+
+# 文件头：魔数、宽、高
+_HEADER = struct.Struct('<4sII')
+_MAGIC = b'PVF1'
+HEADER_SIZE = _HEADER.size
+_SUFFIX = '.rgba'
+
+def frame_key(path, window_width, window_height, settings):
+    """根据源文件标识、目标尺寸和增强参数计算帧键，文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{window_width}x{window_height}|{settings}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+class FrameStore:
+    """带容量上限的帧文件缓存，按文件修改时间（命中时更新）做LRU淘汰"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total_bytes = None  # 首次写入时统计
+
+    def _file(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(self, key):
+        """映射缓存的帧，返回 (宽, 高, mmap)，像素数据从HEADER_SIZE偏移处开始；未命中返回None"""
+        if key is None:
+            return None
+        try:
+            with open(self._file(key), 'rb') as f:
+                # ACCESS_COPY 映射可写（写时复制），ctypes可以直接引用，不会读入整份数据
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (OSError, ValueError):
+            return None
+        magic, width, height = _HEADER.unpack_from(mm, 0) if len(mm) >= _HEADER.size else (None, 0, 0)
+        if magic != _MAGIC or len(mm) != _HEADER.size + width * height * 4:
+            mm.close()
+            self._remove(key)
+            return None
+        try:
+            os.utime(self._file(key))
+        except OSError:
+            pass
+        return width, height, mm
+
+    def contains(self, key):
+        """判断帧是否已缓存（不映射文件，不更新使用时间）"""
+        return key is not None and os.path.exists(self._file(key))
+
+    def put(self, key, width, height, data):
+        """写入一帧，超出容量时淘汰最久未使用的帧"""
+        if key is None:
+            return
+        nbytes = _HEADER.size + width * height * 4
+        target = self._file(key)
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, width, height))
+                f.write(data)
+            os.replace(tmp, target)
+        except OSError as e:
+            print(f"写入帧缓存失败: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = self._scan()[1]
+            else:
+                self.total_bytes += nbytes
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        """列出缓存文件 [(修改时间, 大小, 路径)] 和总字节数"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(_SUFFIX):
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            pass
+        return entries, sum(size for _, size, _ in entries)
+
+    def _evict(self):
+        """删除最久未使用的帧，直到容量降到上限的90%（其他进程写入的文件也计入）"""
+        entries, self.total_bytes = self._scan()
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.total_bytes -= size
+            evicted += 1
+        print(f"帧缓存淘汰: {evicted} 项")
+
+    def _remove(self, key):
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+frame_store = FrameStore(
+    os.path.join(CACHE_DIR, 'frames'),
+    FRAME_STORE_MAX_MB * 1024 * 1024
+) if FRAME_STORE else None
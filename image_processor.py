@@ -1,224 +1,291 @@
 import os
-from PIL import Image, ImageFilter, ImageEnhance
+from PIL import Image
 import pyglet
 import threading
-from collections import OrderedDict
-from concurrent.futures import ThreadPoolExecutor
 from config import *  # 导入配置变量
+from render_core import (
+    RenderedFrame, render_sharpened, render_frame, render_thumbnail, render_bucket, render_preview, frame_cached
+)
+from render_pool import submit_shared_render
+from scheduler import job_scheduler, VISIBLE, PREFETCH
+from thumb_store import thumbnail_store
+from decode import fit_size, fits_window, DECODE_ERRORS, OVERSIZE_ERRORS
+from catalog import image_catalog
+from thumb_atlas import get_thumbnail_atlas
+from byte_cache import ByteLRU
+from profiler import profiler
 
-image_cache = OrderedDict()
+# (路径, 分辨率档位) -> 纹理，按纹理实际字节数限制容量，淘汰时释放显存
+image_cache = ByteLRU(TEXTURE_BUDGET_MB * 1024 * 1024, lambda key, img: _delete_texture(key, img))
 
-# 缩略图相关的全局变量
-thumbnail_cache = {}
-thumbnail_data_cache = {}
-thumbnail_executor = ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE)
-thumbnail_lock = threading.Lock()
-pending_thumbnail_tasks = []
+# 缩略图相关的全局变量，缓存按路径存放，与窗口尺寸和页面布局无关
+# thumbnail_cache: 路径 -> 图集精灵，按纹理字节数淘汰
+# thumbnail_data_cache: 路径 -> (路径, RGBA数据, 尺寸)，按数据字节数淘汰
+thumbnail_cache = ByteLRU(THUMBNAIL_TEXTURE_BUDGET_MB * 1024 * 1024,
+                          lambda path, sprite: release_thumbnail_sprite(sprite))
+thumbnail_data_cache = ByteLRU(THUMBNAIL_DATA_BUDGET_MB * 1024 * 1024)
+# 缩略图和幻灯片渲染任务都通过scheduler.job_scheduler按优先级执行
+# 取消任务会同步触发完成回调，回调中需要再次加锁，因此使用可重入锁
+thumbnail_lock = threading.RLock()
+# 本次运行中超出内存上限的图片，不再重复尝试；不写入图片目录，调大上限后重新启动即可显示
+oversized_images = set()
+
+def _render_in_process(img_path, window_width, window_height):
+    """多进程后端：调度线程等待子进程渲染完成，结果为SharedFrame"""
+    return submit_shared_render(img_path, window_width, window_height).result()
+
+def submit_render(img_path, window_width, window_height, priority=PREFETCH):
+    """提交后台渲染任务，Future结果为RenderedFrame；同一图片和尺寸的任务只执行一次，重复提交可提升优先级"""
+    render = _render_in_process if RENDER_BACKEND == 'process' else render_frame
+    return job_scheduler.submit(('render', img_path, window_width, window_height), priority,
+                                render, img_path, window_width, window_height)
+
+def reprioritize_render(img_path, window_width, window_height, priority):
+    """提升已提交的渲染任务的优先级，任务不存在（已完成或未提交）时不会重新提交"""
+    return job_scheduler.reprioritize(('render', img_path, window_width, window_height), priority)
+
+def upload_frame(frame):
+    """在主线程把渲染好的帧上传为纹理，上传后释放帧数据"""
+    with profiler.stage('render.upload'):
+        img = pyglet.image.ImageData(frame.width, frame.height, 'RGBA', frame.data)
+        texture = img.get_texture()
+    # 先解除ImageData对像素数据的引用，共享内存才能关闭
+    del img
+    frame.release()
+    return texture
 
 def apply_sharpening(img_path, window_width, window_height):
-    """应用锐化效果到图片（包含重采样优化版）"""
-    sharpened = None
-    img_data = None
-    resampled_img = None
-    
+    """应用锐化效果到图片（包含重采样优化版），同步渲染并上传纹理"""
     try:
-        # 使用上下文管理器确保PIL资源正确释放
-        with Image.open(img_path).convert('RGBA') as pil_img:
-            # 先进行重采样优化（使用LANCZOS算法）
-            # 计算缩放比例，保持图片原始宽高比
-            scale_x = window_width / pil_img.width
-            scale_y = window_height / pil_img.height
-            scale = min(scale_x, scale_y)
-            
-            new_width = int(pil_img.width * scale)
-            new_height = int(pil_img.height * scale)
-            
-            # 使用LANCZOS重采样算法进行高质量缩放，增加对比度，配置在config里
-            resampled_img = ImageEnhance.Contrast(pil_img.resize((new_width, new_height), Image.Resampling.LANCZOS)).enhance(IMAGE_ENHANCE)
-            
-            # 在重采样后的图片上应用锐化滤镜
-            sharpened = resampled_img.filter(ImageFilter.UnsharpMask(radius=1.5, percent=60, threshold=3))
-
-            # 立即释放resampled_img对象
-            resampled_img.close() if hasattr(resampled_img, 'close') else None
-            del resampled_img
-            resampled_img = None
-
-            # # 转换为RGBA模式（确保透明度支持）
-            # if sharpened.mode != 'RGBA':
-            #     sharpened = sharpened.convert('RGBA')
-            
-            # 垂直翻转图像适配pyglet坐标系
-            sharpened = sharpened.transpose(Image.FLIP_TOP_BOTTOM)
-            
-            # 获取图片尺寸（在获取字节数据前）
-            width, height = sharpened.size
-            
-            # 获取图片数据
-            img_data = sharpened.tobytes()
-            
-            # 立即释放PIL对象
-            sharpened.close() if hasattr(sharpened, 'close') else None
-            del sharpened
-            sharpened = None
-            
-            # 创建pyglet图像
-            img = pyglet.image.ImageData(width, height, 'RGBA', img_data)
-            
-            # 转换为纹理
-            if not isinstance(img, pyglet.image.Texture):
-                img = img.get_texture()
-            
-            # 清理字节数据
-            del img_data
-            img_data = None
-            
-            return img
+        return upload_frame(render_frame(img_path, window_width, window_height))
+    except OVERSIZE_ERRORS:
+        # 超出内存上限的大图不能退回全分辨率加载
+        raise
     except Exception as e:
         print(f"锐化图片失败: {img_path} - {e}")
-        
-        # 确保在异常情况下也能清理资源
-        if sharpened is not None:
-            sharpened.close() if hasattr(sharpened, 'close') else None
-            del sharpened
-            
-        if img_data is not None:
-            del img_data
-
-        if resampled_img is not None:
-            resampled_img.close() if hasattr(resampled_img, 'close') else None
-            del resampled_img
-        
         # 如果锐化失败，返回原始图片
         return pyglet.image.load(img_path)
 
-def clean_cache():
-    """清理图片缓存"""
-    while len(image_cache) > MAX_IMAGES:
-        oldest_path, oldest_img = image_cache.popitem(last=False)
+def record_decode_failure(path, error):
+    """记录解码失败：文件本身无法解码时写入图片目录，超出内存上限时只在本次运行中跳过"""
+    if isinstance(error, OVERSIZE_ERRORS):
+        oversized_images.add(path)
+    elif image_catalog is not None and isinstance(error, DECODE_ERRORS):
+        # 无法解码的文件记录到图片目录，下次扫描时跳过
+        image_catalog.mark_failed(path)
+
+def texture_bytes(img):
+    """纹理实际占用的显存字节数（RGBA8）"""
+    return img.width * img.height * 4
+
+def estimate_frame_bytes(path, window_width, window_height):
+    """根据图片目录中记录的尺寸估算渲染后的纹理字节数，未知时按整个窗口估算"""
+    dims = image_catalog.dimensions(path) if image_catalog is not None else None
+    if dims is None:
+        return window_width * window_height * 4
+    width, height = fit_size(dims[0], dims[1], window_width, window_height)
+    return width * height * 4
+
+def cached_texture(path, window_width, window_height):
+    """返回缓存中按此窗口尺寸渲染的纹理；同一档位下按其他尺寸渲染的纹理视为未命中"""
+    img = image_cache.get((path, render_bucket(window_width, window_height)))
+    if img is None or not fits_window(img.width, img.height, window_width, window_height):
+        return None
+    return img
+
+def _delete_texture(path, img):
+    """安全释放被淘汰图片的纹理资源"""
+    if hasattr(img, 'get_texture'):
+        texture = img.get_texture()
+        if texture:
+            texture.delete()
+
+def clean_cache(images=(), current_index=0, direction=1, bucket=None, keep=(), incoming_bytes=0):
+    """按纹理字节预算清理图片缓存，缓存键为 (路径, 分辨率档位)
+
+    保留当前档位下的上一张、当前和播放方向上接下来PREFETCH_COUNT张；超出预算时先淘汰
+    不在附近的图片，再淘汰其他档位的，然后是播放方向后方最远的，最后才淘汰前方最远的。
+    incoming_bytes为即将加入的纹理大小，用于在上传之前腾出空间。
+    """
+    budget = image_cache.budget_bytes - incoming_bytes
+    if image_cache.total_bytes <= budget:
+        return
+    # 当前位置附近图片相对播放方向的距离，负数表示在后方
+    rank = {}
+    total = len(images)
+    if total:
+        window = min(total, 32)
+        for k in sorted(range(-window, window + 1), key=abs):
+            rank.setdefault(images[(current_index + direction * k) % total], k)
+    protected = {(path, bucket) for path, k in rank.items() if -1 <= k <= PREFETCH_COUNT}
+    protected.update(keep)
+
+    def eviction_order(item):
+        lru_pos, (path, key_bucket) = item
+        if path not in rank:
+            return (0, lru_pos)
+        if key_bucket != bucket:
+            return (1, lru_pos)
+        k = rank[path]
+        return (2, k) if k < 0 else (3, -k)
+
+    candidates = [(pos, key) for pos, key in enumerate(image_cache) if key not in protected]
+    before = image_cache.total_bytes
+    evicted = 0
+    for _, key in sorted(candidates, key=eviction_order):
+        if image_cache.total_bytes <= budget:
+            break
         try:
-            # 安全释放纹理资源
-            if hasattr(oldest_img, 'get_texture'):
-                texture = oldest_img.get_texture()
-                if texture:
-                    texture.delete()
-                    print(f"清理GPU缓存完成")
-
-            # 解除所有引用
-            del oldest_img
-           
+            image_cache.discard(key)
+            evicted += 1
         except Exception as e:
             print(f"清理缓存时出错: {e}")
+    if evicted:
+        freed = before - image_cache.total_bytes
+        print(f"清理GPU缓存完成: 释放{evicted}张纹理, {freed / 2**20:.1f}MB")
 
 # 缩略图相关函数
 def generate_thumbnail_data(path):
-    """ 在后台线程中生成缩略图数据 """
+    """ 在后台线程中生成缩略图数据，优先读取磁盘缓存 """
+    if path in oversized_images:
+        return None
     try:
-        with Image.open(path) as img:
-            img.thumbnail(THUMBNAIL_SIZE)
-            # 垂直翻转图像适配pyglet坐标系
-            img = img.transpose(Image.FLIP_TOP_BOTTOM)
-            return path, img.convert("RGBA").tobytes(), img.size
+        if thumbnail_store is not None:
+            with profiler.stage('thumb.store_get'):
+                cached = thumbnail_store.get(path)
+            if cached is not None:
+                return cached
+        result = render_thumbnail(path)
+        if thumbnail_store is not None:
+            with profiler.stage('thumb.store_put'):
+                thumbnail_store.put(*result)
+        return result
     except Exception as e:
         print(f"生成缩略图失败: {e}")
+        record_decode_failure(path, e)
         return None
 
 def create_thumbnail_sprite_from_data(data):
-    """ 在主线程创建缩图精灵 """
+    """ 在主线程把缩略图上传到图集并创建批量绘制的精灵 """
     try:
         if not pyglet.gl.current_context:
             print("无OpenGL上下文，跳过创建精灵")
             return None
         path, image_data, size = data
-        image = pyglet.image.ImageData(size[0], size[1], 'RGBA', image_data)
-        sprite = pyglet.sprite.Sprite(image)
+        atlas = get_thumbnail_atlas()
+        region, slot = atlas.add(size[0], size[1], image_data)
+        sprite = pyglet.sprite.Sprite(region, batch=atlas.batch)
+        sprite.visible = False  # 由布局决定是否显示（预取行保持隐藏）
         sprite.path = path  # 保存路径用于点击检测
+        sprite.atlas_slot = slot  # 保存图集格子，清理时归还
         return sprite
     except Exception as e:
         print(f"创建精灵失败: {e}")
         return None
 
-def generate_thumbnail_page(images, start_index, window_width, window_height, ready_callback=None):
-    """ 生成缩略图页面（多线程版） """
+def release_thumbnail_sprite(sprite):
+    """归还缩略图占用的图集格子并删除精灵"""
+    slot = getattr(sprite, 'atlas_slot', None)
+    if slot is not None:
+        get_thumbnail_atlas().release(slot)
+        sprite.atlas_slot = None
+    sprite.delete()
+
+def generate_thumbnail_page(images, start_index, ready_callback=None):
+    """ 返回一页（THUMBNAIL_COLUMNS x THUMBNAIL_ROWS）缩略图精灵 """
+    return generate_thumbnail_range(images, start_index, THUMBNAIL_COLUMNS * THUMBNAIL_ROWS, ready_callback)
+
+def _thumbnail_key(path):
+    return ('thumb', path, THUMBNAIL_SIZE)
+
+def _submit_thumbnail(path, ready_callback, priority):
+    """提交缩略图任务；已在排队或执行中时不会重复提交，只按需提升优先级"""
+    return job_scheduler.submit(_thumbnail_key(path), priority, generate_thumbnail_data, path,
+                                on_done=ready_callback)
+
+def pending_thumbnail_tasks():
+    """排队或执行中的缩略图任务 {路径: Future}"""
+    return {key[1]: future for key, future in job_scheduler.pending('thumb').items()}
+
+def generate_thumbnail_range(images, start_index, count, ready_callback=None, prefetch_paths=()):
+    """ 返回可见范围内的缩略图精灵（多线程版），未完成的位置为None，数据到达后调用ready_callback
+
+    prefetch_paths为可见范围前后的预取行，同样生成并上传到图集（精灵保持隐藏），滚动到时可直接显示。
+    图集中只保留这两个范围的精灵，范围外的排队任务被取消；像素数据按预算淘汰，滚回时只需重新上传。
+    """
     total = len(images)
-    end_index = min(start_index + 10, total)
-    page_key = (start_index, window_width, window_height)
-    
+    end_index = min(start_index + count, total)
+    page_paths = images[start_index:end_index]
+    resident = set(page_paths)
+    resident.update(prefetch_paths)
+
+    with thumbnail_lock:
+        # 取消滚出范围且尚未开始的任务，快速滚动时不积压
+        job_scheduler.cancel_kind('thumb', keep=lambda key: key[1] in resident)
+
+        # 先释放滚出范围的图集精灵，为新进入范围的缩略图腾出格子
+        for path in [path for path in thumbnail_cache if path not in resident]:
+            thumbnail_cache.discard(path)
+
+        # 可见范围先提交，预取范围排在其后
+        sprites = [_resident_thumbnail(path, ready_callback, VISIBLE) for path in page_paths]
+        for path in prefetch_paths:
+            _resident_thumbnail(path, ready_callback, PREFETCH)
+
+        thumbnail_cache.trim(protected=resident)
+        thumbnail_data_cache.trim(protected=resident)
+        return sprites
+
+def _resident_thumbnail(path, ready_callback, priority):
+    """返回已在图集中的精灵；只有像素数据时上传到图集；都没有时提交后台任务并返回None"""
+    if path in thumbnail_cache:
+        thumbnail_cache.touch(path)
+        return thumbnail_cache[path]
+    if path in thumbnail_data_cache:
+        # 已有像素数据，只需上传到图集
+        thumbnail_data_cache.touch(path)
+        data = thumbnail_data_cache[path]
+        sprite = create_thumbnail_sprite_from_data(data)
+        if sprite:
+            thumbnail_cache.put(path, sprite, data[2][0] * data[2][1] * 4)
+        return sprite
+    _submit_thumbnail(path, ready_callback, priority)
+    return None
+
+def store_thumbnail_data(data):
+    """ 在主线程缓存后台生成的缩略图数据 """
+    path, image_data, size = data
+    thumbnail_data_cache.put(path, data, len(image_data))
+
+def draw_thumbnail_batch():
+    """ 一次性绘制图集中的所有缩略图 """
+    get_thumbnail_atlas().batch.draw()
+
+def forget_thumbnails(paths):
+    """删除指定图片的缩略图精灵、像素数据和排队任务（图片已被删除时调用）"""
     with thumbnail_lock:
-        if page_key in thumbnail_cache:
-            return thumbnail_cache[page_key]
-
-        # 创建有效的透明占位符
-        placeholder_img = pyglet.image.ImageData(1, 1, 'RGBA', b'\x00\x00\x00\x00')
-        sprites = []
-        for idx in range(start_index, end_index):
-            path = images[idx]
+        for path in paths:
+            job_scheduler.cancel(_thumbnail_key(path))
+            if path in thumbnail_cache:
+                thumbnail_cache.discard(path)
             if path in thumbnail_data_cache:
-                data = thumbnail_data_cache[path]
-                sprites.append(create_thumbnail_sprite_from_data(data))
-            else:
-                future = thumbnail_executor.submit(generate_thumbnail_data, path)
-                if ready_callback:
-                    future.add_done_callback(lambda f, idx=idx: ready_callback(f, start_index, idx))
-                pending_thumbnail_tasks.append(future)
-                # 创建临时占位精灵
-                placeholder = pyglet.sprite.Sprite(placeholder_img)
-                placeholder.width = THUMBNAIL_SIZE[0]
-                placeholder.height = THUMBNAIL_SIZE[1]
-                sprites.append(placeholder)
-
-        thumbnail_cache[page_key] = sprites
-        return thumbnail_cache[page_key]
+                thumbnail_data_cache.discard(path)
+
+def cancel_thumbnail_tasks():
+    """取消所有尚未开始的缩略图任务"""
+    job_scheduler.cancel_kind('thumb')
 
 def cleanup_thumbnails():
     """清理所有缩略图资源"""
     def do_cleanup():
+        if not pyglet.gl.current_context:  # 关键检查
+            print("OpenGL 上下文已销毁，跳过清理")
+            return
+        # 终止进行中的任务
+        cancel_thumbnail_tasks()
         with thumbnail_lock:
-            # print(f"DEBUG: 开始清理缩略图，缓存大小: {len(thumbnail_cache)}")
-            if not pyglet.gl.current_context:  # 关键检查
-                print("OpenGL 上下文已销毁，跳过清理")
-                return
-            # 终止进行中的任务
-            for task in pending_thumbnail_tasks:
-                if not task.done():
-                    task.cancel()
-            pending_thumbnail_tasks.clear()
-
-            # 清空数据缓存
-            thumbnail_data_cache.clear()
-
-            # 释放所有缩略图精灵
-            deleted_count = 0
-            for page in thumbnail_cache.values():
-                for sprite in page:
-                    try:
-                        
-                        if sprite is None:  # 跳过空精灵
-                            continue
-                        # 安全释放纹理资源
-                        if hasattr(sprite, 'image') and sprite.image is not None:
-                            # 检查是否存在get_texture方法
-                            if hasattr(sprite.image, 'get_texture'):
-                                texture = sprite.image.get_texture()
-                                if texture:
-                                    texture.delete()
-                                    print(f"删除缩略图 texture ")
-                            # 解除图像引用，使用这个会有NoneType错误输出，使用下面的delete方法可以避免
-                            sprite.image = None
-
-                        # 删除精灵本身
-                        # if hasattr(sprite, 'delete'):
-                        #     sprite.delete()
-                        #     deleted_count += 1
-                        #     print(f"删除缩略图 sprite : {deleted_count}")
-                            
-                    except AttributeError as e:
-                        if "'NoneType'" in str(e):  # 忽略None相关错误
-                            pass
-                    except Exception as e:
-                        print(f"安全清理失败: {str(e)[:50]}...")  # 截短错误信息
-                    
-            # 清空缓存
+            # 删除精灵并归还图集格子，图集纹理本身保留复用
             thumbnail_cache.clear()
+            thumbnail_data_cache.clear()
     
     return do_cleanup
@@ -1,160 +1,262 @@
+import time
+# 首图耗时从这里开始计算，包括下面各模块的导入
+_START = time.perf_counter()
 import os
 import sys
 import pyglet
 from pyglet.window import key, mouse
-from glob import glob
 import random
 from config import *      
 from utils import *      
 from slideshow import SlideShow  
+from scanner import FolderScanner
+from scheduler import job_scheduler
+from profiler import profiler, StartupTimer
+from memory_stats import MemoryHUD, memory_snapshot, print_memory, export_memory
 
 
-# 初始化窗口
-config = pyglet.gl.Config(
-    double_buffer=True,
-    sample_buffers=1,
-    samples=4
-)
-window = pyglet.window.Window(config=config, width=900, height=600, resizable=True, style="None", vsync=True)
-
-# 强制选择目录
-FOLDER = None
-while not FOLDER:
-    if os.path.exists(DEFAULT_FOLDER) and validate_folder(DEFAULT_FOLDER):
-        FOLDER = DEFAULT_FOLDER
-        print(f"使用默认图片目录: {DEFAULT_FOLDER}")
-    else:
-        print("正在弹出目录选择窗口...")
-        selected = choose_folder()
-        print("用户选择的目录:", selected)
-        if selected and validate_folder(selected):
-            FOLDER = selected
+def main():
+    startup = StartupTimer(_START, profiler)
+    startup.mark('imports')
+    # 初始化窗口
+    config = pyglet.gl.Config(
+        double_buffer=True,
+        sample_buffers=1,
+        samples=4
+    )
+    window = pyglet.window.Window(config=config, width=WINDOW_SIZE[0], height=WINDOW_SIZE[1], resizable=True, style="None", vsync=True)
+    startup.mark('window')
+
+    # 强制选择目录
+    FOLDER = None
+    while not FOLDER:
+        if os.path.exists(DEFAULT_FOLDER) and validate_folder(DEFAULT_FOLDER):
+            FOLDER = DEFAULT_FOLDER
+            print(f"使用默认图片目录: {DEFAULT_FOLDER}")
         else:
-            print("请选择包含图片的有效目录")
-
-# 加载图片
-images = [f for f in glob(os.path.join(FOLDER, '**/*.*'), recursive=True)
-          if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
-random.shuffle(images)
-
-if not images:
-    print("目录中未找到有效图片，程序退出")
-    exit(1)
-
-# 初始化 SlideShow
-slides = SlideShow(images, window)
-slides.current = slides.draw_sigle_pic(images[0])
-window.set_caption(os.path.basename(images[0]))
-
-@window.event
-def on_draw():
-    window.clear()
-    if slides.thumbnail_mode:
-        slides.draw_thumbnails()
-    elif slides.transitioning:
-        if slides.old_img:
-            slides.old_img.draw()
-        if slides.next_img:
-            slides.next_img.draw()
-    else:
+            print("正在弹出目录选择窗口...")
+            selected = choose_folder()
+            print("用户选择的目录:", selected)
+            if selected and validate_folder(selected):
+                FOLDER = selected
+            else:
+                print("请选择包含图片的有效目录")
+
+    # 先开始监听再扫描，扫描期间新增的文件不会遗漏（重复的路径由SlideShow去重）
+    watcher = None
+    if WATCH_FOLDER:
+        from watcher import create_watcher
+        watcher = create_watcher(FOLDER).start()
+
+    # 后台流式扫描，找到第一张图片即开始播放，其余图片边扫描边加入
+    scanner = FolderScanner(FOLDER).start()
+    if not scanner.wait_first():
+        print("目录中未找到有效图片，程序退出")
+        exit(1)
+    images = scanner.drain()
+    random.shuffle(images)
+    startup.mark('scan')
+
+    # 初始化 SlideShow，第一张图片尽快显示（快速预览或帧缓存），完整渲染和预渲染在后台进行
+    slides = SlideShow(images, window)
+    slides.current = slides.show_first(images[0])
+    slides.start_animation()
+    window.set_caption(os.path.basename(images[0]))
+    hud = MemoryHUD(slides, window)
+    startup.mark('first_image')
+
+    def ingest_scanned(dt):
+        """把扫描线程新发现的图片随机插入尚未播放的部分"""
+        # 先读完成标志再取结果：标志设置前发现的图片一定已在本次取到，之后才能停止轮询
+        done = scanner.done
+        new_paths = scanner.drain()
+        if new_paths:
+            slides.add_images(new_paths)
+        elif done:
+            pyglet.clock.unschedule(ingest_scanned)
+            print(f"目录扫描完成，共 {len(images)} 张图片")
+
+    pyglet.clock.schedule_interval(ingest_scanned, SCAN_INGEST_INTERVAL)
+
+    def apply_folder_changes(dt):
+        """按发生顺序应用目录监听事件，连续的同类事件合并处理"""
+        added, removed, trees = [], [], []
+        for kind, path in watcher.drain():
+            if kind == 'add':
+                if removed or trees:
+                    slides.remove_images(removed, trees)
+                    removed, trees = [], []
+                added.append(path)
+            else:
+                if added:
+                    slides.add_images(added)
+                    added = []
+                (trees if kind == 'remove_tree' else removed).append(path)
+        if added:
+            slides.add_images(added)
+        if removed or trees:
+            slides.remove_images(removed, trees)
+
+    if watcher is not None:
+        pyglet.clock.schedule_interval(apply_folder_changes, SCAN_INGEST_INTERVAL)
+
+    @window.event
+    def on_draw():
+        with profiler.stage('frame.on_draw', 'frame'):
+            window.clear()
+            if slides.thumbnail_mode:
+                slides.draw_thumbnails()
+            else:
+                # 幻灯片、过渡中的旧图和进度条都在同一个Batch中，显示与否由各自的visible控制
+                slides.batch.draw()
+            hud.draw()
+        if not startup.finished and slides.current is not None:
+            startup.finish('first_draw')
+
+    @window.event
+    def on_resize(width, height):
         if slides.current:
-            slides.current.draw()
-    if not slides.manual_mode and not slides.thumbnail_mode and images:
-        progress = (slides.current_index + 1) / len(images)
-        slides.update_progress(progress)
-        slides.progress_bg.draw()
-        slides.progress_fg.draw()
-
-@window.event
-def on_resize(width, height):
-    if slides.current:
-        slides.scale_to_fit(slides.current, width, height)
-        slides.center_sprite(slides.current, width, height)
-    if slides.next_img:
-        slides.scale_to_fit(slides.next_img, width, height)
-        slides.center_sprite(slides.next_img, width, height)
-    if slides.thumbnail_mode:
-        slides._cleanup_thumbnails()
-
-@window.event
-def on_key_press(symbol, modifiers):
-    if symbol in (key.ENTER, key.RETURN):
+            slides.scale_to_fit(slides.current, width, height)
+            slides.center_sprite(slides.current, width, height)
+        if slides.next_img:
+            slides.scale_to_fit(slides.next_img, width, height)
+            slides.center_sprite(slides.next_img, width, height)
+        # 先显示缩放后的旧纹理，尺寸稳定RESIZE_DEBOUNCE秒后再按新分辨率重新渲染
+        pyglet.clock.unschedule(slides.rerender_for_resize)
+        pyglet.clock.schedule_once(slides.rerender_for_resize, RESIZE_DEBOUNCE)
+        # 缩略图缓存与窗口尺寸无关，下一帧按新尺寸重新布局即可
+        slides.update_progress()
+
+    @window.event
+    def on_expose():
+        slides.timeline.invalidate()
+
+    @window.event
+    def on_mouse_scroll(x, y, scroll_x, scroll_y):
+        # 缩略图模式下滚轮逐行滚动，向上滚动显示前面的图片
         if slides.thumbnail_mode:
-            slides.exit_thumbnail_mode()
+            slides.scroll_thumbnails(-scroll_y * THUMBNAIL_SCROLL_STEP)
+
+    @window.event
+    def on_key_press(symbol, modifiers):
+        # 按键可能改变显示内容，处理完后重绘一帧
+        slides.timeline.invalidate()
+        if symbol == key.M:
+            hud.toggle()
+            return
+        if symbol in (key.ENTER, key.RETURN):
+            if slides.thumbnail_mode:
+                slides.exit_thumbnail_mode()
+            else:
+                slides.enter_thumbnail_mode()
+            return
+        if slides.thumbnail_mode:
+            # 上下键整页平滑滚动
+            if symbol == key.UP:
+                slides.scroll_thumbnails(-THUMBNAIL_ROWS, smooth=True)
+            elif symbol == key.DOWN:
+                slides.scroll_thumbnails(THUMBNAIL_ROWS, smooth=True)
         else:
-            slides.thumbnail_mode = True
-            slides.thumbnail_page = slides.current_index
-            slides.manual_mode = True
-        return
-    if slides.thumbnail_mode:
-        if symbol == key.UP:
-            if slides.thumbnail_page - 10 >= 0:
-                slides.thumbnail_page -= 10
-                slides._cleanup_thumbnails()
-        elif symbol == key.DOWN:
-            if slides.thumbnail_page + 10 < len(images):
-                slides.thumbnail_page += 10
-                slides._cleanup_thumbnails()
-    else:
-        if symbol == key.SPACE:
-            slides.manual_mode = False
-        elif symbol == key.RIGHT:
-            if slides.current_index < len(images) - 1:
-                slides.show_next_manual()
-        elif symbol == key.LEFT:
-            if slides.current_index > 0:
-                slides.show_prev_manual()
-         # 新增1键处理
-        elif symbol == key._1 and slides.manual_mode :
-            if images and 0 <= slides.current_index < len(images):
-                current_path = images[slides.current_index]
-                if os.path.exists(current_path):
-                    open_file_in_finder(current_path)
-                else:
-                    print(f"文件不存在: {current_path}")
-
-@window.event
-def on_close():
-    # 停止所有时钟事件
-    pyglet.clock.unschedule(update)
-    pyglet.clock.unschedule(slides.slide_left)
-    pyglet.clock.unschedule(slides.fade_out_old)
-    
-    # 清理缩略图资源,安全清空缓存
-    def safe_clear():
-        slides._cleanup_thumbnails()
-        from image_processor import image_cache, thumbnail_data_cache, thumbnail_cache
-        image_cache.clear()
-        thumbnail_data_cache.clear()
-        thumbnail_cache.clear()
-        # 强制垃圾回收
-        import gc
-        gc.collect()
-
-    pyglet.clock.schedule_once(safe_clear, 0)
-    
-    # 立即关闭窗口
-    window.close()
-    pyglet.app.exit()
-    return True  # 阻止默认关闭流程
-
-def update(dt):
-    if not slides.manual_mode and not slides.thumbnail_mode:
-        slides.load_next()
-        slides.transition(dt)
-        window.invalid = True
-
-pyglet.clock.schedule_interval(update, DURATION)
-
-# 如果启用了内存监控，每60秒打印一次内存使用情况
-from utils import PSUTIL_AVAILABLE, print_memory
-from image_processor import image_cache
-
-if MEMORY_MONITORING and PSUTIL_AVAILABLE:
-    def memory_monitor(dt):
-        debug_gc_collect("memory_monitor")
-        print_memory(slides, image_cache)
-    
-    pyglet.clock.schedule_interval(memory_monitor, 60)
-
-pyglet.app.run()
+            if symbol == key.SPACE:
+                slides.manual_mode = False
+                slides.update_progress()
+            elif symbol == key.RIGHT:
+                if slides.can_step(1):
+                    slides.show_next_manual()
+            elif symbol == key.LEFT:
+                if slides.can_step(-1):
+                    slides.show_prev_manual()
+             # 新增1键处理
+            elif symbol == key._1 and slides.manual_mode :
+                if images and 0 <= slides.current_index < len(images):
+                    current_path = images[slides.current_index]
+                    if os.path.exists(current_path):
+                        open_file_in_finder(current_path)
+                    else:
+                        print(f"文件不存在: {current_path}")
+
+    @window.event
+    def on_close():
+        # 停止所有时钟事件
+        pyglet.clock.unschedule(update)
+        pyglet.clock.unschedule(ingest_scanned)
+        scanner.stop()
+        if watcher is not None:
+            pyglet.clock.unschedule(apply_folder_changes)
+            watcher.stop()
+        slides.timeline.stop()
+        hud.stop()
+        slides.stop_animation()
+        pyglet.clock.unschedule(slides.rerender_for_resize)
+        slides.uploader.cancel_all()
+        slides.prefetcher.cancel_all()
+        job_scheduler.shutdown()
+        # 退出时才用到的模块在这里导入，不计入首图耗时
+        import render_pool
+        from thumb_store import thumbnail_store
+        from catalog import image_catalog
+        render_pool.shutdown()
+        if thumbnail_store is not None:
+            thumbnail_store.close()
+        if image_catalog is not None:
+            image_catalog.close()
+        profiler.export()
+        profiler.print_summary()
+        profiler.close()
+
+        # 清理缩略图资源,安全清空缓存
+        def safe_clear():
+            slides._cleanup_thumbnails()
+            from image_processor import image_cache, thumbnail_data_cache, thumbnail_cache
+            image_cache.clear()
+            thumbnail_data_cache.clear()
+            thumbnail_cache.clear()
+            # 强制垃圾回收
+            import gc
+            gc.collect()
+
+        pyglet.clock.schedule_once(safe_clear, 0)
+
+        # 立即关闭窗口
+        window.close()
+        pyglet.app.exit()
+        return True  # 阻止默认关闭流程
+
+    def update(dt):
+        if not slides.manual_mode and not slides.thumbnail_mode:
+            with profiler.stage('slide.change', 'frame'):
+                slides.load_next()
+                slides.transition(dt)
+
+    pyglet.clock.schedule_interval(update, DURATION)
+
+    # 如果启用了内存监控，定期打印内存统计并追加到JSON行日志
+    if MEMORY_MONITORING:
+        def memory_monitor(dt):
+            snapshot = memory_snapshot(slides)
+            print_memory(snapshot)
+            export_memory(snapshot)
+            slides.prefetcher.print_stats()
+            job_scheduler.print_stats()
+
+        pyglet.clock.schedule_interval(memory_monitor, MEMORY_LOG_INTERVAL)
+
+    # 性能分析开启时定期导出trace，进程异常退出也能保留数据
+    if profiler.enabled:
+        def export_profile(dt):
+            profiler.export()
+            profiler.print_summary()
+
+        pyglet.clock.schedule_interval(export_profile, PROFILE_EXPORT_INTERVAL)
+
+    # 不按固定帧率重绘：动画期间由时间线驱动，其余时间只在画面失效时重绘
+    slides.update_progress()
+    pyglet.app.run(interval=None)
+
+if __name__ == '__main__':
+    # 多进程渲染后端使用spawn，子进程导入本模块时不能重复创建窗口
+    # freeze_support只对打包的可执行文件有效，multiprocessing导入约10ms，普通运行时不导入
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,136 @@
+# 内存记账：汇总各缓存和后台任务持有的实际字节数，用于控制台输出、屏幕统计(HUD)和JSON行导出
+# 各项数据来自缓存自身维护的字节统计（put/discard时更新），采样时不遍历像素数据，可长期开启
+import os
+import json
+import time
+import pyglet
+from config import *
+from utils import current_process
+from image_processor import image_cache, thumbnail_cache, thumbnail_data_cache
+from thumb_atlas import thumbnail_atlas_bytes
+from scheduler import job_scheduler
+from decode import decode_gate
+from slideshow import set_if_changed
+
+_MB = 1024 * 1024
+
+# (键, 显示名称)，HUD和控制台按此顺序输出
+CATEGORIES = (
+    ('textures', '幻灯片纹理'),
+    ('thumbnail_textures', '缩略图图集'),
+    ('thumbnail_data', '缩略图数据'),
+    ('uploads', '上传中'),
+    ('prefetched', '预渲染帧'),
+    ('animation', '动图帧'),
+    ('decoding', '解码准入(估算)'),
+)
+
+def memory_snapshot(slides):
+    """采集一次内存统计，各类别为 {'bytes': 字节数, 'count': 数量, ...}，需在主线程调用"""
+    upload_textures, upload_buffers, uploads = slides.uploader.memory()
+    prefetched_bytes, prefetched, rendering = slides.prefetcher.memory()
+    queue = job_scheduler.metrics()
+    snapshot = {
+        'time': time.time(),
+        'textures': {'bytes': image_cache.total_bytes, 'count': len(image_cache),
+                     'budget': image_cache.budget_bytes},
+        # 图集按整张纹理分配显存，used为其中缩略图实际占用的部分
+        'thumbnail_textures': {'bytes': thumbnail_atlas_bytes(), 'count': len(thumbnail_cache),
+                               'used': thumbnail_cache.total_bytes},
+        'thumbnail_data': {'bytes': thumbnail_data_cache.total_bytes, 'count': len(thumbnail_data_cache),
+                           'budget': thumbnail_data_cache.budget_bytes},
+        'uploads': {'bytes': upload_textures + upload_buffers, 'count': uploads},
+        'prefetched': {'bytes': prefetched_bytes, 'count': prefetched, 'pending': rendering},
+        'animation': {'bytes': slides.animation.memory_bytes() if slides.animation is not None else 0,
+                      'count': 1 if slides.animation is not None else 0},
+        # 只是decode_gate按文件头估算的解码峰值，不是实际测量值；
+        # 不含缩放、增强过程中的临时数据，渲染完成后的帧计入prefetched/uploads；
+        # count是已准入、尚未解码完成的任务数（多进程后端时包括子进程），排队等待准入的不计入
+        'decoding': {'bytes': decode_gate.in_use, 'count': decode_gate.active},
+        'jobs': {'queued': sum(queue['queued'].values()), 'running': queue['running']},
+    }
+    snapshot['tracked_bytes'] = sum(snapshot[key]['bytes'] for key, _ in CATEGORIES)
+    process = current_process()
+    if process is not None:
+        import psutil
+        snapshot['rss_bytes'] = process.memory_info().rss
+        snapshot['available_bytes'] = psutil.virtual_memory().available
+    return snapshot
+
+def format_snapshot(snapshot):
+    """格式化为多行文本，HUD和控制台共用"""
+    lines = []
+    if 'rss_bytes' in snapshot:
+        lines.append(f"进程内存: {snapshot['rss_bytes'] / _MB:.1f} MB | "
+                     f"系统可用: {snapshot['available_bytes'] / _MB:.0f} MB")
+    lines.append(f"已记账: {snapshot['tracked_bytes'] / _MB:.1f} MB")
+    for key, label in CATEGORIES:
+        item = snapshot[key]
+        line = f"{label}: {item['bytes'] / _MB:.1f} MB ({item['count']})"
+        if 'budget' in item:
+            line += f" / {item['budget'] / _MB:.0f} MB"
+        if 'used' in item:
+            line += f" 已用 {item['used'] / _MB:.1f} MB"
+        if 'pending' in item:
+            line += f" 渲染中 {item['pending']}"
+        lines.append(line)
+    jobs = snapshot['jobs']
+    lines.append(f"任务: 排队 {jobs['queued']} | 执行中 {jobs['running']}")
+    return lines
+
+def print_memory(snapshot):
+    print("=== 内存使用情况 ===")
+    for line in format_snapshot(snapshot):
+        print(line)
+
+def export_memory(snapshot, path=MEMORY_LOG, max_bytes=MEMORY_LOG_MAX_MB * _MB):
+    """以JSON行追加到日志文件，每次采样一行；超过max_bytes时轮转为 path.1"""
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if max_bytes and os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+            os.replace(path, path + '.1')
+        with open(path, 'a') as f:
+            f.write(json.dumps(snapshot, ensure_ascii=False) + '\n')
+    except OSError as e:
+        print(f"导出内存统计失败: {e}")
+
+class MemoryHUD:
+    """左上角的内存统计，显示时每MEMORY_HUD_INTERVAL秒刷新一次，隐藏时不采样"""
+
+    def __init__(self, slides, window):
+        self.slides = slides
+        self.window = window
+        self.visible = False
+        self.batch = pyglet.graphics.Batch()
+        self.label = None  # 第一次显示时创建
+
+    def toggle(self):
+        self.visible = not self.visible
+        if self.visible:
+            if self.label is None:
+                self.label = pyglet.text.Label('', font_size=11, multiline=True, width=420,
+                                               anchor_y='top', color=(255, 255, 255, 230), batch=self.batch)
+            self.update()
+            pyglet.clock.schedule_interval(self.update, MEMORY_HUD_INTERVAL)
+        else:
+            pyglet.clock.unschedule(self.update)
+        self.slides.timeline.invalidate()
+
+    def update(self, dt=0):
+        text = '\n'.join(format_snapshot(memory_snapshot(self.slides)))
+        if self.label.text != text:
+            # 只有数值变化时才重绘，静止画面不因HUD持续刷新
+            self.label.text = text
+            self.slides.timeline.invalidate()
+
+    def draw(self):
+        if self.visible:
+            # 窗口尺寸变化后保持在左上角
+            set_if_changed(self.label, 'x', 10)
+            set_if_changed(self.label, 'y', self.window.height - 10)
+            self.batch.draw()
+
+    def stop(self):
+        pyglet.clock.unschedule(self.update)
@@ -1 +1,6 @@
-pyinstaller --onefile --windowed --name view --icon=view.png main.py
+# --onedir 启动时不需要先把整个程序解压到临时目录（--onefile 每次启动都要解压），--windowed 在macOS上仍打包为单个 view.app
+# 排除查看器用不到的模块；numpy只用于可选的NumPy增强引擎(ENHANCE_ENGINE = 'numpy')，需要时去掉对应的 --exclude-module
+pyinstaller --onedir --windowed --noupx --name view --icon=view.png \
+    --exclude-module numpy --exclude-module tkinter --exclude-module unittest \
+    --exclude-module pydoc --exclude-module doctest --exclude-module bench \
+    main.py
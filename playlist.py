@@ -0,0 +1,47 @@
+# 播放列表的增删：只处理普通列表和位置，供幻灯片在扫描、目录监听产生变化时调用
+# 当前显示的图片被删除后仍在屏幕上，此时它已不在列表中（脱离）：
+# detached为1表示它原来位于 images[index] 之前，为-1表示位于之后，为0表示正常显示 images[index]
+import random
+
+def step_target(index, step, detached=0):
+    """从index按step（1或-1）移动后的位置（不取模）；已脱离时朝原位置方向移动一步正好落在相邻的图片上"""
+    return index if step == detached else index + step
+
+def insert_unplayed(images, paths, start):
+    """把paths随机插入 images[start:]，原有图片的相对顺序不变（原地修改）"""
+    tail = images[start:]
+    slots = sorted(random.randint(0, len(tail)) for _ in paths)
+    paths = list(paths)
+    random.shuffle(paths)
+    merged = []
+    prev = 0
+    for slot, path in zip(slots, paths):
+        merged.extend(tail[prev:slot])
+        merged.append(path)
+        prev = slot
+    merged.extend(tail[prev:])
+    images[start:] = merged
+
+def remove_paths(images, removed, index, page, detached=0):
+    """从列表中删除removed中的路径（原地修改），返回调整后的 (当前位置, 缩略图页, detached)
+
+    当前图片被删除时位置指向原来的后一张（detached=1），删除的是最后一张时指向原来的前一张（detached=-1），
+    这样下一张、上一张都正好是原来的相邻图片，也不会从开头绕到末尾。
+    """
+    displayed_removed = bool(detached) or (0 <= index < len(images) and images[index] in removed)
+    # 显示的图片不在列表中时，以它原来的后一张为准
+    anchor = index + 1 if displayed_removed and detached != 1 else index
+    before_anchor = sum(1 for path in images[:anchor] if path in removed)
+    before_page = sum(1 for path in images[:page] if path in removed)
+    images[:] = [path for path in images if path not in removed]
+
+    total = len(images)
+    page = min(max(0, page - before_page), max(0, total - 1))
+    if not total:
+        return 0, page, 0
+    index = anchor - before_anchor
+    if not displayed_removed:
+        return min(index, total - 1), page, 0
+    if index < total:
+        return index, page, 1
+    return total - 1, page, -1
@@ -0,0 +1,130 @@
+import threading
+from collections import OrderedDict
+from config import *
+from image_processor import cached_texture, submit_render, reprioritize_render, estimate_frame_bytes
+from scheduler import VISIBLE, NEXT, PREFETCH
+from render_pool import release_unused_result
+
+class Prefetcher:
+    """按播放方向在后台预渲染接下来的图片，切换时主线程只需上传纹理"""
+
+    def __init__(self, count=PREFETCH_COUNT):
+        self.count = count
+        self.pending = OrderedDict()  # (path, width, height) -> future
+        self.lock = threading.Lock()
+        # 命中：已渲染完成；迟到：已提交但尚未完成；未命中：没有预渲染
+        # 流式：切换前已在后台取走并分块上传
+        self.stats = {'hit': 0, 'late': 0, 'miss': 0, 'streamed': 0}
+
+    def request(self, path, width, height):
+        """单独提交一张图片的渲染（如窗口尺寸变化后重新渲染当前图片），返回Future"""
+        key = (path, width, height)
+        with self.lock:
+            if key not in self.pending:
+                self.pending[key] = submit_render(*key, priority=VISIBLE)
+            return self.pending[key]
+
+    def upcoming(self, images, current_index, direction, width, height):
+        """返回按播放方向即将显示的图片路径，总估算字节数不超过PREFETCH_BUDGET_MB（至少一张）"""
+        total = len(images)
+        if total <= 1:
+            return []
+        paths = []
+        budget = PREFETCH_BUDGET_MB * 1024 * 1024
+        for step in range(1, min(self.count, total - 1) + 1):
+            path = images[(current_index + direction * step) % total]
+            if path in paths:
+                continue
+            budget -= estimate_frame_bytes(path, width, height)
+            if paths and budget < 0:
+                break
+            paths.append(path)
+        return paths
+
+    def schedule(self, images, current_index, direction, width, height, on_done=None):
+        """提交接下来N张图片的渲染任务，并取消不再需要的任务
+
+        on_done(key, future)在新提交的任务结束（含取消）时于工作线程中调用。
+        """
+        wanted = [(path, width, height)
+                  for path in self.upcoming(images, current_index, direction, width, height)
+                  if cached_texture(path, width, height) is None]
+        with self.lock:
+            for key in list(self.pending):
+                if key not in wanted:
+                    self._discard(self.pending.pop(key))
+            for step, key in enumerate(wanted):
+                # 紧接着的一张优先于更远的预渲染；已提交的任务在位置变化后按新顺序调整优先级
+                priority = NEXT if step == 0 else PREFETCH
+                if key not in self.pending:
+                    self.pending[key] = submit_render(*key, priority=priority)
+                    if on_done is not None:
+                        self.pending[key].add_done_callback(lambda f, key=key: on_done(key, f))
+                else:
+                    reprioritize_render(*key, priority)
+
+    def _discard(self, future):
+        """取消任务；已在运行或已完成的任务在结束后释放结果"""
+        if not future.cancel():
+            release_unused_result(future)
+
+    def take(self, path, width, height):
+        """取出预渲染结果：命中直接返回，迟到则等待剩余时间，未命中返回None"""
+        with self.lock:
+            future = self.pending.pop((path, width, height), None)
+        if future is None or future.cancelled():
+            self.stats['miss'] += 1
+            return None
+        if future.done():
+            self.stats['hit'] += 1
+        else:
+            self.stats['late'] += 1
+            # 主线程正在等待，提升为最高优先级
+            reprioritize_render(path, width, height, VISIBLE)
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"预渲染失败: {path} - {e}")
+            return None
+
+    def claim(self, path, width, height):
+        """取出已完成的预渲染结果用于后台上传，不等待；未完成或已取消时返回None"""
+        key = (path, width, height)
+        with self.lock:
+            future = self.pending.get(key)
+            if future is None or not future.done() or future.cancelled():
+                return None
+            del self.pending[key]
+        try:
+            frame = future.result()
+        except Exception as e:
+            print(f"预渲染失败: {path} - {e}")
+            return None
+        self.stats['streamed'] += 1
+        return frame
+
+    def memory(self):
+        """已完成但尚未取走的预渲染帧 (字节数, 帧数) 和仍在排队或渲染中的任务数"""
+        ready_bytes = ready = waiting = 0
+        with self.lock:
+            futures = list(self.pending.values())
+        for future in futures:
+            if not future.done():
+                waiting += 1
+            elif not future.cancelled() and future.exception() is None:
+                frame = future.result()
+                if frame.data is not None:
+                    ready_bytes += frame.width * frame.height * 4
+                    ready += 1
+        return ready_bytes, ready, waiting
+
+    def cancel_all(self):
+        """取消所有尚未开始的预渲染任务"""
+        with self.lock:
+            for future in self.pending.values():
+                self._discard(future)
+            self.pending.clear()
+
+    def print_stats(self):
+        print(f"预渲染 命中: {self.stats['hit']} | 迟到: {self.stats['late']} | 未命中: {self.stats['miss']} | "
+              f"流式上传: {self.stats['streamed']}")
@@ -0,0 +1,147 @@
+# 可选的性能分析器：记录帧耗时、渲染各阶段耗时和GC暂停，导出Chrome trace并统计分位数
+# 通过 config.PROFILING 或环境变量 PICVIEW_PROFILE=1 开启；关闭时stage()几乎没有开销
+import gc
+import os
+import math
+import json
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import nullcontext
+from config import *
+
+_NULL_STAGE = nullcontext()
+
+def percentile(sorted_values, pct):
+    """已排序数据的分位数（最近秩法）"""
+    if not sorted_values:
+        return 0.0
+    # 最近秩：第 ceil(pct/100 * n) 个值
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'cat', 'start')
+
+    def __init__(self, profiler, name, cat):
+        self.profiler = profiler
+        self.name = name
+        self.cat = cat
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter(), self.cat)
+        return False
+
+class Profiler:
+    """线程安全的耗时记录器，事件和样本数量有上限，可长期在生产环境开启"""
+
+    def __init__(self, enabled=PROFILING, max_events=PROFILE_MAX_EVENTS):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.events = deque(maxlen=max_events)
+        self.samples = defaultdict(lambda: deque(maxlen=max_events))
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self._gc_start = {}
+        if enabled:
+            # 通过gc回调记录暂停时间，而不是主动触发回收
+            gc.callbacks.append(self._on_gc)
+
+    def stage(self, name, cat='stage'):
+        """计时上下文：with profiler.stage('decode'): ..."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, cat)
+
+    def record(self, name, start, end, cat='stage'):
+        duration = end - start
+        event = {
+            'name': name, 'cat': cat, 'ph': 'X', 'pid': self.pid,
+            'tid': threading.get_ident(),
+            'ts': (start - self.origin) * 1e6, 'dur': duration * 1e6,
+        }
+        with self.lock:
+            self.events.append(event)
+            self.samples[name].append(duration * 1000)
+
+    def _on_gc(self, phase, info):
+        tid = threading.get_ident()
+        if phase == 'start':
+            self._gc_start[tid] = time.perf_counter()
+        else:
+            start = self._gc_start.pop(tid, None)
+            if start is not None:
+                self.record(f"gc.gen{info['generation']}", start, time.perf_counter(), 'gc')
+
+    def summary(self):
+        """返回 {名称: (次数, p50, p95, p99, 最大值)}，单位毫秒"""
+        with self.lock:
+            snapshot = {name: sorted(values) for name, values in self.samples.items()}
+        return {name: (len(values), percentile(values, 50), percentile(values, 95),
+                       percentile(values, 99), values[-1])
+                for name, values in snapshot.items() if values}
+
+    def print_summary(self):
+        if not self.enabled:
+            return
+        print(f"=== 性能统计 (ms) ===")
+        print(f"{'阶段':<24}{'次数':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for name, (count, p50, p95, p99, peak) in sorted(self.summary().items()):
+            print(f"{name:<24}{count:>8}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}{peak:>10.2f}")
+
+    def export(self, path=PROFILE_OUTPUT):
+        """导出Chrome trace格式(chrome://tracing 或 Perfetto 打开)，同时附带分位数统计"""
+        if not self.enabled:
+            return
+        with self.lock:
+            events = list(self.events)
+        summary = {name: dict(zip(('count', 'p50', 'p95', 'p99', 'max'), values))
+                   for name, values in self.summary().items()}
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'summary': summary}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"导出性能数据失败: {e}")
+
+    def close(self):
+        if self.enabled and self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+
+class StartupTimer:
+    """启动耗时：按阶段记录从origin到第一张图片显示的时间，第一帧绘制后打印一次
+
+    origin为main.py开始执行的时刻，不含解释器启动和PyInstaller解压的时间。
+    """
+
+    def __init__(self, origin, profiler=None):
+        self.origin = origin
+        self.profiler = profiler
+        self.last = origin
+        self.phases = []  # [(阶段, 耗时秒)]
+        self.finished = False
+
+    def mark(self, phase):
+        """结束一个阶段，耗时从上一个阶段结束时算起"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        if self.profiler is not None and self.profiler.enabled:
+            self.profiler.record(f"startup.{phase}", self.last, now, 'startup')
+        self.last = now
+
+    def finish(self, phase='first_draw'):
+        """第一张图片绘制完成，打印首图耗时及各阶段明细；之后的调用被忽略"""
+        if self.finished:
+            return
+        self.mark(phase)
+        self.finished = True
+        total = (self.last - self.origin) * 1000
+        phases = ' | '.join(f"{name}: {seconds * 1000:.0f}" for name, seconds in self.phases)
+        print(f"首图耗时: {total:.0f} ms ({phases})")
+
+profiler = Profiler()
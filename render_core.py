@@ -0,0 +1,169 @@
+# 不依赖pyglet/OpenGL的渲染核心，可在线程池或子进程中运行
+import ctypes
+from PIL import Image, ImageFilter, ImageEnhance
+from config import *
+from decode import open_reduced, output_size, as_rgba
+from profiler import profiler
+from frame_store import frame_store, frame_key, HEADER_SIZE
+
+# NumPy导入较慢，只在选用NumPy增强引擎时才导入
+if ENHANCE_ENGINE == 'numpy':
+    from enhance_numpy import NUMPY_AVAILABLE, enhance
+else:
+    NUMPY_AVAILABLE = False
+
+# USM锐化参数 (radius, percent, threshold)，两种增强引擎共用
+UNSHARP = (1.5, 60, 3)
+
+if ENHANCE_ENGINE == 'numpy' and not NUMPY_AVAILABLE:
+    print("警告: numpy未安装，使用PIL增强引擎")
+
+# 影响渲染结果的参数，作为帧缓存键的一部分
+_ENGINE = 'numpy' if ENHANCE_ENGINE == 'numpy' and NUMPY_AVAILABLE else 'pil'
+ENHANCE_SETTINGS = f"{_ENGINE}|{IMAGE_ENHANCE}|{UNSHARP}|{DECODE_OVERSAMPLE}"
+
+class RenderedFrame:
+    """后台渲染完成的帧（已垂直翻转的RGBA数据），上传纹理前不涉及OpenGL"""
+    __slots__ = ('path', 'width', 'height', 'data')
+
+    def __init__(self, path, width, height, data):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.data = data
+
+    def release(self):
+        """纹理上传后释放像素数据"""
+        self.data = None
+
+class MappedFrame(RenderedFrame):
+    """像素数据直接映射自帧缓存文件，data是引用映射内存的ctypes数组"""
+    __slots__ = ('_mmap',)
+
+    def __init__(self, path, width, height, mm):
+        self._mmap = mm
+        size = width * height * 4
+        super().__init__(path, width, height, (ctypes.c_ubyte * size).from_buffer(mm, HEADER_SIZE))
+
+    def release(self):
+        """上传纹理后解除映射"""
+        if self._mmap is None:
+            return
+        self.data = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 仍有对象引用这块内存时无法关闭，由GC回收
+            pass
+        self._mmap = None
+
+def render_bucket(window_width, window_height):
+    """纹理缓存的分辨率档位：窗口尺寸向上取整到RESIZE_BUCKET_STEP的倍数
+
+    只用作缓存键，渲染始终按实际窗口尺寸进行，纹理与窗口1:1显示。
+    """
+    step = max(1, RESIZE_BUCKET_STEP)
+    return (-(-window_width // step) * step, -(-window_height // step) * step)
+
+def render_thumbnail(path):
+    """解码并缩小为缩略图，返回 (路径, 已翻转的RGBA数据, 尺寸)，不读写磁盘缓存"""
+    with profiler.stage('thumb.decode'):
+        src = open_reduced(path, *THUMBNAIL_SIZE)
+    with src:
+        with profiler.stage('thumb.resize'):
+            src.thumbnail(THUMBNAIL_SIZE)
+        # 缩小后再转换为RGBA
+        with as_rgba(src) as img:
+            # 倒序行输出即垂直翻转，适配pyglet坐标系，无需额外transpose
+            with profiler.stage('thumb.tobytes'):
+                data = img.tobytes('raw', 'RGBA', 0, -1)
+            return path, data, img.size
+
+def frame_cached(img_path, window_width, window_height):
+    """帧缓存中是否已有该图片在此尺寸下的最终渲染结果"""
+    return frame_store is not None and frame_store.contains(
+        frame_key(img_path, window_width, window_height, ENHANCE_SETTINGS))
+
+def render_preview(img_path, window_width, window_height):
+    """快速预览帧：按目标尺寸降分辨率解码（不超采样），双线性缩放，不做对比度和锐化
+
+    尺寸与完整渲染结果相同，启动时先显示预览，完整渲染完成后直接替换纹理。
+    """
+    with profiler.stage('render.preview'):
+        with open_reduced(img_path, window_width, window_height, oversample=1) as img:
+            width, height = output_size(img, window_width, window_height)
+            resized = img.resize((width, height), Image.Resampling.BILINEAR)
+        with as_rgba(resized) as resized:
+            return RenderedFrame(img_path, width, height, resized.tobytes('raw', 'RGBA', 0, -1))
+
+def render_frame(img_path, window_width, window_height):
+    """优先从帧缓存映射渲染结果，未命中时完整渲染并写入缓存"""
+    if frame_store is None:
+        return render_sharpened(img_path, window_width, window_height)
+    key = frame_key(img_path, window_width, window_height, ENHANCE_SETTINGS)
+    with profiler.stage('render.frame_store_get'):
+        cached = frame_store.get(key)
+    if cached is not None:
+        return MappedFrame(img_path, *cached)
+    frame = render_sharpened(img_path, window_width, window_height)
+    with profiler.stage('render.frame_store_put'):
+        frame_store.put(key, frame.width, frame.height, frame.data)
+    return frame
+
+def render_sharpened(img_path, window_width, window_height):
+    """在后台线程中完成锐化渲染（重采样、对比度、锐化、翻转），返回RenderedFrame"""
+    sharpened = None
+    resampled_img = None
+
+    try:
+        # 解码阶段先缩小到窗口尺寸附近，缩放和增强之后再转换为RGBA
+        with profiler.stage('render.decode'):
+            pil_img = open_reduced(img_path, window_width, window_height)
+        # 使用上下文管理器确保PIL资源正确释放
+        with pil_img:
+            # 先进行重采样优化（使用LANCZOS算法）
+            # 按原图尺寸计算缩放结果，与预览帧、缓存估算的尺寸一致
+            new_width, new_height = output_size(pil_img, window_width, window_height)
+            
+            # 使用LANCZOS重采样算法进行高质量缩放
+            with profiler.stage('render.resize'):
+                resized = pil_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+
+            if ENHANCE_ENGINE == 'numpy' and NUMPY_AVAILABLE:
+                # 对比度、锐化、RGBA转换和翻转一次完成，输出直接用于纹理上传
+                with profiler.stage('render.enhance_numpy'):
+                    width, height, img_data = enhance(resized, IMAGE_ENHANCE, *UNSHARP)
+                resized.close()
+                return RenderedFrame(img_path, width, height, img_data)
+
+            # 增加对比度，配置在config里
+            with profiler.stage('render.contrast'):
+                resampled_img = ImageEnhance.Contrast(resized).enhance(IMAGE_ENHANCE)
+            resized.close()
+            
+            # 在重采样后的图片上应用锐化滤镜
+            with profiler.stage('render.unsharp'):
+                sharpened = resampled_img.filter(ImageFilter.UnsharpMask(*UNSHARP))
+
+            # 立即释放resampled_img对象
+            resampled_img.close()
+            resampled_img = None
+
+            # RGB/L图像在增强之后才转换为RGBA，对比度和锐化少处理一个通道
+            sharpened = as_rgba(sharpened)
+
+            # 获取图片尺寸和字节数据，随后立即释放PIL对象
+            # 以倒序行输出(orientation=-1)直接得到适配pyglet坐标系的翻转数据，省去一次transpose整帧复制
+            width, height = sharpened.size
+            with profiler.stage('render.tobytes'):
+                img_data = sharpened.tobytes('raw', 'RGBA', 0, -1)
+            sharpened.close()
+            sharpened = None
+
+            return RenderedFrame(img_path, width, height, img_data)
+    finally:
+        # 确保在异常情况下也能清理资源
+        if sharpened is not None:
+            sharpened.close()
+        if resampled_img is not None:
+            resampled_img.close()
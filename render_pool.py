@@ -0,0 +1,115 @@
+# 可选的多进程渲染后端：对比度和锐化滤镜长时间持有GIL，线程池无法利用多核
+# 子进程把最终的RGBA数据写入共享内存，主进程直接从共享内存构建纹理，不经过pickle复制
+# 进程池和共享内存相关模块只在启用多进程后端时导入，默认的线程后端启动时不加载
+import ctypes
+from concurrent.futures import Future
+from config import *
+from render_core import RenderedFrame, render_frame
+from decode import decode_gate
+
+_process_executor = None
+
+def _init_worker(cond, counter):
+    """子进程与主进程共用解码内存预算，所有进程同时解码的估算总和不超过DECODE_MEMORY_BUDGET_MB"""
+    decode_gate.attach(cond, counter)
+
+def _render_to_shm(img_path, window_width, window_height):
+    """子进程中渲染图片并写入共享内存，只返回共享内存名称和尺寸"""
+    frame = render_frame(img_path, window_width, window_height)
+    from multiprocessing import shared_memory
+    size = len(frame.data)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        # 帧数据可能是bytes或ctypes数组（NumPy引擎），统一用memmove复制
+        target = (ctypes.c_ubyte * size).from_buffer(shm.buf)
+        ctypes.memmove(target, frame.data, size)
+        del target
+        return shm.name, img_path, frame.width, frame.height
+    finally:
+        frame.release()
+        shm.close()
+
+class SharedFrame(RenderedFrame):
+    """像素数据位于共享内存中的帧，data是直接映射共享内存的ctypes数组"""
+    __slots__ = ('_shm',)
+
+    def __init__(self, shm_name, path, width, height):
+        from multiprocessing import shared_memory
+        self._shm = shared_memory.SharedMemory(name=shm_name)
+        size = width * height * 4
+        super().__init__(path, width, height, (ctypes.c_ubyte * size).from_buffer(self._shm.buf))
+
+    def release(self):
+        """上传纹理后关闭并删除共享内存"""
+        if self._shm is None:
+            return
+        self.data = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # 仍有对象引用这块内存时无法关闭映射，删除名称后由GC回收
+            pass
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+        self._shm = None
+
+class _SharedFrameFuture(Future):
+    """把子进程返回的共享内存名称转换为SharedFrame的Future，取消时同时取消子进程任务"""
+
+    def __init__(self, inner):
+        super().__init__()
+        self._inner = inner
+        inner.add_done_callback(self._on_inner_done)
+
+    def cancel(self):
+        # 子进程任务取消成功时会回调_on_inner_done，再取消本Future
+        return self._inner.cancel()
+
+    def _on_inner_done(self, inner):
+        if inner.cancelled():
+            super().cancel()
+            self.set_running_or_notify_cancel()
+            return
+        if not self.set_running_or_notify_cancel():
+            return
+        exc = inner.exception()
+        if exc is not None:
+            self.set_exception(exc)
+            return
+        try:
+            self.set_result(SharedFrame(*inner.result()))
+        except Exception as e:
+            self.set_exception(e)
+
+def get_process_executor():
+    """懒加载进程池，只有启用多进程后端时才创建"""
+    global _process_executor
+    if _process_executor is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # 统一使用spawn，避免在已初始化OpenGL的进程中fork
+        ctx = multiprocessing.get_context('spawn')
+        _process_executor = ProcessPoolExecutor(max_workers=PROCESS_POOL_SIZE, mp_context=ctx,
+                                                initializer=_init_worker, initargs=decode_gate.share(ctx))
+    return _process_executor
+
+def submit_shared_render(img_path, window_width, window_height):
+    """提交多进程渲染任务，返回结果为SharedFrame的Future"""
+    inner = get_process_executor().submit(_render_to_shm, img_path, window_width, window_height)
+    return _SharedFrameFuture(inner)
+
+def release_unused_result(future):
+    """丢弃的任务完成后释放其结果占用的内存（共享内存需要显式删除）"""
+    def _release(f):
+        if f.cancelled() or f.exception() is not None:
+            return
+        f.result().release()
+    future.add_done_callback(_release)
+
+def shutdown():
+    global _process_executor
+    if _process_executor is not None:
+        _process_executor.shutdown(wait=False, cancel_futures=True)
+        _process_executor = None
@@ -0,0 +1,86 @@
+# 流式目录扫描：基于 os.scandir 边扫描边产出图片，第一张图片找到后即可开始播放
+import os
+import threading
+from utils import IMAGE_EXTENSIONS
+from catalog import image_catalog
+
+def iter_images(root):
+    """深度优先遍历目录，逐个产出图片路径；跳过隐藏文件和无法访问的目录，不跟随目录符号链接"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subdirs = []
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                            yield entry.path
+                    except OSError:
+                        continue
+                # 倒序入栈，保持按目录顺序遍历
+                stack.extend(reversed(subdirs))
+        except OSError as e:
+            print(f"目录扫描错误: {directory} - {e}")
+
+class FolderScanner:
+    """在后台线程扫描目录，主线程定期取走新发现的图片
+
+    启用图片目录(catalog)时使用增量扫描，并在扫描结束后补全图片尺寸。
+    """
+
+    def __init__(self, root, catalog=image_catalog):
+        self.root = root
+        self.catalog = catalog
+        self.lock = threading.Lock()
+        self.found = []
+        self.total = 0
+        self.done = False
+        self._first = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="folder-scanner", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        if self.catalog is not None:
+            source = self.catalog.scan(self.root, self._stop)
+        else:
+            source = iter_images(self.root)
+        try:
+            for path in source:
+                if self._stop.is_set():
+                    break
+                with self.lock:
+                    self.found.append(path)
+                    self.total += 1
+                self._first.set()
+        except Exception as e:
+            print(f"目录扫描错误: {e}")
+        finally:
+            self.done = True
+            # 目录中没有图片时也要唤醒等待的主线程
+            self._first.set()
+        if self.catalog is not None:
+            self.catalog.probe_dimensions(self._stop)
+
+    def wait_first(self, timeout=None):
+        """阻塞直到找到第一张图片或扫描结束，没有图片时返回False"""
+        self._first.wait(timeout)
+        return self.total > 0
+
+    def drain(self):
+        """取走上次调用以来新发现的图片"""
+        with self.lock:
+            found, self.found = self.found, []
+        return found
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,208 @@
+# 统一的图片任务调度器：缩略图和幻灯片渲染共用一组工作线程，按优先级出队
+# 相同的任务键（类型、路径、目标尺寸）在排队或执行期间只保留一个Future，重复提交返回同一个并按需提升优先级
+import time
+import heapq
+import threading
+from collections import deque
+from concurrent.futures import Future
+from config import *
+from profiler import profiler, percentile
+
+# 优先级，数字越小越先执行
+VISIBLE = 0   # 当前屏幕上需要的：正在显示的幻灯片、可见的缩略图
+NEXT = 1      # 下一张幻灯片
+PREFETCH = 2  # 预渲染、预取的缩略图行
+WARM = 3      # 后台预热缓存
+PRIORITY_NAMES = {VISIBLE: 'visible', NEXT: 'next', PREFETCH: 'prefetch', WARM: 'warm'}
+
+# 每个优先级保留的最近等待时间样本数
+_WAIT_SAMPLES = 1000
+
+class _Job:
+    __slots__ = ('key', 'future', 'fn', 'args', 'priority', 'submitted')
+
+    def __init__(self, key, future, fn, args, priority):
+        self.key = key
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.submitted = time.perf_counter()
+
+class JobScheduler:
+    """带优先级和去重的线程池，任务键的第一个元素为任务类型（'thumb'、'render'等）"""
+
+    def __init__(self, workers=SCHEDULER_WORKERS, name="image-job"):
+        self.workers = workers
+        self.name = name
+        self.cond = threading.Condition()
+        self.heap = []  # (优先级, 序号, 任务)，提升优先级后旧条目留在堆中，出队时跳过
+        self.jobs = {}  # 任务键 -> 排队或执行中的任务
+        self.running = 0
+        self._seq = 0
+        self._threads = []
+        self._shutdown = False
+        self.waits = {priority: deque(maxlen=_WAIT_SAMPLES) for priority in PRIORITY_NAMES}
+        self.completed = 0
+        self.cancelled = 0
+        self.deduplicated = 0
+
+    def _start_workers(self):
+        """懒启动工作线程，第一次提交任务时才创建"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, priority, fn, *args, on_done=None):
+        """提交任务并返回Future；同一任务键已在排队或执行时返回原Future，优先级更高时提升
+
+        on_done(future)只在新建任务时注册，重复提交不会重复回调。
+        """
+        with self.cond:
+            if self._shutdown:
+                raise RuntimeError("任务调度器已关闭")
+            job = self.jobs.get(key)
+            if job is not None:
+                self.deduplicated += 1
+                self._raise_priority(job, priority)
+                return job.future
+            if not self._threads:
+                self._start_workers()
+            future = Future()
+            job = _Job(key, future, fn, args, priority)
+            self.jobs[key] = job
+            self._push(job)
+        future.add_done_callback(lambda f: self._forget(job))
+        if on_done is not None:
+            future.add_done_callback(on_done)
+        return future
+
+    def reprioritize(self, key, priority):
+        """提升已在排队的任务的优先级，返回是否提升；任务不存在时不会新建
+
+        用于只想调整顺序、不希望重复创建任务的场合（任务可能刚完成，结果已被其他人取走）。
+        """
+        with self.cond:
+            job = self.jobs.get(key)
+            return job is not None and self._raise_priority(job, priority)
+
+    def _raise_priority(self, job, priority):
+        if priority >= job.priority or job.future.running() or job.future.done():
+            return False
+        job.priority = priority
+        self._push(job)
+        return True
+
+    def _push(self, job):
+        self._seq += 1
+        heapq.heappush(self.heap, (job.priority, self._seq, job))
+        self.cond.notify()
+
+    def _forget(self, job):
+        with self.cond:
+            if self.jobs.get(job.key) is job:
+                del self.jobs[job.key]
+
+    def cancel(self, key):
+        """取消尚未开始的任务，已在执行的任务不受影响，返回是否取消成功"""
+        with self.cond:
+            job = self.jobs.get(key)
+        if job is None or not job.future.cancel():
+            return False
+        self.cancelled += 1
+        return True
+
+    def cancel_kind(self, kind, keep=None):
+        """取消某类型所有尚未开始的任务；keep(key)返回True的任务保留"""
+        for key in self.keys(kind):
+            if keep is None or not keep(key):
+                self.cancel(key)
+
+    def keys(self, kind):
+        with self.cond:
+            return [key for key in self.jobs if key[0] == kind]
+
+    def pending(self, kind):
+        """某类型排队或执行中的任务 {任务键: Future}"""
+        with self.cond:
+            return {key: job.future for key, job in self.jobs.items() if key[0] == kind}
+
+    def __contains__(self, key):
+        with self.cond:
+            return key in self.jobs
+
+    def _next_job(self):
+        """取出优先级最高的有效任务，没有任务时等待；关闭后返回None"""
+        with self.cond:
+            while True:
+                while self.heap:
+                    priority, _, job = heapq.heappop(self.heap)
+                    # 跳过优先级已提升的旧条目和已被取代的任务
+                    if priority != job.priority or self.jobs.get(job.key) is not job:
+                        continue
+                    if not job.future.set_running_or_notify_cancel():
+                        continue  # 已取消
+                    self.running += 1
+                    return job
+                if self._shutdown:
+                    return None
+                self.cond.wait()
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            start = time.perf_counter()
+            self.waits[job.priority].append((start - job.submitted) * 1000)
+            if profiler.enabled:
+                profiler.record(f"queue.wait.{PRIORITY_NAMES[job.priority]}", job.submitted, start, 'queue')
+            try:
+                result = job.fn(*job.args)
+            except BaseException as e:
+                job.future.set_exception(e)
+            else:
+                job.future.set_result(result)
+            finally:
+                with self.cond:
+                    self.running -= 1
+                    self.completed += 1
+
+    def metrics(self):
+        """队列深度（按优先级）、执行中数量和等待时间分位数(ms)"""
+        with self.cond:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for job in self.jobs.values():
+                if not job.future.running() and not job.future.done():
+                    depth[PRIORITY_NAMES[job.priority]] += 1
+            waits = {PRIORITY_NAMES[p]: sorted(samples) for p, samples in self.waits.items()}
+            return {
+                'queued': depth,
+                'running': self.running,
+                'completed': self.completed,
+                'cancelled': self.cancelled,
+                'deduplicated': self.deduplicated,
+                'wait_ms': {name: (percentile(values, 50), percentile(values, 95))
+                            for name, values in waits.items() if values},
+            }
+
+    def print_stats(self):
+        m = self.metrics()
+        queued = ' '.join(f"{name}:{count}" for name, count in m['queued'].items())
+        waits = ' '.join(f"{name} p50={p50:.1f} p95={p95:.1f}" for name, (p50, p95) in m['wait_ms'].items())
+        print(f"任务队列 [{queued}] | 执行中: {m['running']} | 完成: {m['completed']} | "
+              f"取消: {m['cancelled']} | 去重: {m['deduplicated']}")
+        if waits:
+            print(f"排队等待(ms) {waits}")
+
+    def shutdown(self):
+        """取消所有排队任务并让工作线程退出（不等待执行中的任务）"""
+        with self.cond:
+            self._shutdown = True
+            jobs = list(self.jobs.values())
+            self.cond.notify_all()
+        for job in jobs:
+            job.future.cancel()
+
+job_scheduler = JobScheduler()
@@ -1,76 +1,158 @@
 import pyglet
-import time
-from pyglet import clock
 from pyglet.window import key
 from config import *
 from utils import *
 from image_processor import (
-    image_cache, apply_sharpening, clean_cache, 
-    generate_thumbnail_page, create_thumbnail_sprite_from_data,
-    thumbnail_data_cache, thumbnail_cache, cleanup_thumbnails
+    image_cache, apply_sharpening, upload_frame, clean_cache, texture_bytes,
+    estimate_frame_bytes, render_bucket, cached_texture, render_preview, frame_cached,
+    generate_thumbnail_range, store_thumbnail_data, draw_thumbnail_batch,
+    cancel_thumbnail_tasks, cleanup_thumbnails, forget_thumbnails, record_decode_failure, oversized_images
 )
+from prefetch import Prefetcher
+from texture_upload import StreamingUploader
+from animation import Timeline
+from animated import AnimationPlayer, may_be_animated
+from pyglet.image.codecs import ImageDecodeException
+from decode import fits_window
+from catalog import image_catalog
+from playlist import step_target, insert_unplayed, remove_paths
+
+def set_if_changed(obj, name, value):
+    """只在值变化时赋值，pyglet精灵和图形的属性每次赋值都会重写顶点数据"""
+    if getattr(obj, name) != value:
+        setattr(obj, name, value)
 
 class SlideShow:
     def __init__(self, images, window):
         self.images = images  # 保存图片列表
+        self._known_paths = set(images)  # 去重：扫描和目录监听可能报告同一文件
         self.window = window  # 保存窗口引用
+        # 幻灯片画面是常驻在同一个Batch中的场景：后层为滑出的旧图，前层为当前/滑入的图，最上层为进度条
         self.batch = pyglet.graphics.Batch()
+        self.back_group = pyglet.graphics.Group(order=0)
+        self.front_group = pyglet.graphics.Group(order=1)
+        self.hud_group = pyglet.graphics.Group(order=2)
+        self._spare_sprites = []  # 隐藏待复用的幻灯片精灵
         self.current = None
         self.next_img = None
         self.transitioning = False
         self.old_img = None
-        self.animation_start_time = 0
+        # 所有补间动画由同一条时间线驱动，静止时不重绘
+        self.timeline = Timeline(window)
+        self.animation = None  # 当前图片为动图时的播放器
         self.manual_mode = False
         self.current_index = 0
+        self.detached = 0  # 当前显示的图片已从列表删除时，它在current_index之前(1)还是之后(-1)
+        self.direction = 1  # 播放方向：1向后，-1向前，用于预渲染
+        self.prefetcher = Prefetcher()
+        # 预渲染完成的帧在后台分块上传，切换时纹理通常已就绪
+        self.uploader = StreamingUploader(self._upload_complete)
         self.thumbnail_mode = False
-        self.thumbnail_page = 0
+        self.thumbnail_page = 0  # 退出缩略图模式时播放的图片
+        self.thumbnail_scroll = 0.0  # 网格顶部的行号，平滑滚动时为小数
+        self._thumbnail_scroll_target = 0.0
+        self._thumbnail_layout_key = None
+        self._visible_thumbnails = []
         self.progress_bg_color = (11, 11, 11, 255)
         self.progress_fg_color = (102, 102, 102, 255)
-        self.progress_bg = pyglet.shapes.Rectangle(0, 0, 0, 0, color=(0,0,0))
-        self.progress_fg = pyglet.shapes.Rectangle(0, 0, 0, 0, color=(0,0,0))
+        # 颜色和高度固定，只在创建时设置一次
+        self.progress_bg = pyglet.shapes.Rectangle(0, 0, 0, PROGRESS_BAR_HEIGHT, color=self.progress_bg_color,
+                                                   batch=self.batch, group=self.hud_group)
+        self.progress_fg = pyglet.shapes.Rectangle(0, 0, 0, PROGRESS_BAR_HEIGHT, color=self.progress_fg_color,
+                                                   batch=self.batch, group=self.hud_group)
         self.progress_bg.visible = False
         self.progress_fg.visible = False
 
-    def update_progress(self, progress):
+    def update_progress(self, progress=None):
+        """按当前位置更新进度条，在播放位置、图片数量或窗口宽度变化时调用，宽度变化平滑过渡"""
+        self.timeline.invalidate()
         if self.manual_mode or self.thumbnail_mode or not self.images:
-            self.progress_bg.visible = False
-            self.progress_fg.visible = False
+            set_if_changed(self.progress_bg, 'visible', False)
+            set_if_changed(self.progress_fg, 'visible', False)
+            self.timeline.cancel('progress')
             return
+        if progress is None:
+            progress = (self.current_index + 1) / len(self.images)
 
         total_width = self.window.width
         bar_width = total_width * progress
+        start_width = self.progress_fg.width if self.progress_fg.visible else bar_width
+
+        set_if_changed(self.progress_bg, 'width', total_width)
+        set_if_changed(self.progress_fg, 'width', start_width)
+        set_if_changed(self.progress_bg, 'visible', True)
+        set_if_changed(self.progress_fg, 'visible', True)
+        if start_width != bar_width:
+            def grow(progress):
+                self.progress_fg.width = start_width + (bar_width - start_width) * progress
+            self.timeline.animate('progress', TRANSITION, grow, ease_out_quad)
+        else:
+            self.timeline.cancel('progress')
 
-        self.progress_bg.width = total_width
-        self.progress_bg.height = PROGRESS_BAR_HEIGHT
-        self.progress_bg.color = self.progress_bg_color[:3]
-        self.progress_bg.opacity = self.progress_bg_color[3]
+    def render_size(self):
+        """当前窗口的渲染尺寸 (宽, 高)，纹理按此尺寸渲染，缓存键使用其所在的档位"""
+        return self.window.width, self.window.height
 
-        self.progress_fg.width = bar_width
-        self.progress_fg.height = PROGRESS_BAR_HEIGHT
-        self.progress_fg.color = self.progress_fg_color[:3]
-        self.progress_fg.opacity = self.progress_fg_color[3]
+    def _slide_sprites(self):
+        return [sprite for sprite in (self.current, self.next_img, self.old_img) if sprite is not None]
 
-        self.progress_bg.visible = True
-        self.progress_fg.visible = True
+    def _clean_cache(self, keep=(), incoming_bytes=0):
+        """按纹理预算清理缓存；除keep外，屏幕上精灵正在显示的纹理也受保护（窗口尺寸变化后可能属于旧档位）"""
+        displayed = [sprite.cache_key for sprite in self._slide_sprites()
+                     if getattr(sprite, 'cache_key', None) is not None]
+        clean_cache(self.images, self.current_index, self.direction, render_bucket(*self.render_size()),
+                    keep=(*keep, *displayed), incoming_bytes=incoming_bytes)
 
-    def draw_sigle_pic(self, path, add_to_batch=True):
-        debug_gc_collect("draw_sigle_pic")
-        if path not in image_cache:
+    def _store_texture(self, cache_key, img):
+        """放入纹理缓存；同一键的旧纹理仍在显示时，先把精灵换成新纹理，再由缓存释放旧纹理"""
+        old = image_cache.get(cache_key)
+        if old is not None and old is not img:
+            for sprite in self._slide_sprites():
+                if getattr(sprite, 'cache_key', None) == cache_key:
+                    self._set_sprite_texture(sprite, img, cache_key)
+        image_cache.put(cache_key, img, texture_bytes(img))
+
+    def draw_sigle_pic(self, path):
+        if path in oversized_images:
+            return None
+        size = self.render_size()
+        cache_key = (path, render_bucket(*size))
+        img = cached_texture(path, *size)
+        if img is None:
+            # 根据已知尺寸在上传前腾出纹理预算，降低峰值占用
+            self._clean_cache(keep=(cache_key,), incoming_bytes=estimate_frame_bytes(path, *size))
+            # 正在流式上传的纹理直接补完剩余行，否则使用后台预渲染的结果，主线程只做纹理上传
+            streamed = self.uploader.finish((path, *size))
+            frame = self.prefetcher.take(path, *size) if streamed is None else None
             try:
-                # 应用锐化效果后加载图片，传入窗口尺寸
-                img = apply_sharpening(path, self.window.width, self.window.height)
-                image_cache[path] = img
+                if streamed is not None:
+                    img = streamed
+                elif frame is not None:
+                    img = upload_frame(frame)
+                else:
+                    # 应用锐化效果后加载图片，按窗口尺寸渲染
+                    img = apply_sharpening(path, *size)
+                self._store_texture(cache_key, img)
             except Exception as e:
                 print(f"加载图片失败: {path} - {e}")
+                # PIL渲染失败后退回pyglet加载，pyglet也无法识别时抛出ImageDecodeException
+                if image_catalog is not None and isinstance(e, ImageDecodeException):
+                    image_catalog.mark_failed(path)
+                else:
+                    record_decode_failure(path, e)
                 return None
         else:
-            image_cache.move_to_end(path)
+            image_cache.touch(cache_key)
         
-        clean_cache()
+        self._clean_cache(keep=(cache_key,))
         sprite = None
       
         try:
-            sprite = pyglet.sprite.Sprite(image_cache[path], batch=self.batch if add_to_batch else None)
+            sprite = self._acquire_sprite(img)
+            # 记录精灵显示的图片和缓存键，窗口尺寸变化后据此替换为新分辨率的纹理
+            sprite.path = path
+            sprite.cache_key = cache_key
+            self.scale_to_fit(sprite, self.window.width, self.window.height)
             self.center_sprite(sprite, self.window.width, self.window.height)
             self.window.set_caption(os.path.basename(path))
             return sprite
@@ -78,94 +160,365 @@ class SlideShow:
             print(f"创建精灵失败: {e}")
             return None
 
-    def _position_thumbnail(self, sprite, start_index, idx):
-        """ 定位缩略图位置 """
-        # 在计算缩放前添加安全检查
-        if sprite.width == 0 or sprite.height == 0:
+    def show_first(self, path):
+        """启动时显示第一张图片并开始预渲染
+
+        帧缓存未命中时先上传快速预览（耗时远小于完整的锐化渲染），完整渲染以最高优先级在后台进行，
+        完成后替换预览纹理；预览失败时退回同步完整渲染。
+        """
+        size = self.render_size()
+        preview = None
+        if FAST_STARTUP and cached_texture(path, *size) is None and not frame_cached(path, *size):
+            try:
+                preview = upload_frame(render_preview(path, *size))
+            except Exception as e:
+                print(f"快速预览失败: {path} - {e}")
+        if preview is None:
+            sprite = self.draw_sigle_pic(path)
+            self.schedule_prefetch()
+            return sprite
+        sprite = self._acquire_sprite(preview)
+        sprite.path = path
+        sprite.cache_key = None  # 预览不在纹理缓存中，窗口尺寸变化时同样会重新渲染
+        sprite.preview = preview  # 换下或回收精灵时释放
+        self.scale_to_fit(sprite, self.window.width, self.window.height)
+        self.center_sprite(sprite, self.window.width, self.window.height)
+        self.window.set_caption(os.path.basename(path))
+        # 先安排预渲染再提交当前图片（schedule会取消不在预渲染范围内的任务）
+        self.schedule_prefetch()
+        future = self.prefetcher.request(path, *size)
+        future.add_done_callback(
+            lambda f: pyglet.clock.schedule_once(lambda dt: self._finish_rerender(path, size, f), 0))
+        return sprite
+
+    def add_images(self, paths):
+        """把新图片随机插入尚未播放的部分，已播放的顺序和已预渲染的几张保持不变
+
+        原地修改列表，外部持有的同一个列表引用（进度条分母等）会随之增长。
+        """
+        paths = [path for path in dict.fromkeys(paths) if path not in self._known_paths]
+        if not paths:
+            return
+        self._known_paths.update(paths)
+        # 插入位置从预渲染范围之后开始，避免打乱已经在渲染的图片
+        prefetch_end = self.current_index + 1 + PREFETCH_COUNT
+        start = min(len(self.images), prefetch_end)
+        insert_unplayed(self.images, paths, start)
+        if self.thumbnail_mode:
+            self._thumbnail_layout_key = None
+        if start < prefetch_end:
+            # 列表较短，新图片落在了预渲染范围内，重新安排预渲染
+            self.schedule_prefetch()
+        self.update_progress()
+
+    def remove_images(self, paths=(), trees=()):
+        """删除已不存在的图片（trees为被删除的目录），保持当前位置、缩略图页和缓存一致"""
+        removed = set(paths).intersection(self._known_paths)
+        prefixes = tuple(os.path.join(tree, '') for tree in trees)
+        if prefixes:
+            removed.update(path for path in self._known_paths if path.startswith(prefixes))
+        if not removed:
+            return
+        self._known_paths.difference_update(removed)
+
+        # 当前图片已删除但仍在显示，位置指向原来的相邻图片，切换时正好显示原来的下一张/上一张
+        self.current_index, self.thumbnail_page, self.detached = remove_paths(
+            self.images, removed, self.current_index, self.thumbnail_page, self.detached)
+
+        # 释放已删除图片的缓存，正在显示的纹理保留到被淘汰为止
+        in_use = {sprite.image for sprite in (self.current, self.next_img, self.old_img) if sprite}
+        for cache_key in [k for k in image_cache if k[0] in removed]:
+            if image_cache[cache_key] not in in_use:
+                image_cache.discard(cache_key)
+        for sprite in self._visible_thumbnails:
+            sprite.visible = False
+        self._visible_thumbnails = []
+        forget_thumbnails(removed)
+        self._thumbnail_layout_key = None
+        self.schedule_prefetch()
+        self.update_progress()
+
+    def schedule_prefetch(self):
+        """根据当前位置和播放方向预渲染接下来的图片"""
+        on_done = self._prefetch_done if STREAM_UPLOAD else None
+        # 当前图片已删除时，从使下一步正好落在相邻图片上的位置开始
+        anchor = step_target(self.current_index, self.direction, self.detached) - self.direction
+        self.prefetcher.schedule(self.images, anchor, self.direction, *self.render_size(),
+                                 on_done=on_done)
+
+    def _prefetch_done(self, key, future):
+        """预渲染任务结束（工作线程），回到主线程开始分块上传"""
+        if not future.cancelled():
+            pyglet.clock.schedule_once(lambda dt: self._start_upload(key), 0)
+
+    def _start_upload(self, key):
+        path, width, height = key
+        if cached_texture(path, width, height) is not None or key in self.uploader:
+            return
+        frame = self.prefetcher.claim(path, width, height)
+        if frame is None:
             return
+        self.uploader.add(key, frame)
+
+    def _upload_complete(self, key, texture):
+        """分块上传完成后放入纹理缓存，按预算淘汰时保护当前附近的图片"""
+        path, width, height = key
+        cache_key = (path, render_bucket(width, height))
+        self._clean_cache(keep=(cache_key,), incoming_bytes=texture_bytes(texture))
+        self._store_texture(cache_key, texture)
+
+    def rerender_for_resize(self, dt=0):
+        """窗口尺寸稳定后按新尺寸在后台重新渲染当前显示的图片并替换纹理，同时重新安排预渲染
+
+        缩放后的旧纹理在新纹理就绪前继续显示；缓存中已有按新尺寸渲染的纹理时直接替换，
+        来回切换窗口尺寸时不会重复渲染。
+        """
+        size = self.render_size()
+        # 先按新尺寸安排预渲染，再单独提交正在显示的图片（schedule会取消不在预渲染范围内的任务）
+        self.schedule_prefetch()
+        for sprite in (self.current, self.next_img):
+            if sprite is None or getattr(sprite, 'path', None) is None:
+                continue
+            poster = self.animation.poster if self.animation is not None and self.animation.sprite is sprite \
+                else sprite.image
+            if getattr(sprite, 'cache_key', None) is not None and fits_window(poster.width, poster.height, *size):
+                continue
+            if cached_texture(sprite.path, *size) is not None:
+                self._swap_texture(sprite.path, size)
+                continue
+            future = self.prefetcher.request(sprite.path, *size)
+            future.add_done_callback(
+                lambda f, path=sprite.path: pyglet.clock.schedule_once(
+                    lambda dt: self._finish_rerender(path, size, f), 0))
+
+    def _finish_rerender(self, path, size, future):
+        """主线程中上传重新渲染的帧并替换到仍在显示该图片的精灵上"""
+        if future.cancelled() or size != self.render_size():
+            return
+        if cached_texture(path, *size) is None:
+            frame = self.prefetcher.take(path, *size)
+            if frame is None:
+                return
+            try:
+                cache_key = (path, render_bucket(*size))
+                self._clean_cache(keep=(cache_key,), incoming_bytes=frame.width * frame.height * 4)
+                self._store_texture(cache_key, upload_frame(frame))
+            except Exception as e:
+                print(f"重新渲染图片失败: {path} - {e}")
+                return
+        self._swap_texture(path, size)
+
+    def _swap_texture(self, path, size):
+        """把显示path的精灵换成按size渲染的缓存纹理，并按窗口重新缩放居中"""
+        img = cached_texture(path, *size)
+        if img is None:
+            return
+        cache_key = (path, render_bucket(*size))
+        for sprite in self._slide_sprites():
+            if getattr(sprite, 'path', None) == path and sprite.image is not img:
+                self._set_sprite_texture(sprite, img, cache_key)
+        self.timeline.invalidate()
+
+    def _set_sprite_texture(self, sprite, img, cache_key):
+        """替换精灵的纹理并重新缩放居中，正在播放的动图按新尺寸重新开始"""
+        playing = self.animation is not None and self.animation.sprite is sprite
+        if playing:
+            self.stop_animation()
+        self._set_image(sprite, img)
+        sprite.cache_key = cache_key
+        self.scale_to_fit(sprite, self.window.width, self.window.height)
+        if not (sprite is self.next_img and self.transitioning):
+            # 过渡动画中滑入图片的x由slide_left控制
+            self.center_sprite(sprite, self.window.width, self.window.height)
+        if playing:
+            self.start_animation()
+
+    def _thumbnail_cell(self):
+        """缩略图格子的宽高和行距（格子高度加间距）"""
         padding = 10
-        columns = 5
-        rows = 2
-        cell_width = (self.window.width - (columns + 1) * padding) / columns
-        cell_height = (self.window.height - (rows + 1) * padding) / rows
-
-        pos_in_page = idx - start_index
-        col = pos_in_page % columns
-        row = pos_in_page // columns
+        cell_width = (self.window.width - (THUMBNAIL_COLUMNS + 1) * padding) / THUMBNAIL_COLUMNS
+        cell_height = (self.window.height - (THUMBNAIL_ROWS + 1) * padding) / THUMBNAIL_ROWS
+        return padding, cell_width, cell_height
+
+    def _position_thumbnail(self, sprite, idx):
+        """ 按网格位置和滚动偏移定位缩略图，按原始纹理尺寸计算缩放，可在窗口尺寸变化后重复调用 """
+        # 在计算缩放前添加安全检查
+        if sprite.image.width == 0 or sprite.image.height == 0:
+            return
+        padding, cell_width, cell_height = self._thumbnail_cell()
+
+        col = idx % THUMBNAIL_COLUMNS
+        row = idx // THUMBNAIL_COLUMNS - self.thumbnail_scroll  # 相对可见区域顶部的行数，可为小数
         cell_x = padding + col * (cell_width + padding)
         cell_y = self.window.height - padding - (row + 1) * cell_height - row * padding
 
-        scale_w = cell_width / sprite.width
-        scale_h = cell_height / sprite.height
+        scale_w = cell_width / sprite.image.width
+        scale_h = cell_height / sprite.image.height
         scale_factor = min(scale_w, scale_h)
-        sprite.update(scale=scale_factor)
-        sprite.x = cell_x + (cell_width - sprite.width) / 2
-        sprite.y = cell_y + (cell_height - sprite.height) / 2
+        sprite.update(x=cell_x + (cell_width - sprite.image.width * scale_factor) / 2,
+                      y=cell_y + (cell_height - sprite.image.height * scale_factor) / 2,
+                      scale=scale_factor)
 
-    def draw_thumbnails(self):
-        """绘制缩略图页面"""
-        # 使用 image_processor 中的函数生成缩略图页面
-        def thumbnail_ready_callback(future, page_start, idx_in_page):
-            try:
-                result = future.result()
-                path, image_data, size = result
-                
-                def update_thumbnail(dt):
-                    # 更新缩略图数据缓存
-                    thumbnail_data_cache[path] = result
-                    
-                    # 创建精灵并定位
-                    sprite = create_thumbnail_sprite_from_data(result)
-                    if sprite:
-                        self._position_thumbnail(sprite, page_start, idx_in_page)
-                        
-                        # 更新缓存中的精灵
-                        page_key = (page_start, self.window.width, self.window.height)
-                        if page_key in thumbnail_cache:
-                            thumbnail_cache[page_key][idx_in_page - page_start] = sprite
-                
-                pyglet.clock.schedule_once(update_thumbnail, 0)
-            except Exception as e:
-                print(f"处理缩略图回调时出错: {e}")
-
-        # 生成缩略图页面
-        sprites = generate_thumbnail_page(
-            self.images, 
-            self.thumbnail_page, 
-            self.window.width, 
-            self.window.height,
-            thumbnail_ready_callback
-        )
-        
-        # 绘制所有精灵
-        for sprite in sprites:
+    def _max_thumbnail_scroll(self):
+        total_rows = -(-len(self.images) // THUMBNAIL_COLUMNS)
+        return max(0, total_rows - THUMBNAIL_ROWS)
+
+    def enter_thumbnail_mode(self):
+        """进入缩略图模式，网格滚动到当前图片所在行"""
+        self.thumbnail_mode = True
+        self.manual_mode = True
+        self.stop_animation()
+        self.thumbnail_page = self.current_index
+        self.timeline.cancel('thumbnail_scroll')
+        self.thumbnail_scroll = min(self.current_index // THUMBNAIL_COLUMNS, self._max_thumbnail_scroll())
+        self._thumbnail_scroll_target = self.thumbnail_scroll
+        self.update_progress()
+
+    def scroll_thumbnails(self, rows, smooth=False):
+        """滚动缩略图网格rows行（可为小数）；smooth为True时通过时间线平滑滚动（翻页）"""
+        start = self.thumbnail_scroll
+        base = self._thumbnail_scroll_target if self.timeline.is_running('thumbnail_scroll') else start
+        target = min(max(0, base + rows), self._max_thumbnail_scroll())
+        self._thumbnail_scroll_target = target
+        # 退出缩略图模式时从可见区域第一行开始播放
+        self.thumbnail_page = min(int(round(target)) * THUMBNAIL_COLUMNS, max(0, len(self.images) - 1))
+        if smooth and target != start:
+            def step(progress):
+                self.thumbnail_scroll = start + (target - start) * progress
+            self.timeline.animate('thumbnail_scroll', THUMBNAIL_SCROLL_TIME, step, ease_out_quad)
+        else:
+            self.timeline.cancel('thumbnail_scroll')
+            self.thumbnail_scroll = target
+        self.timeline.invalidate()
+
+    def _thumbnail_ready_callback(self, future):
+        """后台缩略图完成后回到主线程缓存数据，并在下一帧重新布局"""
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+            if result is None:
+                return
+
+            def update_thumbnail(dt):
+                store_thumbnail_data(result)
+                self._thumbnail_layout_key = None
+                self.timeline.invalidate()
+
+            pyglet.clock.schedule_once(update_thumbnail, 0)
+        except Exception as e:
+            print(f"处理缩略图回调时出错: {e}")
+
+    def _layout_thumbnails(self):
+        """取出可见行（滚动到一半时多一行）的缩略图并重新布局，预取上下THUMBNAIL_PREFETCH_ROWS行
+
+        只在滚动、窗口尺寸变化、图片列表变化或有新缩略图时执行。
+        """
+        self._thumbnail_layout_key = self._thumbnail_layout_state()
+        self.thumbnail_scroll = min(self.thumbnail_scroll, self._max_thumbnail_scroll())
+        first_row = int(self.thumbnail_scroll)
+        visible_rows = THUMBNAIL_ROWS + (1 if self.thumbnail_scroll > first_row else 0)
+        start = first_row * THUMBNAIL_COLUMNS
+        count = visible_rows * THUMBNAIL_COLUMNS
+        margin = THUMBNAIL_PREFETCH_ROWS * THUMBNAIL_COLUMNS
+        # 滚动方向通常向下，先预取后面的行
+        prefetch = self.images[start + count:start + count + margin] + self.images[max(0, start - margin):start]
+
+        # 滚出可见范围的精灵先隐藏（生成时可能被淘汰删除），仍可见的保持不动避免重复改写
+        visible_paths = set(self.images[start:start + count])
+        for sprite in self._visible_thumbnails:
+            if sprite.path not in visible_paths:
+                sprite.visible = False
+        sprites = generate_thumbnail_range(self.images, start, count, self._thumbnail_ready_callback, prefetch)
+        self._visible_thumbnails = [sprite for sprite in sprites if sprite]
+        for offset, sprite in enumerate(sprites):
             if sprite:
-                sprite.draw()
+                self._position_thumbnail(sprite, start + offset)
+                set_if_changed(sprite, 'visible', True)
+
+    def _thumbnail_layout_state(self):
+        return (self.thumbnail_scroll, len(self.images), self.window.width, self.window.height)
+
+    def draw_thumbnails(self):
+        """绘制可见的缩略图"""
+        layout_key = self._thumbnail_layout_state()
+        if layout_key != self._thumbnail_layout_key:
+            self._layout_thumbnails()
+        # 所有缩略图位于共享图集中，通过一个Batch绘制
+        draw_thumbnail_batch()
+
+    def hide_thumbnails(self):
+        """离开缩略图模式：隐藏精灵、取消排队任务，缓存保留供下次进入使用"""
+        for sprite in self._visible_thumbnails:
+            sprite.visible = False
+        self._visible_thumbnails = []
+        self._thumbnail_layout_key = None
+        cancel_thumbnail_tasks()
 
     def scale_to_fit(self, sprite, max_width, max_height):
         if sprite.image:
             original_width = sprite.image.width
             original_height = sprite.image.height
             scale = min(max_width / original_width, max_height / original_height)
-            sprite.scale = scale
+            set_if_changed(sprite, 'scale', scale)
 
     def center_sprite(self, sprite, max_width, max_height):
-        sprite.x = (max_width - sprite.width) // 2
-        sprite.y = (max_height - sprite.height) // 2
+        set_if_changed(sprite, 'x', (max_width - sprite.width) // 2)
+        set_if_changed(sprite, 'y', (max_height - sprite.height) // 2)
+
+    def _acquire_sprite(self, img):
+        """取一个幻灯片精灵放在前层显示img，优先复用之前隐藏的精灵"""
+        if not self._spare_sprites:
+            return pyglet.sprite.Sprite(img, batch=self.batch, group=self.front_group)
+        sprite = self._spare_sprites.pop()
+        self._set_image(sprite, img)
+        set_if_changed(sprite, 'group', self.front_group)
+        set_if_changed(sprite, 'opacity', 255)
+        sprite.visible = True
+        return sprite
+
+    def _set_image(self, sprite, img):
+        """替换精灵的纹理，换下的快速预览纹理随之释放"""
+        sprite.image = img
+        if getattr(sprite, 'preview', None) is not img:
+            self._drop_preview(sprite)
+
+    def _drop_preview(self, sprite):
+        """释放精灵持有的快速预览纹理（预览不在纹理缓存中，不会被缓存淘汰释放）"""
+        preview = getattr(sprite, 'preview', None)
+        if preview is not None:
+            sprite.preview = None
+            preview.delete()
+
+    def start_animation(self):
+        """当前图片是动图时在当前精灵上开始播放（后台逐帧解码）"""
+        self.stop_animation()
+        sprite = self.current
+        if ANIMATION and sprite is not None and not self.thumbnail_mode and may_be_animated(sprite.path):
+            self.animation = AnimationPlayer(sprite.path, sprite, self.timeline.invalidate)
+
+    def stop_animation(self):
+        """停止动图播放，精灵恢复为海报帧"""
+        if self.animation is not None:
+            self.animation.stop()
+            self.animation = None
 
     def _safe_delete_sprite(self, sprite, sprite_name="精灵"):
-        """安全删除精灵的辅助函数"""
-        # print(f"DEBUG: 清理{sprite_name}前 - 类型: {type(sprite)}, 值: {sprite}")
+        """隐藏幻灯片精灵并留待复用（最多保留两个，其余删除）"""
+        if sprite and self.animation is not None and self.animation.sprite is sprite:
+            self.stop_animation()
         if sprite:
+            if sprite in self._spare_sprites:
+                return None
             try:
-                # 更安全的删除方式：先移除batch，再删除
-                if hasattr(sprite, 'batch') and sprite.batch:
-                    sprite.batch = None
-                if hasattr(sprite, 'delete'):
+                sprite.visible = False
+                if len(self._spare_sprites) < 2:
+                    # 备用精灵的预览纹理在下次复用换图时释放
+                    self._spare_sprites.append(sprite)
+                else:
                     sprite.delete()
-                # print(f"DEBUG: {sprite_name}删除后 - 类型: {type(sprite)}, 值: {sprite}")
-                # print(f"DEBUG: {sprite_name}删除成功")
-                # 返回None表示已删除
+                    self._drop_preview(sprite)
+                # 返回None表示已回收
                 return None
             except Exception as e:
                 print(f"清理{sprite_name}出错: {e}")
@@ -174,115 +527,131 @@ class SlideShow:
             print(f"DEBUG: 跳过删除 - {sprite_name}不存在")
             return None
 
+    def step_index(self, step):
+        """按step（1或-1）切换后的位置，到两端时绕回"""
+        return step_target(self.current_index, step, self.detached) % len(self.images)
+
+    def can_step(self, step):
+        """手动切换时不绕回：到两端返回False"""
+        return 0 <= step_target(self.current_index, step, self.detached) < len(self.images)
+
     def load_next(self):
         if not self.images:
             return
-        next_index = (self.current_index + 1) % len(self.images)
+        next_index = self.step_index(1)
         path = self.images[next_index]
         self.next_img = self.draw_sigle_pic(path)
         self.current_index = next_index
+        self.detached = 0
+        self.direction = 1
+        self.schedule_prefetch()
+        self.update_progress()
 
     def transition(self, dt):
         if self.manual_mode or self.transitioning or not self.next_img:
             return
         self.transitioning = True
-        self.animation_start_time = time.time()
+        # 滑出的旧图显示海报帧
+        self.stop_animation()
         if self.current:
-            # 创建一个新的精灵对象，而不是共享引用
-            self.old_img = pyglet.sprite.Sprite(self.current.image, batch=self.batch)
-            self.old_img.x = self.current.x
-            self.old_img.y = self.current.y
-            self.old_img.scale = self.current.scale
-            self.old_img.opacity = 255
+            # 当前精灵直接作为滑出的旧图移到后层，不再复制新的精灵
+            self.old_img = self.current
+            set_if_changed(self.old_img, 'group', self.back_group)
         self.next_img.x = self.window.width
-        clock.schedule_interval(self.slide_left, 1/60)
-        clock.schedule_interval(self.fade_out_old, 1/60)
+        self.timeline.animate('slide', TRANSITION, self.slide_left, ease_out_quad, self._finish_transition)
+        # 加速消失 用/4加速，取消缓动函数
+        self.timeline.animate('fade', TRANSITION / 4, self.fade_out_old)
 
-    def slide_left(self, dt):
-        elapsed = time.time() - self.animation_start_time
-        progress = min(elapsed / TRANSITION, 1.0)
-        eased_progress = ease_out_quad(progress)
+    def slide_left(self, eased_progress):
+        if not self.next_img:
+            return
         target_x = (self.window.width - self.next_img.width) // 2
         self.next_img.x = self.window.width - (self.window.width - target_x) * eased_progress
-        if progress >= 1.0:
-            clock.unschedule(self.slide_left)
-            
-            # 删除旧的当前精灵
+
+    def _finish_transition(self):
+        # 回收滑出的旧精灵（即原来的当前精灵）
+        if self.current is not self.old_img:
             self.current = self._safe_delete_sprite(self.current, "当前精灵")
-            
-            self.current = self.next_img
-            self.next_img = None
-            self.transitioning = False
-            
-            # 清理旧的动画精灵
-            self.old_img = self._safe_delete_sprite(self.old_img, "旧精灵")
-            self.old_img = None
-
-    def fade_out_old(self, dt):
+        self.old_img = self._safe_delete_sprite(self.old_img, "旧精灵")
+
+        self.current = self.next_img
+        self.next_img = None
+        self.transitioning = False
+        self.start_animation()
+
+    def fade_out_old(self, progress):
         if self.old_img and hasattr(self.old_img, 'opacity'):
-            elapsed = time.time() - self.animation_start_time
-            # 加速消失 用/4加速
-            progress = min(elapsed / (TRANSITION / 4), 1.0)
-            # 取消缓动函数 eased_progress = ease_out_cubic(progress)
-            eased_progress = progress
-            # 加速消失 把255变100
-            self.old_img.opacity = int(100 * (1 - eased_progress))
-            if progress >= 1.0:
-                clock.unschedule(self.fade_out_old)
-                # 只在这里停止动画，不设置 self.old_img = None
+            # 加速消失 把255变100，淡出结束后保留old_img直到滑动完成
+            set_if_changed(self.old_img, 'opacity', int(100 * (1 - progress)))
+
+    def _stop_transition(self):
+        """手动切换时中断过渡动画，丢弃滑入中的精灵"""
+        if not self.transitioning:
+            return
+        self.timeline.cancel('slide')
+        self.timeline.cancel('fade')
+        self.transitioning = False
+        # 旧图就是当前精灵，随后由调用方回收
+        if self.old_img is not self.current:
+            self._safe_delete_sprite(self.old_img, "旧精灵")
+        self.old_img = None
+        self.next_img = self._safe_delete_sprite(self.next_img, "下一张精灵")
 
     def show_next_manual(self):
-        if self.transitioning:
-            clock.unschedule(self.slide_left)
-            clock.unschedule(self.fade_out_old)
-            self.transitioning = False
-            if self.old_img:
-                self.old_img = None
+        self._stop_transition()
 
         self.manual_mode = True
-        next_index = (self.current_index + 1) % len(self.images)
+        next_index = self.step_index(1)
         path = self.images[next_index]
         self.current_index = next_index
+        self.detached = 0
+        self.direction = 1
         
         # 删除旧的当前精灵
         self.current = self._safe_delete_sprite(self.current, "当前精灵")
         
         self.current = self.draw_sigle_pic(path)
+        self.start_animation()
+        self.schedule_prefetch()
+        self.update_progress()
 
     def show_prev_manual(self):
-        if self.transitioning:
-            clock.unschedule(self.slide_left)
-            clock.unschedule(self.fade_out_old)
-            self.transitioning = False
-            if self.old_img:
-                self.old_img = None
+        self._stop_transition()
 
         self.manual_mode = True
-        prev_index = (self.current_index - 1) % len(self.images)
+        prev_index = self.step_index(-1)
         path = self.images[prev_index]
         self.current_index = prev_index
+        self.detached = 0
+        self.direction = -1
         
         # 删除旧的当前精灵
         self.current = self._safe_delete_sprite(self.current, "当前精灵")
         
         self.current = self.draw_sigle_pic(path)
+        self.start_animation()
+        self.schedule_prefetch()
+        self.update_progress()
 
     def exit_thumbnail_mode(self):
         self.thumbnail_mode = False
         self.manual_mode = False
+        self.hide_thumbnails()
+        if not self.images:
+            return
         self.current_index = self.thumbnail_page
+        self.detached = 0
         if self.current_index >= len(self.images):
             self.current_index = 0
         path = self.images[self.current_index]
         
-        # 只有在需要时才删除当前精灵并重新加载
-        if self.current and hasattr(self.current, 'delete'):
-            try:
-                self.current.delete()
-            except Exception as e:
-                print(f"删除当前 sprite 出错: {e}")
+        # 回收当前精灵并重新加载
+        self.current = self._safe_delete_sprite(self.current, "当前精灵")
         self.current = self.draw_sigle_pic(path)
-        self._cleanup_thumbnails()
+        self.start_animation()
+        self.direction = 1
+        self.schedule_prefetch()
+        self.update_progress()
 
     def _cleanup_thumbnails(self):
         """清理缩略图资源"""
@@ -0,0 +1,8 @@
+# 测试直接导入仓库根目录下的模块；磁盘缓存写到临时目录，不影响用户的缓存
+import os
+import sys
+import tempfile
+
+os.environ['PICVIEW_CACHE_DIR'] = tempfile.mkdtemp(prefix='picview-test-')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,37 @@
+from animated import ring_layout, source_frame_bytes
+
+MB = 1024 * 1024
+
+def held_bytes(slots, width, height):
+    # 纹理环 + 已解码队列 + 解码线程手上的一帧
+    return (2 * slots + 1) * width * height * 4
+
+def test_small_frames_use_full_ring():
+    assert ring_layout(100, 100, budget=64 * MB, max_slots=4) == (4, 100, 100)
+
+def test_ring_shrinks_slots_before_frames():
+    slots, width, height = ring_layout(1920, 1080, budget=64 * MB, max_slots=4)
+    assert (width, height) == (1920, 1080)
+    assert slots == 3
+    assert held_bytes(slots, width, height) <= 64 * MB
+
+def test_large_frames_are_scaled_into_budget():
+    for size in [(3840, 2160), (7680, 4320), (1000, 20000)]:
+        slots, width, height = ring_layout(*size, budget=64 * MB, max_slots=4)
+        assert slots == 2
+        assert held_bytes(slots, width, height) <= 64 * MB
+        # 保持宽高比
+        assert abs(width / height - size[0] / size[1]) < 0.01 * size[0] / size[1]
+
+def test_source_frame_counts_palette_expansion():
+    assert source_frame_bytes(100, 50, 'RGBA') == 100 * 50 * 4
+    assert source_frame_bytes(100, 50, 'RGB') == 100 * 50 * 4
+    # 调色板帧缩放前先展开为RGBA
+    assert source_frame_bytes(100, 50, 'P') == 2 * 100 * 50 * 4
+
+def test_source_frame_reduces_ring_budget():
+    # 4K源帧约33MB，剩余预算放不下1080p帧的双缓冲，帧尺寸随之缩小
+    budget = 64 * MB - source_frame_bytes(3840, 2160, 'RGBA')
+    slots, width, height = ring_layout(1920, 1080, budget=budget, max_slots=4)
+    assert slots == 2
+    assert held_bytes(slots, width, height) + source_frame_bytes(3840, 2160, 'RGBA') <= 64 * MB
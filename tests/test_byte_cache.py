@@ -0,0 +1,78 @@
+from byte_cache import ByteLRU
+
+def make(budget=100):
+    evicted = []
+    cache = ByteLRU(budget, on_evict=lambda key, value: evicted.append(key))
+    return cache, evicted
+
+def test_put_tracks_bytes_and_replaces_old_value():
+    cache, evicted = make()
+    cache.put('a', 1, 30)
+    cache.put('b', 2, 20)
+    assert cache.total_bytes == 50
+    cache.put('a', 3, 10)
+    assert evicted == ['a']
+    assert cache['a'] == 3
+    assert cache.total_bytes == 30
+    assert list(cache) == ['b', 'a']
+
+def test_trim_evicts_oldest_until_within_budget():
+    cache, evicted = make(100)
+    for key in 'abcd':
+        cache.put(key, key, 40)
+    assert cache.trim() == 2
+    assert evicted == ['a', 'b']
+    assert list(cache) == ['c', 'd']
+    assert cache.total_bytes == 80
+    # 不超预算时不淘汰
+    assert cache.trim() == 0
+
+def test_touch_moves_entry_to_most_recent():
+    cache, evicted = make(100)
+    for key in 'abc':
+        cache.put(key, key, 40)
+    cache.touch('a')
+    cache.trim()
+    assert evicted == ['b']
+    assert list(cache) == ['c', 'a']
+
+def test_protected_entries_are_skipped():
+    cache, evicted = make(100)
+    for key in 'abc':
+        cache.put(key, key, 40)
+    cache.trim(protected={'a', 'b'})
+    assert evicted == ['c']
+    assert cache.total_bytes == 80
+
+def test_protected_entries_may_exceed_budget():
+    cache, evicted = make(50)
+    cache.put('a', 'a', 40)
+    cache.put('b', 'b', 40)
+    assert cache.trim(protected={'a', 'b'}) == 0
+    assert cache.total_bytes == 80
+
+def test_oversized_entry_is_evicted_unless_protected():
+    cache, evicted = make(50)
+    cache.put('big', 'big', 80)
+    assert cache.trim(protected={'big'}) == 0
+    assert 'big' in cache
+    assert cache.trim() == 1
+    assert evicted == ['big']
+    assert cache.total_bytes == 0
+
+def test_discard_and_clear_release_everything():
+    cache, evicted = make()
+    cache.put('a', 1, 10)
+    cache.put('b', 2, 20)
+    assert cache.discard('a') == 1
+    cache.clear()
+    assert evicted == ['a', 'b']
+    assert cache.total_bytes == 0 and not cache.sizes
+
+def test_on_evict_errors_do_not_break_accounting():
+    def fail(key, value):
+        raise RuntimeError("boom")
+    cache = ByteLRU(10, on_evict=fail)
+    cache.put('a', 1, 20)
+    assert cache.trim() == 1
+    assert cache.total_bytes == 0
@@ -0,0 +1,127 @@
+import pytest
+from PIL import Image
+
+from decode import (fit_size, fits_window, decode_request_size, reduce_factor, estimate_decode_bytes,
+                    estimate_file_bytes, open_reduced, ImageTooLarge)
+
+def test_fit_size_keeps_aspect_ratio():
+    assert fit_size(6000, 4000, 1920, 1080) == (1620, 1080)
+    assert fit_size(4000, 6000, 1920, 1080) == (720, 1080)
+    assert fit_size(1920, 1080, 1920, 1080) == (1920, 1080)
+    # 小图放大到目标区域
+    assert fit_size(100, 50, 1920, 1080) == (1920, 960)
+
+def test_fit_size_never_returns_zero():
+    assert fit_size(100000, 1, 100, 100) == (100, 1)
+    assert fit_size(1, 100000, 100, 100) == (1, 100)
+
+def test_fits_window_allows_rounding():
+    assert fits_window(1620, 1080, 1920, 1080)
+    assert fits_window(1619, 1080, 1920, 1080)
+    assert not fits_window(1500, 1000, 1920, 1080)
+
+def test_request_size_and_reduce_factor():
+    assert decode_request_size(6000, 4000, 1920, 1080, oversample=2.0) == (3240, 2160)
+    assert reduce_factor(6000, 4000, 3240, 2160) == 1
+    assert reduce_factor(8000, 6000, 3240, 2160) == 2
+    assert reduce_factor(100, 100, 3240, 2160) == 1
+
+def test_estimate_decode_bytes():
+    # RGB按4字节存储：解码结果 + reduce结果，RGBA转换在缩放之后进行
+    assert estimate_decode_bytes(1000, 1000, 'RGB', 1) == 4_000_000
+    assert estimate_decode_bytes(1000, 1000, 'RGB', 2) == 4_000_000 + 1_000_000
+    # 调色板图像缩小前先展开为RGBA
+    assert estimate_decode_bytes(1000, 1000, 'P', 2) == 1_000_000 + 4_000_000 + 1_000_000
+    assert estimate_decode_bytes(1000, 1000, 'P', 1) == 1_000_000 + 4_000_000
+    assert estimate_decode_bytes(1000, 1000, 'I;16', 1) == 2_000_000 + 4_000_000
+
+def test_jpeg_draft_shrinks_estimate(tmp_path):
+    path = str(tmp_path / 'big.jpg')
+    Image.new('RGB', (4000, 3000), 'gray').save(path)
+    full = estimate_file_bytes(path, 4000, 3000)
+    reduced = estimate_file_bytes(path, 500, 375)
+    assert reduced * 10 < full
+    with open_reduced(path, 500, 375) as img:
+        # RGB保持解码模式，缩放后再转换
+        assert img.mode == 'RGB'
+        assert img.width >= 500 and img.width < 4000
+
+def test_other_modes_are_converted_at_decode(tmp_path):
+    path = str(tmp_path / 'p.png')
+    Image.new('P', (400, 300)).save(path)
+    with open_reduced(path, 100, 75) as img:
+        assert img.mode == 'RGBA'
+        assert img.size == (200, 150)
+
+def test_too_large_is_rejected(tmp_path, monkeypatch):
+    import decode
+    path = str(tmp_path / 'a.png')
+    Image.new('RGB', (1000, 1000)).save(path)
+    monkeypatch.setattr(decode, 'DECODE_JOB_CAP_MB', 1)
+    with pytest.raises(ImageTooLarge):
+        open_reduced(path, 1000, 1000)
+
+def test_over_cap_falls_back_to_large_image_mode(tmp_path, monkeypatch):
+    import decode
+    path = str(tmp_path / 'big.jpg')
+    Image.new('RGB', (4000, 3000), 'gray').save(path)
+    # 超采样时需要完整解码(48MB)，不超采样时按1/2解码(12MB)
+    monkeypatch.setattr(decode, 'DECODE_JOB_CAP_MB', 20)
+    with open_reduced(path, 2000, 1500) as img:
+        assert img.size == (2000, 1500)
+    # 仍超过时按draft最小比例解码，尺寸小于目标区域
+    monkeypatch.setattr(decode, 'DECODE_JOB_CAP_MB', 5)
+    assert estimate_file_bytes(path, 2000, 1500) < 5 * 1024 * 1024
+    with open_reduced(path, 2000, 1500) as img:
+        assert img.size == (500, 375)
+
+def test_gate_counts_admitted_not_waiting():
+    import threading
+    from decode import MemoryGate
+    gate = MemoryGate(100)
+    gate.acquire(60)
+    waiter = threading.Thread(target=gate.acquire, args=(60,))
+    waiter.start()
+    waiter.join(0.2)
+    # 等待准入的任务不计入正在解码的数量
+    assert (gate.in_use, gate.active) == (60, 1)
+    gate.release(60)
+    waiter.join(30)
+    assert (gate.in_use, gate.active) == (60, 1)
+    gate.release(60)
+    assert (gate.in_use, gate.active) == (0, 0)
+
+def _hold_shared_gate(cond, counter, acquired, done):
+    from decode import decode_gate
+    decode_gate.attach(cond, counter)
+    decode_gate.acquire(60)
+    acquired.set()
+    done.wait()
+    decode_gate.release(60)
+
+def test_shared_gate_counts_other_processes():
+    import multiprocessing
+    import threading
+    from decode import MemoryGate
+    ctx = multiprocessing.get_context('spawn')
+    gate = MemoryGate(100)
+    acquired, done = ctx.Event(), ctx.Event()
+    proc = ctx.Process(target=_hold_shared_gate, args=(*gate.share(ctx), acquired, done))
+    proc.start()
+    try:
+        assert acquired.wait(30)
+        assert (gate.in_use, gate.active) == (60, 1)
+        # 子进程占用期间，本进程超出预算的任务需要等待
+        entered = threading.Event()
+        waiter = threading.Thread(target=lambda: (gate.acquire(60), entered.set()))
+        waiter.start()
+        assert not entered.wait(0.2)
+        done.set()
+        assert entered.wait(30)
+        waiter.join()
+        assert gate.active == 1
+        gate.release(60)
+        assert (gate.in_use, gate.active) == (0, 0)
+    finally:
+        done.set()
+        proc.join(30)
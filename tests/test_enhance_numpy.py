@@ -0,0 +1,55 @@
+import pytest
+from PIL import Image, ImageEnhance, ImageFilter
+
+np = pytest.importorskip('numpy')
+
+from config import IMAGE_ENHANCE
+from decode import as_rgba
+from enhance_numpy import enhance, ENGINE_TOLERANCE
+from render_core import UNSHARP
+
+def fixed_image(size=(320, 240), seed=1234):
+    """确定性的测试图：渐变、强噪声通道和噪声透明通道"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    noise = lambda sigma: np.clip(rng.normal(128, sigma, (height, width)), 0, 255).astype(np.uint8)
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)[None, :].repeat(height, 0)
+    vertical = np.linspace(0, 255, height, dtype=np.uint8)[:, None].repeat(width, 1)
+    return Image.fromarray(np.dstack([gradient, noise(48), vertical, noise(16)]), 'RGBA')
+
+def pil_reference(img):
+    contrasted = ImageEnhance.Contrast(img).enhance(IMAGE_ENHANCE)
+    sharpened = as_rgba(contrasted.filter(ImageFilter.UnsharpMask(*UNSHARP)))
+    return np.asarray(sharpened)[::-1].astype(np.int16)
+
+def numpy_result(img):
+    width, height, data = enhance(img, IMAGE_ENHANCE, *UNSHARP)
+    assert (width, height) == img.size
+    return np.frombuffer(data, np.uint8).reshape(height, width, 4).astype(np.int16)
+
+def test_matches_pil_within_tolerance():
+    img = fixed_image()
+    diff = np.abs(pil_reference(img) - numpy_result(img))
+    assert diff.max() <= ENGINE_TOLERANCE['max_abs']
+    assert diff.mean() <= ENGINE_TOLERANCE['mean_abs']
+
+@pytest.mark.parametrize('mode', ['RGB', 'L'])
+def test_matches_pil_without_alpha(mode):
+    # 解码后的RGB/L图像直接增强，输出为不透明的RGBA
+    img = fixed_image((333, 97)).convert(mode)
+    result = numpy_result(img)
+    assert (result == pil_reference(img)).all()
+    assert (result[..., 3] == 255).all()
+
+def test_alpha_is_sharpened_like_pil():
+    img = fixed_image()
+    expected = pil_reference(img)[..., 3]
+    alpha = numpy_result(img)[..., 3]
+    # PIL的USM会改变透明通道；直接复制原透明通道会相差数十级
+    assert np.abs(expected - np.asarray(img)[::-1, :, 3]).max() > ENGINE_TOLERANCE['max_abs']
+    assert np.abs(expected - alpha).max() <= ENGINE_TOLERANCE['max_abs']
+
+def test_constant_alpha_unchanged():
+    img = fixed_image()
+    img.putalpha(200)
+    assert (numpy_result(img)[..., 3] == 200).all()
@@ -0,0 +1,64 @@
+import random
+
+from playlist import step_target, insert_unplayed, remove_paths
+
+def names(count):
+    return [f'{i}.png' for i in range(count)]
+
+def test_insert_keeps_existing_order_and_prefix():
+    random.seed(1)
+    images = names(6)
+    insert_unplayed(images, ['x.png', 'y.png', 'z.png'], 3)
+    assert images[:3] == names(3)
+    assert [p for p in images if p[0].isdigit()] == names(6)
+    assert sorted(images[3:]) == sorted(names(6)[3:] + ['x.png', 'y.png', 'z.png'])
+
+def test_insert_into_short_list_appends():
+    images = names(2)
+    insert_unplayed(images, ['x.png'], len(images))
+    assert images == names(2) + ['x.png']
+
+def test_remove_before_current_shifts_index_and_page():
+    images = names(6)
+    assert remove_paths(images, {'0.png', '1.png'}, 3, 4) == (1, 2, 0)
+    assert images == ['2.png', '3.png', '4.png', '5.png']
+
+def test_remove_after_current_keeps_index():
+    images = names(4)
+    assert remove_paths(images, {'3.png'}, 1, 3) == (1, 2, 0)
+
+def test_removed_current_points_at_successor():
+    images = names(4)
+    index, _, detached = remove_paths(images, {'2.png'}, 2, 0)
+    assert (index, detached) == (2, 1)
+    assert images[step_target(index, 1, detached)] == '3.png'
+    assert images[step_target(index, -1, detached)] == '1.png'
+
+def test_removed_first_image_does_not_wrap():
+    images = names(4)
+    index, _, detached = remove_paths(images, {'0.png'}, 0, 0)
+    assert (index, detached) == (0, 1)
+    # 手动模式：下一张是原来的第二张，上一张已到开头
+    assert step_target(index, 1, detached) == 0
+    assert step_target(index, -1, detached) == -1
+
+def test_removed_last_image_points_at_predecessor():
+    images = names(4)
+    index, page, detached = remove_paths(images, {'3.png'}, 3, 3)
+    assert (index, page, detached) == (2, 2, -1)
+    assert step_target(index, -1, detached) == 2
+    assert step_target(index, 1, detached) == 3  # 已到末尾
+
+def test_detached_position_survives_later_removals():
+    images = names(5)
+    index, _, detached = remove_paths(images, {'2.png'}, 2, 0)
+    # 原来的后一张也被删除
+    index, _, detached = remove_paths(images, {'3.png', '0.png'}, index, 0, detached)
+    assert images == ['1.png', '4.png']
+    assert images[step_target(index, 1, detached)] == '4.png'
+    assert images[step_target(index, -1, detached)] == '1.png'
+
+def test_remove_everything():
+    images = names(3)
+    assert remove_paths(images, set(images), 1, 2) == (0, 0, 0)
+    assert images == []
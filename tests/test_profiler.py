@@ -0,0 +1,14 @@
+from profiler import percentile
+
+def test_nearest_rank():
+    values = list(range(1, 11))
+    assert percentile(values, 50) == 5
+    assert percentile(values, 90) == 9
+    assert percentile(values, 95) == 10
+    assert percentile(values, 100) == 10
+    assert percentile(values, 0) == 1
+
+def test_small_samples():
+    assert percentile([], 50) == 0.0
+    assert percentile([7], 99) == 7
+    assert percentile([1, 2], 50) == 1
@@ -0,0 +1,27 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_numpy_engine_falls_back_with_warning(tmp_path):
+    # 模拟未安装numpy的打包版本
+    script = ("import sys; sys.modules['numpy'] = None\n"
+              "import config; config.ENHANCE_ENGINE = 'numpy'\n"
+              "import render_core; print(render_core.ENHANCE_SETTINGS)\n")
+    env = dict(os.environ, PICVIEW_CACHE_DIR=str(tmp_path))
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    lines = result.stdout.splitlines()
+    assert "警告: numpy未安装，使用PIL增强引擎" in lines
+    assert lines[-1].startswith('pil|')
+
+def test_preview_matches_full_render_size(tmp_path):
+    from PIL import Image
+    from render_core import render_preview, render_sharpened
+    # 预览和完整渲染降分辨率解码的倍数不同，reduce向上取整，尺寸仍按原图计算
+    path = str(tmp_path / 'a.png')
+    Image.new('RGB', (800, 600), 'red').save(path)
+    preview = render_preview(path, 300, 200)
+    full = render_sharpened(path, 300, 200)
+    assert (preview.width, preview.height) == (full.width, full.height) == (266, 200)
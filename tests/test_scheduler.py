@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+
+from scheduler import JobScheduler, VISIBLE, NEXT, PREFETCH, WARM
+
+class Gate:
+    """阻塞唯一的工作线程，使后续任务停留在队列中"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.started.set()
+        self.release.wait(5)
+        return 'gate'
+
+@pytest.fixture
+def scheduler():
+    s = JobScheduler(workers=1, name="test-job")
+    yield s
+    s.shutdown()
+
+def block(scheduler):
+    gate = Gate()
+    future = scheduler.submit(('gate',), VISIBLE, gate)
+    assert gate.started.wait(5)
+    return gate, future
+
+def test_duplicate_submit_returns_same_future(scheduler):
+    gate, _ = block(scheduler)
+    calls = []
+    first = scheduler.submit(('render', 'a'), PREFETCH, calls.append, 'a')
+    second = scheduler.submit(('render', 'a'), PREFETCH, calls.append, 'a')
+    assert first is second
+    assert scheduler.deduplicated == 1
+    gate.release.set()
+    first.result(5)
+    assert calls == ['a']
+
+def test_jobs_run_in_priority_order(scheduler):
+    gate, _ = block(scheduler)
+    order = []
+    futures = [scheduler.submit(('render', name), priority, order.append, name)
+               for name, priority in (('warm', WARM), ('prefetch', PREFETCH), ('visible', VISIBLE), ('next', NEXT))]
+    gate.release.set()
+    for future in futures:
+        future.result(5)
+    assert order == ['visible', 'next', 'prefetch', 'warm']
+
+def test_duplicate_submit_raises_priority(scheduler):
+    gate, _ = block(scheduler)
+    order = []
+    scheduler.submit(('render', 'b'), PREFETCH, order.append, 'b')
+    late = scheduler.submit(('render', 'a'), WARM, order.append, 'a')
+    scheduler.submit(('render', 'a'), VISIBLE, order.append, 'a')
+    gate.release.set()
+    late.result(5)
+    scheduler.submit(('render', 'c'), WARM, order.append, 'c').result(5)
+    assert order == ['a', 'b', 'c']
+
+def test_reprioritize_moves_queued_job_forward(scheduler):
+    gate, _ = block(scheduler)
+    order = []
+    scheduler.submit(('render', 'b'), PREFETCH, order.append, 'b')
+    future = scheduler.submit(('render', 'a'), WARM, order.append, 'a')
+    assert scheduler.reprioritize(('render', 'a'), VISIBLE)
+    # 优先级不会被降低
+    assert not scheduler.reprioritize(('render', 'a'), WARM)
+    gate.release.set()
+    future.result(5)
+    scheduler.submit(('render', 'c'), WARM, order.append, 'c').result(5)
+    assert order == ['a', 'b', 'c']
+
+def test_reprioritize_never_creates_job(scheduler):
+    assert not scheduler.reprioritize(('render', 'missing'), VISIBLE)
+    assert ('render', 'missing') not in scheduler
+    future = scheduler.submit(('render', 'done'), PREFETCH, lambda: 'ok')
+    assert future.result(5) == 'ok'
+    assert not scheduler.reprioritize(('render', 'done'), VISIBLE)
+    assert ('render', 'done') not in scheduler
+    assert scheduler.completed == 1
+
+def test_reprioritize_running_job_is_noop(scheduler):
+    gate, future = block(scheduler)
+    assert not scheduler.reprioritize(('gate',), VISIBLE)
+    gate.release.set()
+    assert future.result(5) == 'gate'
+
+def test_cancel_queued_job(scheduler):
+    gate, _ = block(scheduler)
+    calls = []
+    future = scheduler.submit(('render', 'a'), PREFETCH, calls.append, 'a')
+    assert scheduler.cancel(('render', 'a'))
+    assert future.cancelled()
+    assert ('render', 'a') not in scheduler
+    gate.release.set()
+    scheduler.submit(('render', 'b'), PREFETCH, calls.append, 'b').result(5)
+    assert calls == ['b']
+    assert scheduler.cancelled == 1
+
+def test_cancel_running_job_fails(scheduler):
+    gate, future = block(scheduler)
+    assert not scheduler.cancel(('gate',))
+    gate.release.set()
+    assert future.result(5) == 'gate'
+
+def test_cancel_kind_keeps_selected(scheduler):
+    gate, _ = block(scheduler)
+    thumbs = {name: scheduler.submit(('thumb', name), PREFETCH, lambda: None) for name in 'abc'}
+    render = scheduler.submit(('render', 'a'), PREFETCH, lambda: 'frame')
+    scheduler.cancel_kind('thumb', keep=lambda key: key[1] == 'b')
+    assert thumbs['a'].cancelled() and thumbs['c'].cancelled()
+    assert not thumbs['b'].cancelled()
+    gate.release.set()
+    assert render.result(5) == 'frame'
+    thumbs['b'].result(5)
+
+def test_resubmit_after_cancel_creates_new_job(scheduler):
+    gate, _ = block(scheduler)
+    first = scheduler.submit(('render', 'a'), PREFETCH, lambda: 1)
+    scheduler.cancel(('render', 'a'))
+    second = scheduler.submit(('render', 'a'), PREFETCH, lambda: 2)
+    assert second is not first
+    gate.release.set()
+    assert second.result(5) == 2
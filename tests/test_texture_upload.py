@@ -0,0 +1,22 @@
+import ctypes
+
+from texture_upload import row_view
+
+WIDTH = 3
+
+def rows_of(data, first_row, rows):
+    return bytes(row_view(data, WIDTH, first_row, rows))
+
+def test_bytes_rows():
+    data = bytes(range(WIDTH * 4 * 5))
+    assert rows_of(data, 1, 2) == data[WIDTH * 4:WIDTH * 4 * 3]
+    # 整帧上传不复制
+    assert row_view(data, WIDTH, 0, 5) is data
+
+def test_ctypes_rows_share_memory():
+    size = WIDTH * 4 * 5
+    data = (ctypes.c_ubyte * size)(*range(size))
+    view = row_view(data, WIDTH, 2, 3)
+    assert bytes(view) == bytes(data)[WIDTH * 4 * 2:]
+    data[WIDTH * 4 * 2] = 255
+    assert view[0] == 255
@@ -0,0 +1,14 @@
+from thumb_atlas import pad_rows
+
+def test_pad_rows_places_data_bottom_left_and_clears_gutter():
+    width, height = 2, 2
+    data = bytes(range(1, width * height * 4 + 1))
+    cell = bytes(pad_rows(data, width, height, 3, 3))
+    stride = 3 * 4
+    assert len(cell) == stride * 3
+    assert cell[0:8] == data[0:8]
+    assert cell[stride:stride + 8] == data[8:16]
+    # 右侧间隙列和顶部间隙行全部透明
+    assert cell[8:stride] == bytes(4)
+    assert cell[stride + 8:2 * stride] == bytes(4)
+    assert cell[2 * stride:] == bytes(stride)
@@ -0,0 +1,42 @@
+import os
+
+from PIL import Image
+
+import warm_cache
+from frame_store import frame_store, frame_key
+from render_core import ENHANCE_SETTINGS
+
+SIZE = (64, 48)
+
+def make_images(folder, count):
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"img{i}.png")
+        Image.new('RGB', (120, 90), (i * 40, 100, 200)).save(path)
+        paths.append(path)
+    return paths
+
+def test_corrupt_file_is_undecodable(tmp_path):
+    path = tmp_path / 'broken.jpg'
+    path.write_bytes(b'not an image')
+    _, _, _, error, undecodable = warm_cache.warm_image(str(path), [SIZE])
+    assert error and undecodable
+
+def test_missing_file_is_not_blacklisted(tmp_path):
+    # 普通OSError（文件暂时不可读）下次仍会重试
+    _, _, _, error, undecodable = warm_cache.warm_image(str(tmp_path / 'gone.png'), [SIZE])
+    assert error.startswith('FileNotFoundError') and not undecodable
+
+def test_estimate_uses_largest_target(tmp_path):
+    path = make_images(str(tmp_path), 1)[0]
+    small = warm_cache.estimate_job_bytes(path, [SIZE], thumbnails=False)
+    assert small > 0
+    assert warm_cache.estimate_job_bytes(str(tmp_path / 'gone.png'), [SIZE], thumbnails=False) == 0
+
+def test_warm_within_tiny_budget_completes(tmp_path):
+    paths = make_images(str(tmp_path), 4)
+    # 预算小于单个任务时退化为逐个执行，仍然全部完成
+    assert warm_cache.warm(paths, [SIZE], thumbnails=False, workers=2, interval=60, budget_mb=0)
+    if frame_store is not None:
+        for path in paths:
+            assert frame_store.contains(frame_key(path, *SIZE, ENHANCE_SETTINGS))
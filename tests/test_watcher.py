@@ -0,0 +1,84 @@
+import os
+
+from PIL import Image
+
+from watcher import PollingWatcher
+
+def make_image(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new('RGB', (4, 4), 'red').save(path)
+    return str(path)
+
+def bump_mtime(directory, delta=10):
+    st = os.stat(directory)
+    os.utime(directory, ns=(st.st_atime_ns, st.st_mtime_ns + delta * 10**9))
+
+def snapshot(root):
+    watcher = PollingWatcher(str(root))
+    watcher._snapshot(watcher.root, announce=False)
+    return watcher
+
+def test_existing_images_are_not_reported(tmp_path):
+    make_image(tmp_path / 'a.png')
+    watcher = snapshot(tmp_path)
+    watcher._poll()
+    assert watcher.drain() == []
+
+def test_new_file_reported_after_size_settles(tmp_path):
+    watcher = snapshot(tmp_path)
+    path = tmp_path / 'new.png'
+    path.write_bytes(b'x' * 10)
+    (tmp_path / 'notes.txt').write_text('x')
+    bump_mtime(tmp_path)
+    watcher._poll()
+    assert watcher.drain() == []
+    # 仍在写入：大小变化，继续等待
+    with open(path, 'ab') as f:
+        f.write(b'x' * 10)
+    watcher._poll()
+    assert watcher.drain() == []
+    watcher._poll()
+    assert watcher.drain() == [('add', str(path))]
+    watcher._poll()
+    assert watcher.drain() == []
+
+def test_removed_file_and_settling_file(tmp_path):
+    old = make_image(tmp_path / 'old.png')
+    watcher = snapshot(tmp_path)
+    new = tmp_path / 'new.png'
+    new.write_bytes(b'x')
+    bump_mtime(tmp_path)
+    watcher._poll()
+    os.remove(old)
+    os.remove(new)
+    bump_mtime(tmp_path, 20)
+    watcher._poll()
+    # 还没报告过的新文件被删除时不产生事件
+    assert watcher.drain() == [('remove', old)]
+
+def test_new_subdirectory_reports_its_images(tmp_path):
+    watcher = snapshot(tmp_path)
+    path = make_image(tmp_path / 'sub' / 'deep' / 'a.png')
+    bump_mtime(tmp_path)
+    watcher._poll()
+    watcher._poll()
+    assert watcher.drain() == [('add', path)]
+
+def test_removed_subtree(tmp_path):
+    make_image(tmp_path / 'sub' / 'a.png')
+    make_image(tmp_path / 'sub' / 'deep' / 'b.png')
+    watcher = snapshot(tmp_path)
+    settling = tmp_path / 'sub' / 'deep' / 'c.png'
+    settling.write_bytes(b'x')
+    bump_mtime(tmp_path / 'sub' / 'deep')
+    watcher._poll()
+    for name in ('a.png', 'deep/b.png', 'deep/c.png'):
+        os.remove(tmp_path / 'sub' / name)
+    os.rmdir(tmp_path / 'sub' / 'deep')
+    os.rmdir(tmp_path / 'sub')
+    bump_mtime(tmp_path)
+    watcher._poll()
+    # 整个子树只报告一次，其中文件不再单独报告
+    assert watcher.drain() == [('remove_tree', str(tmp_path / 'sub'))]
+    assert not any(d.startswith(str(tmp_path / 'sub')) for d in watcher.dirs)
+    assert watcher.settling == {}
@@ -0,0 +1,142 @@
+# 纹理流式上传：预渲染完成的帧按行分块写入预先分配的纹理，后台推进的上传每帧最多占用UPLOAD_BUDGET_MS毫秒
+# 需要立即显示而上传尚未完成时（finish），剩余部分同步上传，这一帧的耗时不受预算限制
+# 分块通过from_buffer直接引用ctypes缓冲（NumPy输出、共享内存、帧缓存映射），不复制像素数据；
+# PIL渲染输出的bytes是只读的，无法取得可写视图，按块复制（每块不超过一次上传的行数）
+import time
+import ctypes
+from collections import OrderedDict
+import pyglet
+from config import *
+from profiler import profiler
+
+# 第一次上传时还没有耗时数据，按此行数试探
+_INITIAL_ROWS = 64
+# 每帧至少推进的行数，保证预算很小时上传也能完成
+_MIN_ROWS = 16
+
+def row_view(data, width, first_row, rows):
+    """从第first_row行开始、共rows行RGBA像素的数据，可写缓冲返回ctypes视图（调用方需保持data存活）"""
+    stride = width * 4
+    start = first_row * stride
+    size = stride * rows
+    if isinstance(data, bytes):
+        if start == 0 and size == len(data):
+            return data
+        return memoryview(data)[start:start + size].tobytes()
+    return (ctypes.c_ubyte * size).from_buffer(data, start)
+
+class TextureUpload:
+    """一帧的分块上传任务：创建纹理时只分配显存不填充，之后逐块写入行数据"""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.width = frame.width
+        self.height = frame.height
+        self.texture = pyglet.image.Texture.create(frame.width, frame.height, blank_data=False)
+        self.next_row = 0
+
+    @property
+    def done(self):
+        return self.next_row >= self.height
+
+    def upload_rows(self, rows):
+        """上传接下来的rows行（帧数据已垂直翻转，第0行即纹理底部），全部完成后释放帧"""
+        rows = min(rows, self.height - self.next_row)
+        view = row_view(self.frame.data, self.width, self.next_row, rows)
+        self.texture.blit_into(pyglet.image.ImageData(self.width, rows, 'RGBA', view), 0, self.next_row, 0)
+        del view
+        self.next_row += rows
+        if self.done:
+            self.frame.release()
+            self.frame = None
+
+    def finish(self):
+        """一次上传剩余的所有行，返回纹理"""
+        if not self.done:
+            self.upload_rows(self.height - self.next_row)
+        return self.texture
+
+    def cancel(self):
+        if self.frame is not None:
+            self.frame.release()
+            self.frame = None
+        self.texture.delete()
+
+class StreamingUploader:
+    """主线程上传队列：每帧在预算时间内按顺序推进上传，根据测得的每字节耗时调整分块行数
+
+    计时的是提交glTexSubImage2D的CPU耗时，驱动异步传输的部分不计入。
+    """
+
+    def __init__(self, on_complete, budget_ms=UPLOAD_BUDGET_MS):
+        self.on_complete = on_complete  # on_complete(key, texture)
+        self.budget = budget_ms / 1000
+        self.jobs = OrderedDict()  # key -> TextureUpload
+        self.seconds_per_byte = None
+        self._scheduled = False
+
+    def __contains__(self, key):
+        return key in self.jobs
+
+    def add(self, key, frame):
+        """加入上传队列，从下一帧开始分块上传"""
+        if key in self.jobs:
+            frame.release()
+            return
+        self.jobs[key] = TextureUpload(frame)
+        if not self._scheduled:
+            pyglet.clock.schedule(self._step)
+            self._scheduled = True
+
+    def _rows_within(self, job, seconds):
+        if self.seconds_per_byte is None:
+            return _INITIAL_ROWS
+        return max(_MIN_ROWS, int(seconds / (self.seconds_per_byte * job.width * 4)))
+
+    def _step(self, dt):
+        deadline = time.perf_counter() + self.budget
+        while self.jobs:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            key, job = next(iter(self.jobs.items()))
+            rows = min(self._rows_within(job, remaining), job.height - job.next_row)
+            start = time.perf_counter()
+            with profiler.stage('render.upload_chunk'):
+                job.upload_rows(rows)
+            cost = (time.perf_counter() - start) / (rows * job.width * 4)
+            # 指数平均，避免单次抖动导致分块大小剧烈变化
+            self.seconds_per_byte = cost if self.seconds_per_byte is None else \
+                0.8 * self.seconds_per_byte + 0.2 * cost
+            if job.done:
+                del self.jobs[key]
+                self.on_complete(key, job.texture)
+        if not self.jobs:
+            pyglet.clock.unschedule(self._step)
+            self._scheduled = False
+
+    def finish(self, key):
+        """需要立即显示时同步上传剩余部分（不受UPLOAD_BUDGET_MS限制），返回纹理；不在队列中返回None"""
+        job = self.jobs.pop(key, None)
+        if job is None:
+            return None
+        with profiler.stage('render.upload'):
+            return job.finish()
+
+    def memory(self):
+        """上传中的纹理和尚未释放的帧缓冲 (纹理字节数, 缓冲字节数, 任务数)"""
+        textures = buffers = 0
+        for job in self.jobs.values():
+            nbytes = job.width * job.height * 4
+            textures += nbytes
+            if job.frame is not None:
+                buffers += nbytes
+        return textures, buffers, len(self.jobs)
+
+    def cancel_all(self):
+        for job in self.jobs.values():
+            job.cancel()
+        self.jobs.clear()
+        if self._scheduled:
+            pyglet.clock.unschedule(self._step)
+            self._scheduled = False
@@ -0,0 +1,91 @@
+# 缩略图纹理图集：多个缩略图共享一张大纹理，并通过同一个Batch绘制
+# 图集按THUMBNAIL_SIZE划分固定格子，页面淘汰时归还格子供后续缩略图复用
+import ctypes
+import pyglet
+from pyglet import gl
+from config import *
+
+# 格子之间保留的透明间隙，避免线性过滤时采样到相邻缩略图
+GUTTER = 2
+
+def pad_rows(data, width, height, cell_width, cell_height):
+    """把width x height的RGBA数据放在cell_width x cell_height缓冲的左下角，其余部分填0"""
+    row = width * 4
+    stride = cell_width * 4
+    cell = (ctypes.c_ubyte * (stride * cell_height))()
+    dst = memoryview(cell).cast('B')
+    src = memoryview(data).cast('B')
+    for r in range(height):
+        dst[r * stride:r * stride + row] = src[r * row:(r + 1) * row]
+    return cell
+
+class ThumbnailAtlas:
+    """固定格子的缩略图图集，格子用完时自动增加新的图集纹理"""
+
+    def __init__(self, cell_size=THUMBNAIL_SIZE, atlas_size=THUMBNAIL_ATLAS_SIZE):
+        max_size = gl.GLint()
+        gl.glGetIntegerv(gl.GL_MAX_TEXTURE_SIZE, max_size)
+        self.cell_width = cell_size[0] + GUTTER
+        self.cell_height = cell_size[1] + GUTTER
+        self.atlas_size = max(min(atlas_size, max_size.value), self.cell_width, self.cell_height)
+        self.textures = []
+        self.free_slots = []
+        self.batch = pyglet.graphics.Batch()
+
+    def _grow(self):
+        """新建一张图集纹理，并把其中的格子加入空闲列表"""
+        texture = pyglet.image.Texture.create(self.atlas_size, self.atlas_size)
+        index = len(self.textures)
+        self.textures.append(texture)
+        columns = self.atlas_size // self.cell_width
+        rows = self.atlas_size // self.cell_height
+        # 倒序加入，pop时优先使用靠前的格子
+        for row in reversed(range(rows)):
+            for col in reversed(range(columns)):
+                self.free_slots.append((index, col * self.cell_width, row * self.cell_height))
+
+    def add(self, width, height, data):
+        """上传缩略图数据到空闲格子，返回 (纹理区域, 格子)
+
+        整个格子（含间隙）一起上传，缩略图以外的部分为透明，复用的格子不会残留上一张缩略图的边缘。
+        """
+        if not self.free_slots:
+            self._grow()
+        slot = self.free_slots.pop()
+        index, x, y = slot
+        texture = self.textures[index]
+        cell = pad_rows(data, width, height, self.cell_width, self.cell_height)
+        texture.blit_into(pyglet.image.ImageData(self.cell_width, self.cell_height, 'RGBA', cell), x, y, 0)
+        return texture.get_region(x, y, width, height), slot
+
+    def release(self, slot):
+        """归还格子，纹理内容会被下一个缩略图覆盖"""
+        self.free_slots.append(slot)
+
+    @property
+    def capacity(self):
+        return len(self.textures) * (self.atlas_size // self.cell_width) * (self.atlas_size // self.cell_height)
+
+    @property
+    def texture_bytes(self):
+        """已分配的图集纹理字节数（RGBA8），与格子是否占用无关"""
+        return len(self.textures) * self.atlas_size * self.atlas_size * 4
+
+    def delete(self):
+        for texture in self.textures:
+            texture.delete()
+        self.textures.clear()
+        self.free_slots.clear()
+
+_atlas = None
+
+def get_thumbnail_atlas():
+    """懒加载图集，需要在有OpenGL上下文的主线程调用"""
+    global _atlas
+    if _atlas is None:
+        _atlas = ThumbnailAtlas()
+    return _atlas
+
+def thumbnail_atlas_bytes():
+    """图集纹理占用的显存字节数，图集尚未创建时为0（不会触发创建）"""
+    return _atlas.texture_bytes if _atlas is not None else 0
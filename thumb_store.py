@@ -0,0 +1,127 @@
+# 持久化缩略图存储：所有缩略图打包保存在一个SQLite文件中，跨运行复用
+# 键由路径、修改时间、文件大小和THUMBNAIL_SIZE计算，源文件变化后自动失效
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from config import *
+
+def thumbnail_key(path, thumb_size=THUMBNAIL_SIZE):
+    """根据文件内容标识计算缩略图键，文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{thumb_size[0]}x{thumb_size[1]}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+class ThumbnailStore:
+    """带容量上限和LRU淘汰的缩略图打包存储"""
+
+    def __init__(self, db_path, max_bytes, compress_level=THUMBNAIL_STORE_COMPRESS):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self.lock = threading.Lock()
+        self.conn = None
+        self.total_bytes = 0
+
+    def _connect(self):
+        """懒加载数据库连接，首次使用时才打开文件"""
+        if self.conn is not None:
+            return self.conn
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""CREATE TABLE IF NOT EXISTS thumbs (
+            key TEXT PRIMARY KEY,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            nbytes INTEGER NOT NULL,
+            last_used REAL NOT NULL,
+            data BLOB NOT NULL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS thumbs_lru ON thumbs(last_used)")
+        self.total_bytes = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM thumbs").fetchone()[0]
+        self.conn = conn
+        return conn
+
+    def get(self, path):
+        """读取缩略图，返回 (path, RGBA数据, (宽, 高))，未命中返回None"""
+        key = thumbnail_key(path)
+        if key is None:
+            return None
+        try:
+            with self.lock:
+                conn = self._connect()
+                row = conn.execute("SELECT width, height, data FROM thumbs WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE thumbs SET last_used = ? WHERE key = ?", (time.time(), key))
+                conn.commit()
+            width, height, data = row
+            if self.compress_level:
+                data = zlib.decompress(data)
+            return path, data, (width, height)
+        except (sqlite3.Error, zlib.error) as e:
+            print(f"读取缩略图缓存失败: {e}")
+            return None
+
+    def contains(self, path):
+        """判断缩略图是否已缓存（不更新使用时间）"""
+        key = thumbnail_key(path)
+        if key is None:
+            return False
+        try:
+            with self.lock:
+                row = self._connect().execute("SELECT 1 FROM thumbs WHERE key = ?", (key,)).fetchone()
+            return row is not None
+        except sqlite3.Error:
+            return False
+
+    def put(self, path, data, size):
+        """写入缩略图，超出容量时按最近使用时间淘汰"""
+        key = thumbnail_key(path)
+        if key is None:
+            return
+        blob = zlib.compress(data, self.compress_level) if self.compress_level else bytes(data)
+        try:
+            with self.lock:
+                conn = self._connect()
+                old = conn.execute("SELECT nbytes FROM thumbs WHERE key = ?", (key,)).fetchone()
+                if old:
+                    self.total_bytes -= old[0]
+                conn.execute("INSERT OR REPLACE INTO thumbs VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, size[0], size[1], len(blob), time.time(), blob))
+                self.total_bytes += len(blob)
+                if self.total_bytes > self.max_bytes:
+                    self._evict(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"写入缩略图缓存失败: {e}")
+
+    def _evict(self, conn):
+        """淘汰最久未使用的缩略图，直到容量降到上限的90%"""
+        target = self.max_bytes * 0.9
+        rows = conn.execute("SELECT key, nbytes FROM thumbs ORDER BY last_used").fetchall()
+        evicted = []
+        for key, nbytes in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= nbytes
+        conn.executemany("DELETE FROM thumbs WHERE key = ?", evicted)
+        print(f"缩略图缓存淘汰: {len(evicted)} 项")
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+thumbnail_store = ThumbnailStore(
+    os.path.join(CACHE_DIR, 'thumbnails.db'),
+    THUMBNAIL_STORE_MAX_MB * 1024 * 1024
+) if THUMBNAIL_STORE else None
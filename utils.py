@@ -1,75 +1,23 @@
 import os
 import subprocess
-from glob import glob
 import math
+import importlib.util
 
-# 条件导入psutil
-try:
-    import psutil
-    PSUTIL_AVAILABLE = True
-    process = psutil.Process()
-except ImportError:
-    PSUTIL_AVAILABLE = False
-    print("警告: psutil未安装，内存监控功能将被禁用")
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif')
 
-def print_memory(slides=None, image_cache=None):
-    """打印详细的内存使用情况并执行内存清理"""
-    if not PSUTIL_AVAILABLE:
-        return
-        
-    try:
- 
-        # 获取当前进程的内存信息
-        mem_info = process.memory_info()
-        vms = mem_info.vms / 1024 / 1024  # 虚拟内存 (MB)
-        rss = mem_info.rss / 1024 / 1024   # 物理内存 (MB)
-        
-        # 获取系统内存信息
-        system_mem = psutil.virtual_memory()
-        available = system_mem.available / 1024 / 1024  # 可用内存 (MB)
-        
-        # 统计缓存和纹理
-        textures = 0
-        valid_images = 0
-        
-        # 如果有image_cache参数，统计纹理
-        if image_cache:
-            for img in image_cache.values():
-                try:
-                    # 安全获取纹理对象
-                    texture = img.get_texture()
-                    if texture:
-                        textures += 1
-                    valid_images += 1
-                except AttributeError:
-                    # 处理没有get_texture方法的对象
-                    pass
-                except Exception as e:
-                    print(f"纹理检测错误: {e}")
-        
-        # 统计缩略图缓存
-        thumbnail_cache_size = 0
-        thumbnail_data_size = 0
-        if slides and hasattr(slides, 'thumbnail_cache'):
-            thumbnail_cache_size = len(slides.thumbnail_cache)
-        if slides and hasattr(slides, 'thumbnail_data_cache'):
-            thumbnail_data_size = len(slides.thumbnail_data_cache)
-        
-        # 计算估算的纹理内存 (假设每个纹理平均10MB)
-        estimated_texture_mem = textures * 10
-        
-        print(f"=== 内存使用情况 ===")
-        print(f"虚拟内存: {vms:.2f} MB | 物理内存: {rss:.2f} MB")
-        print(f"系统可用内存: {available:.2f} MB")
-        if image_cache:
-            print(f"图片缓存: {valid_images}/{len(image_cache)} | 活跃纹理: {textures}")
-        print(f"缩略图缓存: {thumbnail_cache_size} | 缩略图数据: {thumbnail_data_size}")
-        if textures > 0:
-            print(f"估算纹理内存: {estimated_texture_mem} MB")
-        
-            
-    except Exception as e:
-        print(f"内存监控出错: {e}")
+# psutil只用于读取进程和系统内存，启动时只检查是否安装，第一次统计内存时才导入
+PSUTIL_AVAILABLE = importlib.util.find_spec('psutil') is not None
+if not PSUTIL_AVAILABLE:
+    print("警告: psutil未安装，内存统计中不包含进程和系统内存")
+process = None
+
+def current_process():
+    """懒加载psutil并返回当前进程对象，psutil未安装时返回None"""
+    global process
+    if process is None and PSUTIL_AVAILABLE:
+        import psutil
+        process = psutil.Process()
+    return process
 
 def debug_gc_collect(location):
     """带调试信息的GC调用"""
@@ -104,16 +52,21 @@ def choose_folder():
         return None
 
 def validate_folder(path):
-    """验证目录是否包含图片"""
+    """验证目录是否包含图片，找到第一张即返回"""
     if not path or not os.path.isdir(path):
         return False
     try:
-        return any(f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))
-                for f in glob(os.path.join(path, '**/*.*'), recursive=True))
+        from scanner import iter_images
+        return next(iter_images(path), None) is not None
     except Exception as e:
         print(f"目录扫描错误: {e}")
         return False
 
+def find_images(path):
+    """递归查找目录下的所有图片（一次性返回完整列表）"""
+    from scanner import iter_images
+    return list(iter_images(path))
+
 def ease_out_quad(t):
     return t * (2 - t)
 
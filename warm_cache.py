@@ -0,0 +1,224 @@
+# 无窗口的缓存预热：用进程池为目录中的图片预先生成缩略图和全屏增强帧，写入查看器读取的磁盘缓存
+# 用法: python warm_cache.py DIR [--size 1920x1080 ...] [--workers N] [--no-frames] [--no-thumbnails]
+# 已缓存的项目直接跳过，中断后重新运行即从未完成处继续；同一缓存目录同时只允许一个预热进程（适合cron定时运行）
+# 各进程同时解码的估算内存总和不超过DECODE_MEMORY_BUDGET_MB，大图较多时实际并行数会少于进程数
+# 缓存目录为config.CACHE_DIR，可通过环境变量 PICVIEW_CACHE_DIR 指定
+import os
+import sys
+import time
+import signal
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from config import *
+from render_core import ENHANCE_SETTINGS, render_frame, render_thumbnail
+from decode import DECODE_ERRORS, estimate_file_bytes
+from frame_store import frame_store, frame_key
+from thumb_store import thumbnail_store
+from catalog import image_catalog
+from scanner import iter_images
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+def _init_worker():
+    # Ctrl+C由主进程统一处理：取消排队任务后退出，子进程只完成手上的图片
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def warm_image(path, sizes, thumbnails=True):
+    """在子进程中预热一张图片，返回 (路径, 新生成数, 已缓存数, 错误信息, 是否无法解码)
+
+    sizes为查看器窗口尺寸列表；缓存写入都是原子的，任务被中断不会留下损坏的条目。
+    """
+    created = cached = 0
+    try:
+        if thumbnails and thumbnail_store is not None:
+            if thumbnail_store.contains(path):
+                cached += 1
+            else:
+                thumbnail_store.put(*render_thumbnail(path))
+                created += 1
+        for width, height in sizes:
+            if frame_store.contains(frame_key(path, width, height, ENHANCE_SETTINGS)):
+                cached += 1
+            else:
+                render_frame(path, width, height).release()
+                created += 1
+    except Exception as e:
+        return path, created, cached, f"{type(e).__name__}: {e}", isinstance(e, DECODE_ERRORS)
+    return path, created, cached, None, False
+
+def estimate_job_bytes(path, sizes, thumbnails):
+    """按文件头估算预热一张图片时解码的峰值内存（各目标尺寸中最大的一次）；读不到文件头时为0，由子进程报告错误"""
+    targets = list(sizes) + ([THUMBNAIL_SIZE] if thumbnails else [])
+    try:
+        return max(estimate_file_bytes(path, width, height) for width, height in targets)
+    except Exception:
+        return 0
+
+def collect_images(root):
+    """列出需要预热的图片；启用图片目录时增量扫描并跳过已标记失败的文件"""
+    if image_catalog is not None:
+        return list(image_catalog.scan(root))
+    return list(iter_images(root))
+
+def acquire_lock():
+    """在缓存目录上加非阻塞文件锁，已有预热进程在运行时返回None"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    handle = open(os.path.join(CACHE_DIR, 'warm.lock'), 'w')
+    if FCNTL_AVAILABLE:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+    return handle
+
+class Progress:
+    """统计完成数、新生成/已缓存的条目和失败数，按固定间隔打印一行进度（适合写入cron日志）"""
+
+    def __init__(self, total, interval):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.created = 0
+        self.cached = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+
+    def add(self, created, cached, error):
+        self.done += 1
+        self.created += created
+        self.cached += cached
+        if error:
+            self.failed += 1
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def report(self, label="预热进度"):
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = (self.total - self.done) / rate if rate else 0.0
+        percent = self.done / self.total * 100 if self.total else 100.0
+        print(f"{label}: {self.done}/{self.total} ({percent:.1f}%) | 新生成: {self.created} | "
+              f"已缓存: {self.cached} | 失败: {self.failed} | {rate:.1f} 张/秒 | "
+              f"已用 {elapsed:.0f}s 剩余约 {remaining:.0f}s", flush=True)
+
+def warm(images, sizes, thumbnails, workers, interval, budget_mb=DECODE_MEMORY_BUDGET_MB):
+    """用进程池预热所有图片，返回是否全部完成（被中断时为False）
+
+    每个子进程的decode_gate只管本进程，这里按估算内存统一准入：
+    同时提交的任务估算总和不超过budget_mb（至少一个），任务数不超过进程数。
+    """
+    progress = Progress(len(images), interval)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker)
+    budget = budget_mb * 1024 * 1024
+    pending = {}  # Future -> 估算字节数
+    in_use = 0
+    todo = iter(images)
+    waiting = None  # 因预算不足暂未提交的 (路径, 估算字节数)
+    completed = False
+    try:
+        while True:
+            while len(pending) < workers:
+                if waiting is None:
+                    path = next(todo, None)
+                    if path is None:
+                        break
+                    waiting = (path, estimate_job_bytes(path, sizes, thumbnails))
+                path, estimate = waiting
+                if pending and in_use + estimate > budget:
+                    break
+                pending[pool.submit(warm_image, path, sizes, thumbnails)] = estimate
+                in_use += estimate
+                waiting = None
+            if not pending:
+                completed = True
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                in_use -= pending.pop(future)
+                path, created, cached, error, undecodable = future.result()
+                if error:
+                    print(f"预热失败: {path} - {error}")
+                    if undecodable and image_catalog is not None:
+                        image_catalog.mark_failed(path)
+                progress.add(created, cached, error)
+    except KeyboardInterrupt:
+        print("预热已中断，重新运行时从未完成的图片继续")
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        progress.report("预热完成" if completed else "预热中止")
+    return completed
+
+def parse_size(value):
+    try:
+        width, height = (int(v) for v in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"尺寸格式应为 宽x高: {value}")
+    return width, height
+
+def main():
+    parser = argparse.ArgumentParser(description="预先生成缩略图和全屏增强帧缓存")
+    parser.add_argument('folder', help="图片目录")
+    parser.add_argument('--size', type=parse_size, action='append',
+                        help="查看器窗口尺寸(宽x高)，可重复指定；默认为启动窗口尺寸 "
+                             f"{WINDOW_SIZE[0]}x{WINDOW_SIZE[1]}")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                        help=f"进程数上限，同时解码的估算内存总和另受 DECODE_MEMORY_BUDGET_MB "
+                             f"({DECODE_MEMORY_BUDGET_MB} MB) 限制")
+    parser.add_argument('--no-thumbnails', action='store_true', help="不生成缩略图")
+    parser.add_argument('--no-frames', action='store_true', help="不生成全屏帧")
+    parser.add_argument('--progress', type=float, default=10, help="打印进度的间隔(秒)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        print(f"目录不存在: {args.folder}")
+        return 2
+    thumbnails = not args.no_thumbnails and thumbnail_store is not None
+    # 查看器按实际窗口尺寸渲染，帧缓存键也是窗口尺寸
+    sizes = []
+    if not args.no_frames and frame_store is not None:
+        for size in args.size or [WINDOW_SIZE]:
+            if size not in sizes:
+                sizes.append(size)
+    if not thumbnails and not sizes:
+        print("缩略图缓存和帧缓存均未启用，无需预热")
+        return 0
+
+    lock = acquire_lock()
+    if lock is None:
+        print("已有预热进程在运行，本次跳过")
+        return 0
+    # cron或kill发送的SIGTERM与Ctrl+C相同处理，保证进度和缓存一致
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        images = collect_images(os.path.abspath(args.folder))
+        frames_bytes = sum(w * h * 4 for w, h in sizes) * len(images)
+        print(f"共 {len(images)} 张图片 | 缩略图: {'是' if thumbnails else '否'} | "
+              f"帧尺寸: {', '.join(f'{w}x{h}' for w, h in sizes) or '无'} | 进程数: {args.workers}")
+        if frames_bytes > FRAME_STORE_MAX_MB * 1024 * 1024:
+            print(f"警告: 全部帧约需 {frames_bytes / 2**20:.0f} MB，超过帧缓存上限 "
+                  f"{FRAME_STORE_MAX_MB} MB，较早生成的帧会被淘汰")
+        completed = warm(images, sizes, thumbnails, args.workers, args.progress)
+        if image_catalog is not None:
+            # 补全图片尺寸，查看器据此估算预渲染内存
+            image_catalog.probe_dimensions()
+            image_catalog.close()
+        return 0 if completed else 1
+    except KeyboardInterrupt:
+        print("预热已中断")
+        return 1
+    finally:
+        lock.close()
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,261 @@
+# 监听图片目录的变化：Linux 使用 inotify，其他系统使用按目录修改时间的轮询
+# 事件在后台线程产生，主线程定期取走：('add', 路径) / ('remove', 路径) / ('remove_tree', 目录)
+import os
+import sys
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from config import *
+from utils import IMAGE_EXTENSIONS
+from scanner import iter_images
+
+def _is_image(name):
+    return not name.startswith('.') and name.lower().endswith(IMAGE_EXTENSIONS)
+
+class _BaseWatcher:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.lock = threading.Lock()
+        self.events = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def _emit(self, kind, path):
+        with self.lock:
+            self.events.append((kind, path))
+
+    def _emit_tree(self, directory):
+        """新目录出现时（创建或移入）产出其中已有的图片"""
+        for path in iter_images(directory):
+            self._emit('add', path)
+
+    def drain(self):
+        """取走上次调用以来的事件（按发生顺序）"""
+        with self.lock:
+            events, self.events = self.events, []
+        return events
+
+    def stop(self):
+        self._stop.set()
+
+# inotify 常量，见 <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+               | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class InotifyWatcher(_BaseWatcher):
+    """基于inotify的递归监听：每个子目录一个watch，新文件在写入完成(IN_CLOSE_WRITE)或移入后才产出"""
+
+    def __init__(self, root, libc):
+        super().__init__(root)
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.watches = {}  # wd -> 目录
+
+    def _add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                print("inotify watch 数量达到系统上限，请调大 fs.inotify.max_user_watches")
+            return False
+        self.watches[wd] = directory
+        return True
+
+    def _watch_tree(self, directory):
+        """递归为目录及其所有子目录添加watch"""
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            if not self._add_watch(current):
+                continue
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if not entry.name.startswith('.') and entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError:
+                continue
+
+    def _run(self):
+        self._watch_tree(self.root)
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([self.fd], [], [], 0.5)
+                if not ready:
+                    continue
+                try:
+                    buffer = os.read(self.fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                self._handle(buffer)
+        finally:
+            os.close(self.fd)
+
+    def _handle(self, buffer):
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buffer):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                print("inotify 事件队列溢出，部分文件变化可能丢失")
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF) and not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if name.startswith('.'):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path)
+                    self._emit_tree(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._emit('remove_tree', path)
+            elif _is_image(name):
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self._emit('add', path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._emit('remove', path)
+
+class PollingWatcher(_BaseWatcher):
+    """轮询监听：每轮只stat已知目录，修改时间变化的目录才重新列出；新文件大小稳定一轮后才产出"""
+
+    def __init__(self, root, interval=WATCH_POLL_INTERVAL):
+        super().__init__(root)
+        self.interval = interval
+        self.dirs = {}  # 目录 -> (修改时间, 图片名集合, 子目录名集合)
+        self.settling = {}  # 新文件路径 -> 上一轮看到的大小
+
+    def _list(self, directory):
+        images, subdirs = set(), set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.add(entry.name)
+                    elif _is_image(entry.name):
+                        images.add(entry.name)
+                except OSError:
+                    continue
+        return images, subdirs
+
+    def _snapshot(self, directory, announce):
+        """记录目录树的快照，announce为True时把其中的图片作为新文件"""
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                mtime_ns = os.stat(current).st_mtime_ns
+                images, subdirs = self._list(current)
+            except OSError:
+                continue
+            self.dirs[current] = (mtime_ns, images, subdirs)
+            if announce:
+                for name in images:
+                    self.settling[os.path.join(current, name)] = -1
+            stack.extend(os.path.join(current, name) for name in subdirs)
+
+    def _forget(self, directory):
+        prefix = directory + os.sep
+        for path in [d for d in self.dirs if d == directory or d.startswith(prefix)]:
+            del self.dirs[path]
+        for path in [p for p in self.settling if p.startswith(prefix)]:
+            del self.settling[path]
+        self._emit('remove_tree', directory)
+
+    def _poll(self):
+        for directory, (mtime_ns, images, subdirs) in list(self.dirs.items()):
+            if directory not in self.dirs:
+                continue  # 本轮已作为被删除目录的子目录处理
+            try:
+                current_mtime = os.stat(directory).st_mtime_ns
+                if current_mtime == mtime_ns:
+                    continue
+                new_images, new_subdirs = self._list(directory)
+            except OSError:
+                self._forget(directory)
+                continue
+            self.dirs[directory] = (current_mtime, new_images, new_subdirs)
+            for name in new_images - images:
+                self.settling[os.path.join(directory, name)] = -1
+            for name in images - new_images:
+                path = os.path.join(directory, name)
+                if self.settling.pop(path, None) is None:
+                    self._emit('remove', path)
+            for name in new_subdirs - subdirs:
+                self._snapshot(os.path.join(directory, name), announce=True)
+            for name in subdirs - new_subdirs:
+                self._forget(os.path.join(directory, name))
+
+        # 文件大小两轮不变才认为写入完成
+        for path, last_size in list(self.settling.items()):
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                del self.settling[path]
+                continue
+            if size == last_size:
+                del self.settling[path]
+                self._emit('add', path)
+            else:
+                self.settling[path] = size
+
+    def _run(self):
+        self._snapshot(self.root, announce=False)
+        while not self._stop.wait(self.interval):
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"目录监听出错: {e}")
+
+def create_watcher(root):
+    """优先使用inotify，不可用时退回轮询"""
+    libc = _load_libc()
+    if libc is not None:
+        try:
+            return InotifyWatcher(root, libc)
+        except OSError as e:
+            print(f"inotify 不可用，改用轮询: {e}")
+    return PollingWatcher(root)